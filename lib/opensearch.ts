@@ -43,12 +43,17 @@ function getClient(): Client {
   return client;
 }
 
-// Get all available indices
+// Get all available indices and aliases (e.g. the read alias over monthly partitions)
 export async function getIndices() {
   try {
     const osClient = getClient(); // Get client instance
-    const response = await osClient.cat.indices({ format: 'json' });
-    return response.body.map((index: any) => index.index)
+    const [indicesResponse, aliasesResponse] = await Promise.all([
+      osClient.cat.indices({ format: 'json' }),
+      osClient.cat.aliases({ format: 'json' }),
+    ]);
+    const indices = indicesResponse.body.map((index: any) => index.index);
+    const aliases = aliasesResponse.body.map((alias: any) => alias.alias);
+    return Array.from(new Set<string>([...aliases, ...indices]))
       .filter((index: string) => !index.startsWith('.'));
   } catch (error) {
     console.error('Error fetching indices:', error);
@@ -56,12 +61,34 @@ export async function getIndices() {
   }
 }
 
+// Field types per index, so dashboard queries do not fetch the mapping again each time
+const fieldTypeCache = new Map<string, Record<string, string>>();
+
+// Read the field types of an index (or alias) from its mapping; refresh bypasses the cache
+async function getFieldTypes(index: string, refresh = false) {
+  const cached = fieldTypeCache.get(index);
+  if (cached && !refresh) {
+    return cached;
+  }
+
+  const osClient = getClient(); // Get client instance
+  const response = await osClient.indices.getMapping({ index });
+  // Aliases return one entry per backing index; they share the same template mapping
+  const indexMapping = response.body[index] ?? Object.values(response.body)[0];
+  const mappings = indexMapping?.mappings?.properties || {};
+  const fieldTypes: Record<string, string> = {};
+  Object.entries(mappings).forEach(([fieldName, fieldConfig]: [string, any]) => {
+    fieldTypes[fieldName] = fieldConfig.type;
+  });
+
+  fieldTypeCache.set(index, fieldTypes);
+  return fieldTypes;
+}
+
 // Get mappings for an index to determine field types
 export async function getIndexMapping(index: string) {
   try {
-    const osClient = getClient(); // Get client instance
-    const response = await osClient.indices.getMapping({ index });
-    const mappings = response.body[index].mappings.properties || {};
+    const fieldTypes = await getFieldTypes(index, true);
     
     const fields: { dateFields: string[], termFields: string[], numericFields: string[] } = {
       dateFields: [],
@@ -69,12 +96,12 @@ export async function getIndexMapping(index: string) {
       numericFields: [],
     };
     
-    Object.entries(mappings).forEach(([fieldName, fieldConfig]: [string, any]) => {
-      if (['date'].includes(fieldConfig.type)) {
+    Object.entries(fieldTypes).forEach(([fieldName, fieldType]) => {
+      if (['date'].includes(fieldType)) {
         fields.dateFields.push(fieldName);
-      } else if (['keyword', 'text'].includes(fieldConfig.type)) {
+      } else if (['keyword', 'text'].includes(fieldType)) {
         fields.termFields.push(fieldName);
-      } else if (['long', 'integer', 'short', 'byte', 'double', 'float', 'half_float', 'scaled_float'].includes(fieldConfig.type)) {
+      } else if (['long', 'integer', 'short', 'byte', 'double', 'float', 'half_float', 'scaled_float'].includes(fieldType)) {
         fields.numericFields.push(fieldName);
       }
     });
@@ -86,6 +113,18 @@ export async function getIndexMapping(index: string) {
   }
 }
 
+// Resolve the field to run terms aggregations on: keyword fields aggregate directly,
+// text fields only through their .keyword subfield
+export async function getAggregationField(index: string, field: string) {
+  try {
+    const fieldTypes = await getFieldTypes(index);
+    return fieldTypes[field] === 'text' ? field + '.keyword' : field;
+  } catch (error) {
+    console.error(`Error fetching mapping for field ${field} of index ${index}; aggregating on the field itself:`, error);
+    return field;
+  }
+}
+
 // Get stats for an index to determine date range
 export async function getIndexStats(index: string, timestamp: string, filterField: string, filterValue: string) {
   try {
@@ -171,7 +210,8 @@ export async function performAggregation(index: string, params: {
       },
     };
 
-    const aggs = makeTermListAggs(params);
+    const term = await getAggregationField(index, params.term);
+    const aggs = makeTermListAggs({ ...params, term });
     
     const searchBody: any = {
       size: 0,
@@ -371,6 +411,7 @@ export async function searchFilterValues(
     // });
     
     const osClient = getClient(); // Get client instance
+    const aggregationField = await getAggregationField(indexName, filterField);
     const response = await osClient.search({
       index: indexName,
       body: {
@@ -387,7 +428,7 @@ export async function searchFilterValues(
         aggs: {
           unique_values: {
             terms: {
-              field: filterField + '.keyword',
+              field: aggregationField,
               size: 1000,
               order: {
                 _key: 'asc'
@@ -414,7 +455,7 @@ export async function searchFilterValues(
   }
 }
 
-// Your aggregation function
+// Your aggregation function; term is the aggregatable field (see getAggregationField)
 type MakeTermListAggs = {
   term: string;
   interval: string;
@@ -432,7 +473,7 @@ export function makeTermListAggs({ term, interval, numericField, timestamp }: Ma
       aggs: {
         value_aggregation: {
           terms: {
-            field: term + '.keyword',
+            field: term,
             size: 100,
           },
           aggs: {
@@ -0,0 +1,583 @@
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The generator script, loaded by path because its file name is not a module name
+ESP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esp with issues and annotations.py")
+
+# Benchmarks run by default, in order
+BENCHMARKS = [
+    "simulate_scalar",
+    "simulate_vectorized",
+    "serialize_helpers",
+    "serialize_ndjson",
+    "transport_ndjson",
+    "transport_helpers",
+    "end_to_end"
+]
+
+# Benchmarks that only run when named
+OPTIONAL_BENCHMARKS = [
+    "high_frequency",
+    "end_to_end_nodes"
+]
+
+# Budget for one day of 1-second readings of the built-in fleet generated and indexed end to end
+HIGH_FREQUENCY_TARGET = {"seconds": 180, "peak_rss_mb": 1024}
+
+
+def load_esp():
+    """Import the generator script as a module"""
+    spec = importlib.util.spec_from_file_location("esp", ESP_SCRIPT)
+    esp = importlib.util.module_from_spec(spec)
+    sys.modules["esp"] = esp
+    spec.loader.exec_module(esp)
+    return esp
+
+
+class MockOpenSearchHandler(BaseHTTPRequestHandler):
+    """
+    In-process stand-in for the OpenSearch endpoints the loader uses.
+
+    _bulk requests are counted per index without parsing the documents, and can
+    be delayed or rejected (HTTP 429 for the whole request, or per item) to
+    exercise the retry and adaptive paths. Index, template, alias, refresh,
+    settings and count calls keep just enough state to answer consistently.
+    Servers started by start_mock_cluster share that state and list each other
+    as data nodes in the nodes info API.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real cluster
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body=None):
+        data = json.dumps(body if body is not None else {"acknowledged": True}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_HEAD(self):
+        state = self.server.state
+        path = self.path.split("?")[0].strip("/")
+        with state["lock"]:
+            if path.startswith("_index_template/"):
+                found = path.split("/", 1)[1] in state["templates"]
+            elif path.startswith("_alias/"):
+                found = False
+            else:
+                found = path in state["indices"]
+        self.send_json(200 if found else 404)
+
+    def do_GET(self):
+        self.handle_request(b"")
+
+    def do_PUT(self):
+        self.handle_request(self.read_body())
+
+    def do_POST(self):
+        self.handle_request(self.read_body())
+
+    def handle_request(self, body):
+        state = self.server.state
+        path = self.path.split("?")[0].strip("/")
+        parts = path.split("/")
+
+        if parts[-1] == "_bulk":
+            self.handle_bulk(body, parts[0] if len(parts) == 2 else None)
+        elif parts[0] == "_nodes":
+            nodes = state.get("nodes") or [self.server.url]
+            self.send_json(200, {"nodes": {f"mock-node-{position}": {
+                "name": f"mock-node-{position}",
+                "roles": ["data", "ingest"],
+                "http": {"publish_address": url.split("://", 1)[1]}
+            } for position, url in enumerate(nodes)}})
+        elif parts[-1] == "_count":
+            with state["lock"]:
+                count = state["docs"].get(parts[0])
+                if count is None:
+                    # An alias over monthly partitions
+                    count = sum(docs for name, docs in state["docs"].items() if name.startswith(parts[0] + "-"))
+            self.send_json(200, {"count": count})
+        elif parts[0] == "_index_template" and len(parts) == 2:
+            with state["lock"]:
+                if self.command == "PUT":
+                    state["templates"][parts[1]] = json.loads(body or b"{}")
+                    self.send_json(200)
+                elif parts[1] in state["templates"]:
+                    self.send_json(200, {"index_templates": [
+                        {"name": parts[1], "index_template": state["templates"][parts[1]]}
+                    ]})
+                else:
+                    self.send_json(404, {"error": "index_template_missing_exception", "status": 404})
+        elif len(parts) == 1 and not path.startswith("_") and self.command == "PUT":
+            with state["lock"]:
+                state["indices"].add(path)
+                state["docs"].setdefault(path, 0)
+            self.send_json(200, {"acknowledged": True, "index": path})
+        else:
+            # _refresh, _settings, _forcemerge, ISM policies and anything else just succeed
+            self.send_json(200)
+
+    def handle_bulk(self, body, url_index):
+        settings = self.server.settings
+        state = self.server.state
+        lines = body.split(b"\n")
+        item_count = len(lines) // 2
+
+        delay = settings["latency_ms"] / 1000 + settings["ms_per_mb"] / 1000 * len(body) / (1024 * 1024)
+        if delay:
+            # Like a node's write thread pool, a limited number of requests are worked on at once
+            with settings["write_threads"] or contextlib.nullcontext():
+                time.sleep(delay)
+
+        if random.random() < settings["reject_request_rate"]:
+            with state["lock"]:
+                state["rejected_requests"] += 1
+            self.send_json(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            return
+
+        items = []
+        counts = {}
+        rejected = 0
+        action_cache = state["action_cache"]
+        reject_rate = settings["reject_rate"]
+        for position in range(0, item_count * 2, 2):
+            action_line = lines[position]
+            index = action_cache.get(action_line)
+            if index is None:
+                action = json.loads(action_line)
+                meta = next(iter(action.values()))
+                index = meta.get("_index") or url_index
+                if b'"_id"' not in action_line:
+                    action_cache[action_line] = index
+            if reject_rate and random.random() < reject_rate:
+                items.append({"index": {"_index": index, "status": 429,
+                                        "error": {"type": "es_rejected_execution_exception"}}})
+                rejected += 1
+            else:
+                items.append({"index": {"_index": index, "status": 201}})
+                counts[index] = counts.get(index, 0) + 1
+
+        with state["lock"]:
+            state["bulk_requests"] += 1
+            state["node_requests"][self.server.url] = state["node_requests"].get(self.server.url, 0) + 1
+            for index, count in counts.items():
+                state["docs"][index] = state["docs"].get(index, 0) + count
+
+        self.send_json(200, {"took": int(delay * 1000), "errors": rejected > 0, "items": items})
+
+
+def start_mock_server(port=0, latency_ms=0, ms_per_mb=0, reject_rate=0.0, reject_request_rate=0.0, state=None,
+                      write_threads=None):
+    """
+    Start the mock OpenSearch server in a background thread.
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        latency_ms: Fixed delay added to every _bulk request
+        ms_per_mb: Additional delay per MB of _bulk body
+        reject_rate: Fraction of bulk items rejected with 429
+        reject_request_rate: Fraction of _bulk requests rejected as a whole with 429
+        state: State shared with the other nodes of a mock cluster (a new one if None)
+        write_threads: Maximum _bulk requests delayed at once (unlimited if None)
+
+    Returns:
+        The running server; its URL is server.url and its counters are in server.state
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenSearchHandler)
+    server.daemon_threads = True
+    server.settings = {
+        "latency_ms": latency_ms,
+        "ms_per_mb": ms_per_mb,
+        "reject_rate": reject_rate,
+        "reject_request_rate": reject_request_rate,
+        "write_threads": threading.Semaphore(write_threads) if write_threads else None
+    }
+    server.state = state if state is not None else {
+        "lock": threading.Lock(),
+        "indices": set(),
+        "templates": {},
+        "docs": {},
+        "action_cache": {},
+        "bulk_requests": 0,
+        "rejected_requests": 0,
+        "node_requests": {}
+    }
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_mock_cluster(nodes, port=0, latency_ms=0, slow_node_ms=0, reject_rate=0.0, reject_request_rate=0.0,
+                       write_threads=None):
+    """
+    Start mock OpenSearch nodes that share one cluster state.
+
+    Args:
+        nodes: Number of nodes
+        port: Port of the first node, the others following it (0 picks free ones)
+        latency_ms: Fixed delay every node adds to each _bulk request
+        slow_node_ms: Additional delay of the first node, a hot node for the dispatcher to steer away from
+        reject_rate: Fraction of bulk items rejected with 429
+        reject_request_rate: Fraction of _bulk requests rejected as a whole with 429
+        write_threads: _bulk requests each node works on at once (unlimited if None)
+
+    Returns:
+        List of the running servers; the first one's state holds the shared counters
+    """
+    servers = [start_mock_server(port, latency_ms + slow_node_ms, reject_rate=reject_rate,
+                                 reject_request_rate=reject_request_rate, write_threads=write_threads)]
+    for position in range(1, nodes):
+        servers.append(start_mock_server(port + position if port else 0, latency_ms, reject_rate=reject_rate,
+                                         reject_request_rate=reject_request_rate, state=servers[0].state,
+                                         write_threads=write_threads))
+    servers[0].state["nodes"] = [server.url for server in servers]
+    return servers
+
+
+def use_mock_server(esp, server, sniff=False):
+    """Point the generator script's OpenSearch clients at the mock server (or the first node of a mock cluster)"""
+    esp.OPENSEARCH_CONNECTION.pop("ssl_assert_hostname", None)
+    esp.configure_connection([server.url], sniff, require_auth=False)
+
+
+def generate_days(esp, days, engine="vectorized", seed=1, sample_seconds=60):
+    """Data generator for the first days of 2024"""
+    start_date = datetime(2024, 1, 1)
+    end_date = start_date + timedelta(days=days - 1)
+    generate = esp.generate_esp_pump_data_vectorized if engine == "vectorized" else esp.generate_esp_pump_data
+    return generate(start_date, end_date, seed=seed, sample_seconds=sample_seconds)
+
+
+def generated_chunks(esp, options):
+    """Generate days of data up front and return them as document chunks"""
+    return [chunk for chunk, _, _ in esp.chunk_documents(generate_days(esp, options["days"],
+                                                                       sample_seconds=options["sample_seconds"]),
+                                                         options["chunk_size"])]
+
+
+def bench_simulate(esp, options, engine):
+    docs = 0
+    start_time = time.perf_counter()
+    for batch_data in generate_days(esp, options["days"], engine, sample_seconds=options["sample_seconds"]):
+        docs += esp.document_count(batch_data["data"])
+    return docs, time.perf_counter() - start_time, {}
+
+
+def bench_serialize_helpers(esp, options):
+    from opensearchpy.serializer import JSONSerializer
+
+    serializer = JSONSerializer()
+    chunks = generated_chunks(esp, options)
+    docs = 0
+    size = 0
+    start_time = time.perf_counter()
+    for chunk in chunks:
+        # What helpers.bulk does with each action: split off the metadata and encode both lines
+        for action in esp.opensearch_doc_generator(esp.batch_documents(chunk), "esp_pump_data"):
+            source = action.pop("_source")
+            size += len(serializer.dumps({"index": action})) + len(serializer.dumps(source)) + 2
+            docs += 1
+    return docs, time.perf_counter() - start_time, {"mb": round(size / (1024 * 1024), 1)}
+
+
+def bench_serialize_ndjson(esp, options):
+    chunks = generated_chunks(esp, options)
+    docs = 0
+    size = 0
+    start_time = time.perf_counter()
+    for chunk in chunks:
+        size += len(esp.serialize_bulk_body(chunk, "esp_pump_data"))
+        docs += esp.document_count(chunk)
+    return docs, time.perf_counter() - start_time, {"mb": round(size / (1024 * 1024), 1)}
+
+
+def bench_transport(esp, options, writer):
+    server = start_mock_server(latency_ms=options["latency_ms"], reject_rate=options["reject_rate"],
+                               reject_request_rate=options["reject_request_rate"])
+    use_mock_server(esp, server)
+    os_client = esp.OpenSearch(**esp.OPENSEARCH_CONNECTION, pool_maxsize=options["workers"])
+
+    chunks = generated_chunks(esp, options)
+    if writer == "ndjson":
+        # Encode once up front so only the requests are timed
+        chunks = [[esp.serialize_bulk_body([doc], "esp_pump_data") for doc in esp.batch_documents(chunk)]
+                  for chunk in chunks]
+
+    def send(batch_num, chunk):
+        if writer == "ndjson":
+            return esp.write_ndjson_batch_to_opensearch(os_client, chunk, "esp_pump_data", batch_num,
+                                                        initial_backoff=0.1, preformatted=True)
+        return esp.write_batch_to_opensearch(os_client, chunk, "esp_pump_data", batch_num)
+
+    docs = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+        for success, failed in executor.map(send, range(1, len(chunks) + 1), chunks):
+            docs += success
+    elapsed = time.perf_counter() - start_time
+    server.shutdown()
+    return docs, elapsed, {"requests": server.state["bulk_requests"],
+                           "rejected_requests": server.state["rejected_requests"]}
+
+
+def bench_end_to_end(esp, options):
+    server = start_mock_server(latency_ms=options["latency_ms"], reject_rate=options["reject_rate"],
+                               reject_request_rate=options["reject_request_rate"])
+    use_mock_server(esp, server)
+
+    start_time = time.perf_counter()
+    docs = esp.write_to_opensearch(generate_days(esp, options["days"], sample_seconds=options["sample_seconds"]),
+                                   max_workers=options["workers"], chunk_size=options["chunk_size"])
+    elapsed = time.perf_counter() - start_time
+    server.shutdown()
+    return docs, elapsed, {"requests": server.state["bulk_requests"],
+                           "rejected_requests": server.state["rejected_requests"]}
+
+
+def bench_end_to_end_nodes(esp, options):
+    # The loader is only given the first node and discovers the others by sniffing
+    servers = start_mock_cluster(options["nodes"], latency_ms=options["latency_ms"],
+                                 slow_node_ms=options["slow_node_ms"], reject_rate=options["reject_rate"],
+                                 reject_request_rate=options["reject_request_rate"],
+                                 write_threads=options["node_write_threads"])
+    use_mock_server(esp, servers[0], sniff=True)
+
+    start_time = time.perf_counter()
+    docs = esp.write_to_opensearch(generate_days(esp, options["days"], sample_seconds=options["sample_seconds"]),
+                                   max_workers=options["workers"], chunk_size=options["chunk_size"])
+    elapsed = time.perf_counter() - start_time
+    for server in servers:
+        server.shutdown()
+    state = servers[0].state
+    return docs, elapsed, {"requests": state["bulk_requests"], "rejected_requests": state["rejected_requests"],
+                           "node_requests": [state["node_requests"].get(server.url, 0) for server in servers]}
+
+
+def bench_high_frequency(esp, options):
+    # One day of 1-second readings end to end, whatever --days and --sample-seconds say
+    docs, elapsed, extra = bench_end_to_end(esp, dict(options, days=1, sample_seconds=1))
+    peak_rss = esp.process_peak_rss_mb()
+    extra["target_met"] = (elapsed <= HIGH_FREQUENCY_TARGET["seconds"]
+                           and peak_rss <= HIGH_FREQUENCY_TARGET["peak_rss_mb"])
+    return docs, elapsed, extra
+
+
+def run_benchmark(name, options):
+    """
+    Run one benchmark in the current process.
+
+    Args:
+        name: Benchmark name from BENCHMARKS
+        options: Benchmark parameters (days, chunk_size, workers, latency_ms, reject_rate, reject_request_rate,
+            sample_seconds, nodes, slow_node_ms, node_write_threads)
+
+    Returns:
+        Result dict with docs, seconds, docs_per_sec, peak and baseline RSS in MB
+    """
+    esp = load_esp()
+    baseline_rss = esp.process_peak_rss_mb()
+
+    # Progress output from the generator and writers is not part of the result
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        if name.startswith("simulate_"):
+            docs, elapsed, extra = bench_simulate(esp, options, name.split("_", 1)[1])
+        elif name == "serialize_helpers":
+            docs, elapsed, extra = bench_serialize_helpers(esp, options)
+        elif name == "serialize_ndjson":
+            docs, elapsed, extra = bench_serialize_ndjson(esp, options)
+        elif name.startswith("transport_"):
+            docs, elapsed, extra = bench_transport(esp, options, name.split("_", 1)[1])
+        elif name == "end_to_end":
+            docs, elapsed, extra = bench_end_to_end(esp, options)
+        elif name == "end_to_end_nodes":
+            docs, elapsed, extra = bench_end_to_end_nodes(esp, options)
+        elif name == "high_frequency":
+            docs, elapsed, extra = bench_high_frequency(esp, options)
+        else:
+            raise ValueError(f"Unknown benchmark '{name}'")
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    result = {
+        "benchmark": name,
+        "docs": docs,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(docs / elapsed) if elapsed else 0,
+        "peak_rss_mb": round(esp.process_peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_rss, 1)
+    }
+    result.update(extra)
+    return result
+
+
+def git_revision():
+    """Short commit hash of the working tree, marked dirty if it has local changes"""
+    try:
+        repo = os.path.dirname(ESP_SCRIPT)
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=repo, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--", "."], cwd=repo, text=True).strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(names, options, repeat=1):
+    """
+    Run benchmarks, each in a fresh process so peak RSS is measured per benchmark.
+
+    Args:
+        names: Benchmark names to run
+        options: Benchmark parameters passed to every benchmark
+        repeat: Runs per benchmark; the fastest is reported
+
+    Returns:
+        Suite result dict with the commit, environment, parameters and one result per benchmark
+    """
+    results = []
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--single", name,
+                                              "--options", json.dumps(options)], text=True)
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        best = max(runs, key=lambda run: run["docs_per_sec"])
+        results.append(best)
+        print(f"{name:<20} {best['docs']:>10,} docs {best['seconds']:>8.2f}s {best['docs_per_sec']:>12,} docs/s "
+              f"peak RSS {best['peak_rss_mb']:>7.1f} MB")
+        if "node_requests" in best:
+            print(f"{'':<20} requests per node: {', '.join(f'{count:,}' for count in best['node_requests'])}")
+        if "target_met" in best:
+            print(f"{'':<20} target {HIGH_FREQUENCY_TARGET['seconds']}s / {HIGH_FREQUENCY_TARGET['peak_rss_mb']} MB: "
+                  f"{'met' if best['target_met'] else 'MISSED'}")
+
+    return {
+        "commit": git_revision(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "results": results
+    }
+
+
+def compare_runs(results_file, last=5):
+    """Print docs/sec per benchmark for the last runs recorded in results_file"""
+    with open(results_file) as f:
+        runs = [json.loads(line) for line in f if line.strip()][-last:]
+    if not runs:
+        print(f"No runs recorded in {results_file}")
+        return
+
+    names = []
+    for run in runs:
+        for result in run["results"]:
+            if result["benchmark"] not in names:
+                names.append(result["benchmark"])
+
+    print(f"{'docs/sec':<20}" + "".join(f"{run['commit']:>16}" for run in runs))
+    for name in names:
+        row = f"{name:<20}"
+        for run in runs:
+            result = next((r for r in run["results"] if r["benchmark"] == name), None)
+            row += f"{result['docs_per_sec']:>16,}" if result else f"{'-':>16}"
+        print(row)
+
+    # Runs are only comparable when they used the same parameters
+    if len({json.dumps(run["options"], sort_keys=True) for run in runs}) > 1:
+        print("Note: these runs used different benchmark options")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark ESP data generation, serialization and bulk transport')
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)}; "
+                                                      f"also available: {', '.join(OPTIONAL_BENCHMARKS)})")
+    parser.add_argument('--days', type=int, default=2, help='Days of data per benchmark')
+    parser.add_argument('--sample-seconds', type=int, default=60, help='Seconds between generated readings')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Documents per chunk / bulk request')
+    parser.add_argument('--workers', type=int, default=4, help='Parallel bulk workers for the transport benchmarks')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency the mock server adds to each _bulk')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Fraction of bulk items the mock rejects with 429')
+    parser.add_argument('--reject-request-rate', type=float, default=0.0,
+                        help='Fraction of _bulk requests the mock rejects with 429')
+    parser.add_argument('--nodes', type=int, default=3,
+                        help='Mock nodes for end_to_end_nodes (and --serve, on consecutive ports)')
+    parser.add_argument('--slow-node-ms', type=float, default=0,
+                        help='Extra _bulk latency of the first mock node, to check that load moves off it')
+    parser.add_argument('--node-write-threads', type=int,
+                        help='_bulk requests each mock node of end_to_end_nodes / --serve works on at once '
+                             '(default: unlimited)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per benchmark (fastest is kept)')
+    parser.add_argument('--results', type=str, default='bench_results.jsonl',
+                        help='File the suite results are appended to, one JSON line per run')
+    parser.add_argument('--compare', action='store_true', help='Compare the last recorded runs instead of running')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='Only run a mock OpenSearch cluster of --nodes nodes from PORT on '
+                             '(with the latency/reject options)')
+    parser.add_argument('--single', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--options', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_benchmark(args.single, json.loads(args.options))))
+        sys.exit()
+
+    if args.compare:
+        compare_runs(args.results)
+        sys.exit()
+
+    if args.serve:
+        servers = start_mock_cluster(args.nodes, args.serve, args.latency_ms, args.slow_node_ms,
+                                     reject_rate=args.reject_rate, reject_request_rate=args.reject_request_rate,
+                                     write_threads=args.node_write_threads)
+        print(f"Mock OpenSearch listening on {', '.join(server.url for server in servers)} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            sys.exit()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS + OPTIONAL_BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    options = {
+        "days": args.days,
+        "chunk_size": args.chunk_size,
+        "workers": args.workers,
+        "latency_ms": args.latency_ms,
+        "reject_rate": args.reject_rate,
+        "reject_request_rate": args.reject_request_rate,
+        "sample_seconds": args.sample_seconds,
+        "nodes": args.nodes,
+        "slow_node_ms": args.slow_node_ms,
+        "node_write_threads": args.node_write_threads
+    }
+    suite = run_suite(args.benchmarks or BENCHMARKS, options, args.repeat)
+
+    with open(args.results, "a") as f:
+        f.write(json.dumps(suite) + "\n")
+    print(f"Results for {suite['commit']} appended to {args.results}")
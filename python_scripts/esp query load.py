@@ -0,0 +1,496 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from opensearchpy import OpenSearch, TransportError
+
+# The generator script, loaded by path because its file name is not a module name
+ESP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esp with issues and annotations.py")
+
+# Histogram intervals the app offers (app/components/FieldsSelector/intervalUtils.ts), with their length in minutes
+APP_INTERVALS = [
+    ("1m", 1), ("5m", 5), ("15m", 15), ("30m", 30), ("1h", 60),
+    ("3h", 180), ("12h", 720), ("1d", 1440), ("7d", 10080), ("30d", 43200)
+]
+
+# Number of histogram buckets the app aims for when it picks the interval
+TARGET_DATA_POINTS = 1000
+
+# Query shapes the app issues (lib/opensearch.ts)
+QUERY_SHAPES = ["aggregation", "index_stats", "annotations", "filter_values"]
+
+# Date ranges in days exercised by default
+DEFAULT_RANGES = [1, 7, 30, 90, 180]
+
+# Latency percentiles reported per query shape
+PERCENTILES = [50, 95, 99]
+
+
+def load_esp():
+    """Import the generator script as a module"""
+    spec = importlib.util.spec_from_file_location("esp", ESP_SCRIPT)
+    esp = importlib.util.module_from_spec(spec)
+    sys.modules["esp"] = esp
+    spec.loader.exec_module(esp)
+    return esp
+
+
+def interval_minutes(interval):
+    """Length of one of the app's intervals in minutes"""
+    return dict(APP_INTERVALS)[interval]
+
+
+def optimal_interval(range_minutes):
+    """The interval the app picks for a date range (calculateOptimalInterval in intervalUtils.ts)"""
+    ideal = range_minutes / TARGET_DATA_POINTS
+    for interval, minutes in APP_INTERVALS:
+        if minutes >= ideal:
+            return interval
+    return APP_INTERVALS[-1][0]
+
+
+def format_date(value):
+    """Date string in the form the app's date pickers send"""
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def aggregation_body(timestamp, term_field, numeric_field, interval, start_date, end_date, filter_field,
+                     filter_value):
+    """Search body of performAggregation/makeTermListAggs: date_histogram > terms > avg for one filter value"""
+    return {
+        "size": 0,
+        "query": {
+            "bool": {
+                "filter": [
+                    {"range": {timestamp: {"format": "strict_date_optional_time",
+                                           "gte": start_date, "lte": end_date}}},
+                    {"match_phrase": {filter_field: filter_value}}
+                ]
+            }
+        },
+        "aggs": {
+            "date_aggregation": {
+                "date_histogram": {"field": timestamp, "fixed_interval": interval},
+                "aggs": {
+                    "value_aggregation": {
+                        "terms": {"field": term_field, "size": 100},
+                        "aggs": {"avg_value": {"avg": {"field": numeric_field}}}
+                    }
+                }
+            }
+        }
+    }
+
+
+def index_stats_body(timestamp, filter_field, filter_value):
+    """Search body of getIndexStats: min/max timestamp for one filter value"""
+    return {
+        "size": 0,
+        "query": {"bool": {"filter": [{"match_phrase": {filter_field: filter_value}}]}},
+        "aggs": {
+            "max_date": {"max": {"field": timestamp}},
+            "min_date": {"min": {"field": timestamp}}
+        }
+    }
+
+
+def annotations_body(start_date, end_date, filter_field, filter_value):
+    """Search body of searchAnnotations: the annotations of one filter value in a date range"""
+    return {
+        "size": 10000,
+        "query": {
+            "bool": {
+                "filter": [
+                    {"range": {"startDate": {"gte": start_date, "lte": end_date}}},
+                    {"match_phrase": {"filterField": filter_field}},
+                    {"match_phrase": {"filterValue": filter_value}},
+                    {"match": {"deleted": False}}
+                ]
+            }
+        }
+    }
+
+
+def filter_values_body(filter_field, terms_field, search_terms):
+    """Search body of searchFilterValues: distinct values matching what the user typed"""
+    return {
+        "size": 0,
+        "query": {"wildcard": {filter_field: {"value": f"*{search_terms}*", "case_insensitive": True}}},
+        "aggs": {
+            "unique_values": {
+                "terms": {"field": terms_field, "size": 1000, "order": {"_key": "asc"}}
+            }
+        }
+    }
+
+
+def aggregation_field(properties, field):
+    """
+    Field the app's terms aggregations run on (getAggregationField in lib/opensearch.ts).
+
+    text fields (dynamic mappings) are aggregated through their .keyword subfield,
+    anything else directly, exactly as the app sends it.
+    """
+    if properties.get(field, {}).get("type") == "text":
+        return f"{field}.keyword"
+    return field
+
+
+def response_buckets(shape, response):
+    """Number of terms buckets in the response of an aggregation or filter_values query"""
+    aggregations = response.get("aggregations", {})
+    if shape == "aggregation":
+        return sum(len(bucket["value_aggregation"]["buckets"])
+                   for bucket in aggregations["date_aggregation"]["buckets"])
+    return len(aggregations["unique_values"]["buckets"])
+
+
+def check_workload(os_client, workload):
+    """
+    Fail if the workload's terms aggregations return no buckets.
+
+    Sends the widest aggregation and filter_values query per target index once.
+    An empty terms aggregation is fast, so a workload whose fields do not match
+    the mapping would otherwise report latencies the dashboard never sees.
+    """
+    checks = {}
+    for query in workload:
+        if query["shape"] not in ("aggregation", "filter_values"):
+            continue
+        key = (query["shape"], query["index"])
+        if key not in checks or query.get("range_days", 0) > checks[key].get("range_days", 0):
+            checks[key] = query
+
+    for (shape, index), query in sorted(checks.items()):
+        response = os_client.search(index=index, body=query["body"])
+        if not response_buckets(shape, response):
+            raise ValueError(f"{shape} queries on '{index}' return no buckets; check that the term and filter "
+                             f"fields match the mapping: {json.dumps(query['body'])}")
+
+
+def discover_index(os_client, index_name, timestamp, filter_field):
+    """
+    Look up what the workload needs from the data index.
+
+    Returns:
+        Dictionary with the mapping properties, the filter values (assets), the
+        first and last timestamp, and the index's size from _cat/indices
+    """
+    mappings = os_client.indices.get_mapping(index=index_name)
+    properties = {}
+    for index_mapping in mappings.values():
+        properties.update(index_mapping["mappings"].get("properties", {}))
+
+    response = os_client.search(index=index_name, body={
+        "size": 0,
+        "aggs": {
+            "values": {"terms": {"field": aggregation_field(properties, filter_field), "size": 1000}},
+            "min_date": {"min": {"field": timestamp}},
+            "max_date": {"max": {"field": timestamp}}
+        }
+    })
+    aggregations = response["aggregations"]
+    if aggregations["max_date"]["value"] is None:
+        raise ValueError(f"'{index_name}' has no documents with a {timestamp} field")
+
+    indices = os_client.cat.indices(index=index_name, format="json")
+    return {
+        "properties": properties,
+        "filter_values": [bucket["key"] for bucket in aggregations["values"]["buckets"]],
+        "min_date": datetime.fromtimestamp(aggregations["min_date"]["value"] / 1000, timezone.utc),
+        "max_date": datetime.fromtimestamp(aggregations["max_date"]["value"] / 1000, timezone.utc),
+        "indices": [{"index": row["index"], "docs": row.get("docs.count"), "size": row.get("store.size"),
+                     "primaries": row.get("pri")} for row in indices]
+    }
+
+
+def rollup_target(index_name, interval, rollup_intervals, rollup_minutes):
+    """
+    Coarsest rollup index that can answer a histogram at interval, or None.
+
+    A rollup works when its bucket length divides the histogram interval: every
+    histogram bucket then averages whole rollup buckets of equal sample counts.
+    """
+    minutes = interval_minutes(interval)
+    usable = [name for name in rollup_intervals if minutes % rollup_minutes[name] == 0]
+    if not usable:
+        return None
+    return f"{index_name}_rollup_{max(usable, key=lambda name: rollup_minutes[name])}"
+
+
+def build_workload(index_name, annotations_index, info, ranges, intervals=None, shapes=None,
+                   timestamp="timestamp", term="sensor_name", numeric_field="sensor_value",
+                   filter_field="asset_name", rollup_intervals=None, rollup_minutes=None):
+    """
+    Build the queries of the load run from the app's query shapes.
+
+    Every date range (ending at the last timestamp in the index) is combined
+    with every filter value and every interval: the interval the app would pick
+    for the range, or each of the given intervals that yields at most 10,000
+    buckets.
+
+    Args:
+        index_name: Data index (or alias) the dashboard reads
+        annotations_index: Annotations index
+        info: Result of discover_index
+        ranges: Date range lengths in days
+        intervals: Histogram intervals to combine with every range (None for the app's choice)
+        shapes: Query shapes to include (defaults to all of QUERY_SHAPES)
+        timestamp: Date field of the histogram
+        term: Field of the terms aggregation (resolved against the mapping like the app, see aggregation_field)
+        numeric_field: Field of the avg aggregation
+        filter_field: Field the dashboard filters on
+        rollup_intervals: Send aggregations to <index_name>_rollup_<interval> indices when one fits
+        rollup_minutes: Bucket length in minutes per rollup interval
+
+    Returns:
+        List of query dicts with shape, index, body and the range/interval they cover
+    """
+    shapes = shapes or QUERY_SHAPES
+    properties = info["properties"]
+    term_field = aggregation_field(properties, term)
+    workload = []
+
+    for days in ranges:
+        end = info["max_date"]
+        start = end - timedelta(days=days)
+        range_minutes = days * 1440
+        if intervals:
+            range_intervals = [interval for interval in intervals
+                               if range_minutes / interval_minutes(interval) <= 10000]
+        else:
+            range_intervals = [optimal_interval(range_minutes)]
+
+        for filter_value in info["filter_values"]:
+            if "aggregation" in shapes:
+                for interval in range_intervals:
+                    target = index_name
+                    if rollup_intervals:
+                        target = rollup_target(index_name, interval, rollup_intervals, rollup_minutes) or index_name
+                    workload.append({
+                        "shape": "aggregation",
+                        "index": target,
+                        "range_days": days,
+                        "interval": interval,
+                        "body": aggregation_body(timestamp, term_field, numeric_field, interval,
+                                                 format_date(start), format_date(end), filter_field, filter_value)
+                    })
+            if "annotations" in shapes:
+                workload.append({
+                    "shape": "annotations",
+                    "index": annotations_index,
+                    "range_days": days,
+                    "body": annotations_body(format_date(start), format_date(end), filter_field, filter_value)
+                })
+
+    for filter_value in info["filter_values"]:
+        if "index_stats" in shapes:
+            workload.append({"shape": "index_stats", "index": index_name,
+                             "body": index_stats_body(timestamp, filter_field, filter_value)})
+        if "filter_values" in shapes:
+            # What a user types into the filter box: a few characters of a value
+            workload.append({"shape": "filter_values", "index": index_name,
+                             "body": filter_values_body(filter_field, aggregation_field(properties, filter_field),
+                                                        filter_value[-3:].lower())})
+    return workload
+
+
+def run_load(os_client, workload, concurrency=8, duration=60, warmup=5, rate=None, request_cache=False, seed=1):
+    """
+    Send workload queries from concurrency threads for duration seconds.
+
+    Without rate, each thread sends its next query as soon as the previous one
+    returns (closed loop). With rate, queries are scheduled at rate per second
+    overall and latency is measured from the scheduled time, so a slow cluster
+    shows up as queueing delay instead of silently lowering the offered load.
+
+    Args:
+        os_client: OpenSearch client
+        workload: Queries from build_workload
+        concurrency: Number of query threads
+        duration: Measured seconds, after warmup
+        warmup: Seconds of load before measuring
+        rate: Queries per second to schedule (None for a closed loop)
+        request_cache: Let the shard request cache answer repeated aggregations
+        seed: Seed for the order queries are picked in
+
+    Returns:
+        Tuple of (list of (shape, index, seconds, took_ms, ok) samples, measured seconds)
+    """
+    samples = []
+    samples_lock = threading.Lock()
+    schedule = {"next": 0}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(worker_num):
+        rng = random.Random(seed * 1000 + worker_num)
+        while True:
+            if rate:
+                with samples_lock:
+                    scheduled = start + schedule["next"] / rate
+                    schedule["next"] += 1
+                if scheduled >= stop_at:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= stop_at:
+                    return
+
+            query = rng.choice(workload)
+            ok = True
+            took = None
+            try:
+                response = os_client.search(index=query["index"], body=query["body"], request_cache=request_cache)
+                took = response.get("took")
+            except TransportError as e:
+                ok = False
+                print(f"{query['shape']} query on '{query['index']}' failed: {e}")
+            finished = time.perf_counter()
+
+            if scheduled >= measure_from:
+                with samples_lock:
+                    samples.append((query["shape"], query["index"], finished - scheduled, took, ok))
+
+    threads = [threading.Thread(target=worker, args=(worker_num,), daemon=True) for worker_num in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples, max(time.perf_counter(), stop_at) - measure_from
+
+
+def summarize(samples, elapsed):
+    """
+    Latency percentiles and throughput per query shape and overall.
+
+    Returns:
+        Dictionary of shape name (and "all") to count, errors, qps, latency
+        percentiles, mean and max in milliseconds, and mean server-side took
+    """
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    groups["all"] = samples
+
+    summary = {}
+    for name, group in groups.items():
+        if not group:
+            continue
+        latencies = np.array([sample[2] for sample in group]) * 1000
+        took = [sample[3] for sample in group if sample[3] is not None]
+        result = {
+            "count": len(group),
+            "errors": sum(1 for sample in group if not sample[4]),
+            "qps": round(len(group) / elapsed, 2) if elapsed else 0,
+            "mean_ms": round(float(latencies.mean()), 2),
+            "max_ms": round(float(latencies.max()), 2),
+            "mean_took_ms": round(sum(took) / len(took), 2) if took else None
+        }
+        for percentile, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+            result[f"p{percentile}_ms"] = round(float(value), 2)
+        summary[name] = result
+    return summary
+
+
+def print_summary(summary):
+    """Print the summary as a table"""
+    print(f"{'shape':<15}{'count':>8}{'errors':>8}{'qps':>10}" +
+          "".join(f"{'p' + str(p) + ' ms':>11}" for p in PERCENTILES) + f"{'max ms':>11}{'took ms':>10}")
+    for name in QUERY_SHAPES + ["all"]:
+        result = summary.get(name)
+        if result is None:
+            continue
+        took = f"{result['mean_took_ms']:.1f}" if result["mean_took_ms"] is not None else "-"
+        print(f"{name:<15}{result['count']:>8,}{result['errors']:>8}{result['qps']:>10.1f}" +
+              "".join(f"{result[f'p{p}_ms']:>11.1f}" for p in PERCENTILES) + f"{result['max_ms']:>11.1f}{took:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the dashboard's aggregation queries against the ESP indices "
+                                                 "and report latency percentiles and throughput")
+    parser.add_argument('--index', type=str, default='esp_pump_data', help='Data index (or alias) the dashboard reads')
+    parser.add_argument('--annotations_index', type=str, default='annotations', help='Annotations index')
+    parser.add_argument('--timestamp-field', type=str, default='timestamp', help='Date field of the histogram')
+    parser.add_argument('--term-field', type=str, default='sensor_name', help='Field of the terms aggregation')
+    parser.add_argument('--numeric-field', type=str, default='sensor_value', help='Field of the avg aggregation')
+    parser.add_argument('--filter-field', type=str, default='asset_name', help='Field the dashboard filters on')
+    parser.add_argument('--ranges', type=int, nargs='+', default=DEFAULT_RANGES,
+                        help='Date range lengths in days, ending at the last timestamp in the index')
+    parser.add_argument('--intervals', type=str, nargs='+', choices=[name for name, _ in APP_INTERVALS],
+                        help="Histogram intervals to combine with every range (default: the app's choice per range)")
+    parser.add_argument('--shapes', type=str, nargs='+', choices=QUERY_SHAPES, help='Query shapes to send')
+    parser.add_argument('--use-rollups', type=str, nargs='+', metavar='INTERVAL',
+                        help='Send aggregations to the <index>_rollup_<interval> indices written with --rollups')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of query threads')
+    parser.add_argument('--hosts', type=str, nargs='+', metavar='URL',
+                        help='OpenSearch node URLs (defaults to those of the generator script; see its --hosts)')
+    parser.add_argument('--sniff', action='store_true', help="Discover the cluster's nodes and spread the queries")
+    parser.add_argument('--no-auth', action='store_true',
+                        help='Connect without $OPENSEARCH_USERNAME/$OPENSEARCH_PASSWORD credentials')
+    parser.add_argument('--duration', type=float, default=60, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of load before measuring')
+    parser.add_argument('--rate', type=float,
+                        help='Queries per second to schedule (default: closed loop, each thread as fast as it can)')
+    parser.add_argument('--request-cache', action='store_true',
+                        help='Let the shard request cache answer repeated aggregations')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the order queries are picked in')
+    parser.add_argument('--results', type=str,
+                        help='Append the run (options, index sizes, summary) to this JSON lines file')
+    args = parser.parse_args()
+
+    esp = load_esp()
+    try:
+        esp.configure_connection(args.hosts, args.sniff, require_auth=not args.no_auth)
+    except ValueError as e:
+        parser.error(str(e))
+    rollup_minutes = esp.ROLLUP_INTERVALS
+    unknown = [name for name in args.use_rollups or () if name not in rollup_minutes]
+    if unknown:
+        parser.error(f"unknown rollup intervals: {', '.join(unknown)}")
+
+    os_client = OpenSearch(**esp.OPENSEARCH_CONNECTION, pool_maxsize=args.concurrency)
+    info = discover_index(os_client, args.index, args.timestamp_field, args.filter_field)
+    print(f"'{args.index}': {len(info['filter_values'])} {args.filter_field} values, "
+          f"{info['min_date']:%Y-%m-%d %H:%M} to {info['max_date']:%Y-%m-%d %H:%M}")
+    for index_info in info["indices"]:
+        print(f"  {index_info['index']}: {index_info['docs']} docs, {index_info['size']}, "
+              f"{index_info['primaries']} primary shards")
+
+    workload = build_workload(args.index, args.annotations_index, info, args.ranges, args.intervals, args.shapes,
+                              args.timestamp_field, args.term_field, args.numeric_field, args.filter_field,
+                              args.use_rollups, rollup_minutes)
+    targets = sorted({query["index"] for query in workload})
+    print(f"{len(workload)} distinct queries on {', '.join(targets)}")
+    check_workload(os_client, workload)
+
+    mode = f"{args.rate:g} queries/s" if args.rate else "closed loop"
+    print(f"Running {args.concurrency} threads ({mode}) for {args.warmup:g}s warmup + {args.duration:g}s...")
+    samples, elapsed = run_load(os_client, workload, args.concurrency, args.duration, args.warmup, args.rate,
+                                args.request_cache, args.seed)
+    summary = summarize(samples, elapsed)
+    print_summary(summary)
+
+    if args.results:
+        run = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "options": vars(args),
+            "indices": info["indices"],
+            "queries": len(workload),
+            "summary": summary
+        }
+        with open(args.results, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"Results appended to {args.results}")
@@ -1,791 +1,4897 @@
+import bisect
 import json
+import math
 import random
 import time
 import argparse
+import asyncio
+import contextlib
+import gzip
+import os
+import queue
+import sys
+import threading
+import uuid
+import zlib
+from array import array
 from datetime import datetime, timedelta
-from opensearchpy import OpenSearch, helpers
-from concurrent.futures import ThreadPoolExecutor
+from opensearchpy import OpenSearch, TransportError, helpers
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
 
-def generate_esp_pump_data(start_date, end_date, assets=None, specific_sensors=None):
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for Parquet file shards
+    pa = None
+
+try:
+    from opensearchpy import AsyncOpenSearch
+except ImportError:  # Needs aiohttp; only the asyncio backend uses it
+    AsyncOpenSearch = None
+
+try:
+    import resource
+except ImportError:  # Unix only; plan_capacity reports no memory figures without it
+    resource = None
+
+try:
+    import yaml
+except ImportError:  # Only needed for YAML catalog files
+    yaml = None
+
+
+# Possible assets, sensors, and units
+ALL_ASSETS = [
+    "ESP_PUMP_01", "ESP_PUMP_02", "ESP_PUMP_03",
+    "ESP_PUMP_04", "ESP_PUMP_05"
+]
+
+ALL_SENSORS = {
+    # Existing sensors
+    "intake_pressure": {"min": 100, "max": 500, "unit": "psi", "is_float": False},
+    "discharge_pressure": {"min": 1000, "max": 3000, "unit": "psi", "is_float": False},
+    "motor_temperature": {"min": 70, "max": 250, "unit": "°F", "is_float": False},
+    "vibration": {"min": 0.1, "max": 5.0, "unit": "mm/s", "is_float": True},
+    "motor_current": {"min": 10, "max": 50, "unit": "A", "is_float": False},
+    "motor_voltage": {"min": 380, "max": 480, "unit": "V", "is_float": False},
+    "flow_rate": {"min": 100, "max": 2000, "unit": "bbl/d", "is_float": False},
+    "motor_frequency": {"min": 40, "max": 60, "unit": "Hz", "is_float": True},
+    "motor_power": {"min": 5, "max": 100, "unit": "kW", "is_float": False},
+
+    # New sensors
+    "pump_efficiency": {"min": 40, "max": 85, "unit": "%", "is_float": True},
+    "wellhead_pressure": {"min": 50, "max": 400, "unit": "psi", "is_float": False},
+    "motor_oil_temperature": {"min": 60, "max": 200, "unit": "°F", "is_float": False},
+    "pump_stage_differential_pressure": {"min": 50, "max": 300, "unit": "psi", "is_float": False},
+    "casing_pressure": {"min": 20, "max": 300, "unit": "psi", "is_float": False},
+    "tubing_pressure": {"min": 50, "max": 500, "unit": "psi", "is_float": False},
+    "gas_oil_ratio": {"min": 200, "max": 2000, "unit": "scf/bbl", "is_float": False},
+    "water_cut": {"min": 0, "max": 100, "unit": "%", "is_float": True},
+    "sand_rate": {"min": 0, "max": 50, "unit": "ppm", "is_float": True},
+    "motor_vibration_axial": {"min": 0.05, "max": 4.0, "unit": "mm/s", "is_float": True},
+    "motor_vibration_radial": {"min": 0.05, "max": 4.0, "unit": "mm/s", "is_float": True},
+    "motor_leakage_current": {"min": 0, "max": 10, "unit": "mA", "is_float": True},
+    "motor_winding_resistance": {"min": 0.1, "max": 2.0, "unit": "Ω", "is_float": True},
+    "motor_insulation_resistance": {"min": 1, "max": 100, "unit": "MΩ", "is_float": True},
+    "variable_frequency_drive_temperature": {"min": 70, "max": 180, "unit": "°F", "is_float": False}
+}
+
+# ESP pump operational issues with additional types
+PUMP_ISSUES = {
+    "gas_locking": {
+        "probability": 0.000005,
+        "duration": (30, 120),
+        "description": "Gas locking detected - pump efficiency severely reduced",
+        "effects": {
+            "intake_pressure": {"factor": -0.5},
+            "discharge_pressure": {"factor": -0.4},
+            "flow_rate": {"factor": -0.7},
+            "motor_current": {"factor": -0.3},
+            "motor_power": {"factor": -0.4},
+            "vibration": {"factor": 0.5},
+            "motor_temperature": {"factor": -0.1},
+            "pump_efficiency": {"factor": -0.6},  # Major efficiency drop
+            "pump_stage_differential_pressure": {"factor": -0.5},
+            "gas_oil_ratio": {"factor": 0.7},  # Increased GOR
+            "motor_vibration_axial": {"factor": 0.4},
+            "motor_vibration_radial": {"factor": 0.5}
+        }
+    },
+    "gas_interference": {
+        "probability": 0.00001,
+        "duration": (15, 60),
+        "description": "Gas interference detected - flow rate fluctuations observed",
+        "effects": {
+            "flow_rate": {"factor": -0.4},
+            "intake_pressure": {"factor": -0.3},
+            "discharge_pressure": {"factor": -0.2},
+            "vibration": {"factor": 0.3},
+            "motor_current": {"factor": -0.2},
+            "motor_power": {"factor": -0.25},
+            "motor_frequency": {"factor": 0.1},
+            "pump_efficiency": {"factor": -0.3},
+            "gas_oil_ratio": {"factor": 0.5},
+            "pump_stage_differential_pressure": {"factor": -0.25},
+            "motor_vibration_axial": {"factor": 0.2},
+            "motor_vibration_radial": {"factor": 0.3}
+        }
+    },
+    "sanding": {
+        "probability": 0.000002,
+        "duration": (60, 240),
+        "description": "Sand production detected - increased wear and vibration",
+        "effects": {
+            "flow_rate": {"factor": -0.5},
+            "intake_pressure": {"factor": -0.2},
+            "discharge_pressure": {"factor": -0.3},
+            "vibration": {"factor": 0.8},
+            "motor_current": {"factor": 0.3},
+            "motor_power": {"factor": 0.35},
+            "motor_temperature": {"factor": 0.2},
+            "motor_frequency": {"factor": -0.05},
+            "pump_efficiency": {"factor": -0.4},
+            "sand_rate": {"factor": 0.9},  # Major increase in sand
+            "motor_vibration_axial": {"factor": 0.7},
+            "motor_vibration_radial": {"factor": 0.8},
+            "pump_stage_differential_pressure": {"factor": -0.3}
+        }
+    },
+    "shutdown": {
+        "probability": 0.0000005,
+        "duration": (120, 480),
+        "description": "Pump shutdown - maintenance required",
+        "effects": {
+            "flow_rate": {"factor": -1.0},
+            "motor_current": {"factor": -1.0},
+            "motor_power": {"factor": -1.0},
+            "motor_frequency": {"factor": -1.0},
+            "vibration": {"factor": -0.9},
+            "motor_temperature": {"factor": -0.5},
+            "intake_pressure": {"factor": -0.3},
+            "discharge_pressure": {"factor": -0.8},
+            "pump_efficiency": {"factor": -1.0},
+            "wellhead_pressure": {"factor": -0.4},
+            "motor_vibration_axial": {"factor": -0.9},
+            "motor_vibration_radial": {"factor": -0.9},
+            "variable_frequency_drive_temperature": {"factor": -0.3}
+        }
+    },
+    "motor_overheating": {
+        "probability": 0.000003,
+        "duration": (45, 180),
+        "description": "Motor overheating detected - cooling system issue or excessive load",
+        "effects": {
+            "motor_temperature": {"factor": 0.7},
+            "motor_current": {"factor": 0.2},
+            "motor_power": {"factor": 0.25},
+            "vibration": {"factor": 0.3},
+            "flow_rate": {"factor": -0.2},
+            "motor_frequency": {"factor": -0.1},
+            "motor_oil_temperature": {"factor": 0.8},  # Significant oil temp increase
+            "variable_frequency_drive_temperature": {"factor": 0.5},
+            "motor_winding_resistance": {"factor": 0.3},
+            "motor_insulation_resistance": {"factor": -0.4},  # Decreased insulation resistance
+            "motor_leakage_current": {"factor": 0.6}  # Increased leakage current
+        }
+    },
+    "pump_cavitation": {
+        "probability": 0.0000025,
+        "duration": (20, 90),
+        "description": "Pump cavitation - insufficient suction pressure causing vapor bubbles",
+        "effects": {
+            "intake_pressure": {"factor": -0.6},
+            "discharge_pressure": {"factor": -0.3},
+            "vibration": {"factor": 0.9},
+            "flow_rate": {"factor": -0.4},
+            "motor_current": {"factor": 0.1},
+            "motor_power": {"factor": 0.15},
+            "pump_efficiency": {"factor": -0.5},
+            "pump_stage_differential_pressure": {"factor": -0.4},
+            "motor_vibration_axial": {"factor": 0.8},
+            "motor_vibration_radial": {"factor": 0.9},
+            "wellhead_pressure": {"factor": -0.2}
+        }
+    },
+    "scale_buildup": {
+        "probability": 0.0000015,
+        "duration": (240, 720),
+        "description": "Scale buildup detected - gradual performance degradation",
+        "effects": {
+            "flow_rate": {"factor": -0.35},
+            "discharge_pressure": {"factor": -0.25},
+            "motor_power": {"factor": 0.3},
+            "motor_current": {"factor": 0.25},
+            "motor_temperature": {"factor": 0.2},
+            "vibration": {"factor": 0.15},
+            "pump_efficiency": {"factor": -0.4},
+            "pump_stage_differential_pressure": {"factor": -0.3},
+            "tubing_pressure": {"factor": -0.2},
+            "wellhead_pressure": {"factor": -0.15},
+            "water_cut": {"factor": 0.2}  # Often associated with water production
+        }
+    },
+    "electrical_fault": {
+        "probability": 0.0000008,
+        "duration": (10, 60),
+        "description": "Electrical fault detected - power supply or motor winding issue",
+        "effects": {
+            "motor_voltage": {"factor": -0.4},
+            "motor_current": {"factor": 0.5},
+            "motor_frequency": {"factor": -0.3},
+            "motor_power": {"factor": 0.4},
+            "vibration": {"factor": 0.6},
+            "motor_temperature": {"factor": 0.5},
+            "motor_leakage_current": {"factor": 0.9},  # Major increase
+            "motor_winding_resistance": {"factor": 0.5},
+            "motor_insulation_resistance": {"factor": -0.7},  # Major decrease
+            "variable_frequency_drive_temperature": {"factor": 0.6}
+        }
+    },
+    "bearing_wear": {
+        "probability": 0.0000012,
+        "duration": (180, 600),
+        "description": "Bearing wear detected - increased friction and vibration",
+        "effects": {
+            "vibration": {"factor": 0.7},
+            "motor_temperature": {"factor": 0.4},
+            "motor_current": {"factor": 0.2},
+            "motor_power": {"factor": 0.3},
+            "flow_rate": {"factor": -0.15},
+            "motor_frequency": {"factor": -0.05},
+            "motor_vibration_axial": {"factor": 0.8},
+            "motor_vibration_radial": {"factor": 0.9},
+            "motor_oil_temperature": {"factor": 0.5},
+            "pump_efficiency": {"factor": -0.2}
+        }
+    },
+    "pump_wear": {
+        "probability": 0.0000018,
+        "duration": (240, 720),
+        "description": "Pump wear detected - impeller or diffuser erosion",
+        "effects": {
+            "flow_rate": {"factor": -0.45},
+            "discharge_pressure": {"factor": -0.4},
+            "motor_power": {"factor": 0.15},
+            "vibration": {"factor": 0.4},
+            "intake_pressure": {"factor": -0.1},
+            "pump_efficiency": {"factor": -0.5},
+            "pump_stage_differential_pressure": {"factor": -0.4},
+            "motor_vibration_axial": {"factor": 0.3},
+            "motor_vibration_radial": {"factor": 0.4}
+        }
+    },
+    "water_breakthrough": {
+        "probability": 0.0000014,
+        "duration": (360, 1440),  # Can be long-lasting
+        "description": "Water breakthrough detected - increased water production",
+        "effects": {
+            "water_cut": {"factor": 0.8},  # Major increase in water cut
+            "flow_rate": {"factor": -0.2},
+            "pump_efficiency": {"factor": -0.25},
+            "motor_power": {"factor": 0.1},
+            "motor_current": {"factor": 0.1},
+            "gas_oil_ratio": {"factor": -0.3}  # Usually decreases with water
+        }
+    },
+    "vfd_fault": {
+        "probability": 0.0000007,
+        "duration": (15, 120),
+        "description": "Variable frequency drive fault - electrical or cooling issue",
+        "effects": {
+            "motor_frequency": {"factor": -0.4},
+            "motor_voltage": {"factor": -0.3},
+            "motor_current": {"factor": 0.3},
+            "variable_frequency_drive_temperature": {"factor": 0.8},
+            "motor_power": {"factor": -0.3},
+            "flow_rate": {"factor": -0.3}
+        }
+    }
+}
+
+# Increase issue probabilities for more visible events
+for _issue in PUMP_ISSUES:
+    PUMP_ISSUES[_issue]["probability"] *= 5  # Make issues 5x more common for better visibility
+
+# How quickly sensors move toward their issue target value (fraction per reading)
+FAST_ISSUES = ["shutdown", "electrical_fault", "vfd_fault"]  # Fast changes (30% per reading)
+MEDIUM_ISSUES = ["gas_locking", "gas_interference", "pump_cavitation"]  # Medium changes (20% per reading)
+
+# Issues with more erratic readings while active
+ERRATIC_ISSUES = ["vibration", "gas_interference", "pump_cavitation"]
+
+# Seconds between readings. The simulation steps at this interval (which must divide a minute); sensors may
+# report less often through a sample_seconds entry in their configuration (a multiple of the step that divides
+# the 5 minute rollup bucket)
+DEFAULT_SAMPLE_SECONDS = 60
+
+# Documents per chunk passed from the generators to the bulk writers
+DEFAULT_CHUNK_SIZE = 20000
+
+# Long-format readings travel from the generators to the writers as reading blocks (see reading_block): one
+# 16 byte row per reading instead of a document dict, with the time in epoch seconds and the asset and sensor
+# as codes into the block's lookup tables
+READING_DTYPE = np.dtype([("time", "<u4"), ("asset", "<u2"), ("sensor", "<u2"), ("value", "<f8")])
+
+# Upper bound on the estimated size of bulk requests queued or in flight at once
+DEFAULT_MAX_INFLIGHT_BYTES = 256 * 1024 * 1024
+
+# Annotations per bulk request
+ANNOTATION_CHUNK_SIZE = 500
+
+# How long after an issue starts its annotation is created (from the sensor values at that time)
+ANNOTATION_DELAY = timedelta(minutes=5)
+
+# Change detection for backfill_annotations: an issue's score is how closely the affected sensors' changes
+# against their baseline (an exponential moving average while no issue is open) match its effect factors,
+# from 0 (no change) to 1 (every factor reached). A segment opens at onset_score (starting from the preceding
+# buckets of up to rise_minutes already above rise_score and the bucket before them, as issues ramp up and
+# start within a bucket that averages mostly normal readings), counts once it reaches
+# confirm_score and closes below end_ratio x its peak; segments longer than max_segment_ratio x the longest
+# issue are taken for a shift in normal operation and restart the baseline
+ANNOTATION_DETECTION = {"baseline_alpha": 0.05, "rise_score": 0.1, "rise_minutes": 30, "onset_score": 0.25,
+                        "confirm_score": 0.5, "end_ratio": 0.5, "min_sensors": 2, "max_segment_ratio": 1.5}
+
+# Readings (minutes x assets x sensors) the vectorized engine simulates at once; bounds its memory for large fleets
+VECTORIZED_BLOCK_READINGS = 2 * 1024 * 1024
+
+# Rollup granularities (minutes per bucket) the generators can pre-aggregate, and rollups per bulk request
+ROLLUP_INTERVALS = {"5m": 5, "1h": 60, "1d": 1440}
+ROLLUP_CHUNK_SIZE = 5000
+
+# Documents per file shard written by write_to_files
+DEFAULT_DOCS_PER_FILE = 1000000
+
+# Buckets per composite aggregation page when reading indexed data back (backfill_annotations)
+COMPOSITE_PAGE_SIZE = 10000
+
+# Hits per search_after page of an export slice, and how long each page keeps the point in time open
+EXPORT_PAGE_SIZE = 10000
+EXPORT_KEEP_ALIVE = "10m"
+
+# Assumptions plan_capacity projects with where a sample day cannot measure: on-disk bytes per bulk byte with
+# the managed templates (best_compression, index sorting, keyword dimensions), replicas set after the load, and
+# the indexing rate per bulk worker when the cluster's rate is not given
+INDEX_SIZE_RATIO = 0.35
+FINAL_REPLICAS = 1
+ASSUMED_WORKER_DOCS_PER_SEC = 25000
+
+# Connection settings shared by the sync and async clients (credentials are set by configure_connection)
+OPENSEARCH_CONNECTION = {
+    "hosts": ['https://127.0.0.1:9200'],
+    "verify_certs": False,  # Disable SSL certificate verification
+    "ssl_show_warn": False,
+    "ssl_assert_hostname": False,  # Disable hostname verification if required
+    "request_timeout": 120  # Increased timeout
+}
+
+# Client options that make opensearch-py sniff the cluster's nodes (set by configure_connection)
+SNIFF_OPTIONS = {"sniff_on_start": True, "sniff_on_connection_fail": True, "sniffer_timeout": 60}
+
+# Per-node bookkeeping of the bulk dispatcher: smoothing of the latency and rejection averages, how much a
+# node's rejection rate inflates its score, and how long a node that failed to answer is avoided
+NODE_EWMA_ALPHA = 0.2
+NODE_REJECTION_WEIGHT = 4
+NODE_COOLDOWN_SECONDS = 30
+
+# Bulk request size the adaptive controller aims for, and the range it may move the chunk size in
+DEFAULT_TARGET_BULK_BYTES = 10 * 1024 * 1024
+MIN_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 200000
+
+# Version of the index templates managed by this script; bump when mappings or settings change
+INDEX_TEMPLATE_VERSION = 3
+
+# Dimension mapping of the managed templates: keyword only, without subfields (the app aggregates
+# keyword fields directly, see getAggregationField in lib/opensearch.ts)
+DIMENSION_MAPPING = {"type": "keyword"}
+
+# Documents per primary shard used to derive the shard count from the estimated volume
+DEFAULT_DOCS_PER_SHARD = 50000000
+
+# Base maintenance recommendation per issue type
+ISSUE_RECOMMENDATIONS = {
+    "gas_locking": "Implement gas separation techniques and reduce pump intake pressure.",
+    "gas_interference": "Adjust pump speed and intake pressure. Consider gas handling equipment.",
+    "sanding": "Install sand control equipment and schedule pump cleaning.",
+    "shutdown": "Perform complete maintenance inspection. Check electrical connections.",
+    "motor_overheating": "Check cooling system and reduce load. Inspect motor insulation.",
+    "pump_cavitation": "Increase intake pressure and check for flow restrictions.",
+    "scale_buildup": "Schedule chemical treatment and mechanical cleaning.",
+    "electrical_fault": "Inspect VFD and power supply. Check motor winding resistance.",
+    "bearing_wear": "Replace bearings and check shaft alignment. Verify lubrication.",
+    "pump_wear": "Schedule impeller replacement. Check for abrasive particles.",
+    "water_breakthrough": "Adjust production strategy and monitor water cut.",
+    "vfd_fault": "Check VFD cooling and electrical connections. Verify power quality."
+}
+
+
+def load_catalog(path):
+    """
+    Load an asset/sensor/issue catalog describing the simulated fleet from a YAML or JSON file.
+
+    The file has three sections:
+
+        sensor_templates:        # Named sensor sets: "all", or lists of ALL_SENSORS names
+          basic: [intake_pressure, discharge_pressure, motor_temperature, flow_rate]
+          gas_well:              # and/or custom sensors with min, max, unit (and is_float)
+            - intake_pressure
+            - {name: casing_gas_rate, min: 0, max: 500, unit: Mscf/d, is_float: true}
+            - {name: vibration, sample_seconds: 1}   # Built-in sensor with overrides
+        issue_models:            # Named issue models based on PUMP_ISSUES
+          sandy:
+            rate: 1.5            # Multiplies every issue probability
+            issues:              # Per-issue overrides of probability, duration and effects
+              sanding: {probability: 0.0005}
+              gas_locking: {effects: {casing_gas_rate: {factor: 0.6}}}
+        assets:                  # Asset groups: prefix + count (numbered from start) or explicit names
+          - {prefix: FIELD_A_ESP_, count: 4000, sensors: basic, issue_model: sandy}
+          - {names: [ESP_PUMP_01, ESP_PUMP_02], sensors: all, issue_rate: 3}
+
+    Groups without sensors use all sensors, groups without issue_model use
+    PUMP_ISSUES unchanged, and issue_rate scales the issue probabilities of the
+    group's assets on top of the model's rate. A sensor's sample_seconds makes
+    it report less often than every simulation step (see sensor_sample_steps).
+
+    Args:
+        path: Catalog file (.yaml/.yml needs PyYAML, anything else is read as JSON)
+
+    Returns:
+        Catalog dictionary with one entry per asset group (name, assets, sensors, issues)
+    """
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ImportError("YAML catalogs need PyYAML (pip install pyyaml)")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    sensor_templates = {"all": ALL_SENSORS}
+    for template_name, entries in (spec.get("sensor_templates") or {}).items():
+        if entries == "all":
+            sensor_templates[template_name] = ALL_SENSORS
+            continue
+        sensors = {}
+        for entry in entries:
+            if isinstance(entry, str):
+                if entry not in ALL_SENSORS:
+                    raise ValueError(f"Sensor template '{template_name}': unknown sensor '{entry}'")
+                sensors[entry] = ALL_SENSORS[entry]
+            elif entry.get("name") in ALL_SENSORS:
+                sensors[entry["name"]] = dict(ALL_SENSORS[entry["name"]],
+                                              **{key: value for key, value in entry.items() if key != "name"})
+            else:
+                missing = [key for key in ("name", "min", "max", "unit") if key not in entry]
+                if missing:
+                    raise ValueError(f"Sensor template '{template_name}': custom sensor needs {', '.join(missing)}")
+                sensors[entry["name"]] = {"min": entry["min"], "max": entry["max"], "unit": entry["unit"],
+                                          "is_float": bool(entry.get("is_float", False))}
+            if "sample_seconds" in entry:
+                sensors[entry["name"]]["sample_seconds"] = int(entry["sample_seconds"])
+        sensor_templates[template_name] = sensors
+
+    issue_models = {}
+    for model_name, model in (spec.get("issue_models") or {}).items():
+        model = model or {}
+        overrides = model.get("issues") or {}
+        unknown = [issue_name for issue_name in overrides if issue_name not in PUMP_ISSUES]
+        if unknown:
+            raise ValueError(f"Issue model '{model_name}': unknown issues {', '.join(unknown)}")
+        issues = {}
+        for issue_name, issue_config in PUMP_ISSUES.items():
+            override = overrides.get(issue_name) or {}
+            issues[issue_name] = {
+                "probability": override.get("probability", issue_config["probability"]) * model.get("rate", 1.0),
+                "duration": tuple(override.get("duration", issue_config["duration"])),
+                "description": issue_config["description"],
+                "effects": dict(issue_config["effects"], **override.get("effects", {}))
+            }
+        issue_models[model_name] = issues
+
+    groups = []
+    seen_assets = set()
+    for position, entry in enumerate(spec.get("assets") or []):
+        if "names" in entry:
+            assets = list(entry["names"])
+        else:
+            first = entry.get("start", 1)
+            width = entry.get("number_width", max(2, len(str(first + entry["count"] - 1))))
+            assets = [f"{entry['prefix']}{number:0{width}d}" for number in range(first, first + entry["count"])]
+        duplicates = seen_assets.intersection(assets)
+        if duplicates or len(set(assets)) != len(assets):
+            raise ValueError(f"Asset group {position}: asset names must be unique "
+                             f"({', '.join(sorted(duplicates)[:5]) or 'repeated within the group'})")
+        seen_assets.update(assets)
+
+        template_name = entry.get("sensors", "all")
+        if template_name not in sensor_templates:
+            raise ValueError(f"Asset group {position}: unknown sensor template '{template_name}'")
+        model_name = entry.get("issue_model")
+        if model_name is not None and model_name not in issue_models:
+            raise ValueError(f"Asset group {position}: unknown issue model '{model_name}'")
+        issues = issue_models[model_name] if model_name is not None else PUMP_ISSUES
+        issue_rate = entry.get("issue_rate", 1.0)
+        if issue_rate != 1.0:
+            issues = {issue_name: dict(issue_config, probability=issue_config["probability"] * issue_rate)
+                      for issue_name, issue_config in issues.items()}
+
+        groups.append({
+            "name": entry.get("name", f"group_{position}"),
+            "assets": assets,
+            "sensors": sensor_templates[template_name],
+            "issues": issues
+        })
+
+    if not groups:
+        raise ValueError(f"Catalog {path} defines no assets")
+    if len({group["name"] for group in groups}) != len(groups):
+        raise ValueError(f"Catalog {path}: asset group names must be unique")
+    return {"groups": groups}
+
+
+def default_catalog(assets=None):
+    """Catalog of the built-in fleet: the given assets (ALL_ASSETS by default) with all sensors and PUMP_ISSUES"""
+    return {"groups": [{
+        "name": "default",
+        "assets": list(assets) if assets else list(ALL_ASSETS),
+        "sensors": ALL_SENSORS,
+        "issues": PUMP_ISSUES
+    }]}
+
+
+def catalog_groups(catalog=None, assets=None, specific_sensors=None):
+    """
+    Select the asset groups to simulate from a catalog.
+
+    Args:
+        catalog: Catalog from load_catalog (defaults to the built-in fleet)
+        assets: List of assets to generate data for (defaults to all assets of the catalog)
+        specific_sensors: List of specific sensors to generate data for (defaults to all sensors of each group)
+
+    Returns:
+        List of groups, each with its assets, sensor configurations and issue model
+    """
+    if catalog is None:
+        catalog = default_catalog(assets)
+
+    selected = set(assets) if assets else None
+    groups = []
+    for group in catalog["groups"]:
+        group_assets = [asset for asset in group["assets"] if selected is None or asset in selected]
+        sensors = {k: v for k, v in group["sensors"].items() if not specific_sensors or k in specific_sensors}
+        if group_assets and sensors:
+            groups.append(dict(group, assets=group_assets, sensors=sensors))
+
+    if selected:
+        unknown = selected.difference(asset for group in catalog["groups"] for asset in group["assets"])
+        if unknown:
+            raise ValueError(f"Assets not in the catalog: {', '.join(sorted(unknown)[:5])}")
+    return groups
+
+
+def catalog_sensors(catalog):
+    """Union of the sensor configurations used by the catalog's groups"""
+    sensors = {}
+    for group in catalog["groups"]:
+        sensors.update(group["sensors"])
+    return sensors
+
+
+def with_sensor_sample_seconds(catalog, sensor_sample_seconds):
+    """
+    Copy of a catalog with the sampling interval of some sensors overridden in every group that has them.
+
+    Args:
+        catalog: Catalog from load_catalog or default_catalog
+        sensor_sample_seconds: Dictionary of sensor name -> seconds between readings
+
+    Returns:
+        Catalog dictionary
+    """
+    groups = []
+    for group in catalog["groups"]:
+        sensors = {name: dict(config, sample_seconds=sensor_sample_seconds[name])
+                   if name in sensor_sample_seconds else config for name, config in group["sensors"].items()}
+        groups.append(dict(group, sensors=sensors))
+    return {"groups": groups}
+
+
+def empty_issue_state():
+    """Issue state for an asset with no active issue (next_onset is scheduled when the asset is first simulated)"""
+    return {
+        "issue": None,
+        "end_time": None,
+        "severity": 0,
+        "start_time": None,
+        "affected_sensors": {},
+        "annotation_created": False,
+        "next_onset": None
+    }
+
+
+def asset_seed(seed, asset_name):
+    """Derive a stable per-asset seed so each asset has its own reproducible random stream"""
+    return [seed, zlib.crc32(asset_name.encode("utf-8"))]
+
+
+def issue_schedule(issues):
+    """
+    Onset and issue type distribution of an issue model for the event scheduler.
+
+    Checking every issue's per-minute probability in order (first hit wins)
+    starts an issue in an idle minute with probability 1 - prod(1 - p), and
+    issue i with probability p_i * prod(1 - p_j for j < i). The scheduler
+    samples the geometric waiting time until that happens and the issue type
+    directly instead of drawing once per issue and minute.
+
+    Args:
+        issues: Issue model (issue name -> probability, duration, description, effects)
+
+    Returns:
+        Dictionary with issue names, the per-minute onset probability and cumulative issue type weights
+    """
+    names = list(issues)
+    cumulative = []
+    none_yet = 1.0  # Probability that none of the earlier issues fired
+    for issue_name in names:
+        cumulative.append((cumulative[-1] if cumulative else 0.0) + none_yet * issues[issue_name]["probability"])
+        none_yet *= 1.0 - issues[issue_name]["probability"]
+    return {"names": names, "probability": 1.0 - none_yet, "cumulative": cumulative}
+
+
+def schedule_issue_onset(rng, schedule, idle_from):
+    """
+    Sample the minute the next issue starts on an asset that is idle from idle_from on.
+
+    Args:
+        rng: The asset's random stream (random.Random or numpy Generator)
+        schedule: Dictionary from issue_schedule
+        idle_from: First idle minute
+
+    Returns:
+        Onset time (datetime.max if the issue model never starts an issue)
+    """
+    if schedule["probability"] <= 0.0:
+        return datetime.max
+    # Idle minutes before the onset: geometric waiting time by inversion
+    idle_minutes = math.floor(math.log1p(-rng.random()) / math.log1p(-schedule["probability"]))
+    try:
+        return idle_from + timedelta(minutes=idle_minutes)
+    except OverflowError:
+        return datetime.max
+
+
+def choose_issue(rng, schedule):
+    """Sample which issue starts at a scheduled onset"""
+    position = bisect.bisect_right(schedule["cumulative"], rng.random() * schedule["cumulative"][-1])
+    return schedule["names"][min(position, len(schedule["names"]) - 1)]
+
+
+def init_simulator_state(state, groups, seed, make_rng):
+    """
+    Fill in missing per-group simulator state in place.
+
+    The state carries everything needed to continue a simulation on the next day,
+    per asset group: the group's assets and sensor names, last_values and
+    normal_values as (assets x sensors) float arrays (NaN until known),
+    active_issues and rngs as lists in asset order.
+
+    Args:
+        state: Simulator state dictionary to initialize (may be partially filled)
+        groups: Asset groups being simulated (see catalog_groups)
+        seed: Random seed, or None for unseeded streams
+        make_rng: Callable creating a random stream from a per-asset seed (or None)
+
+    Returns:
+        The same state dictionary
+    """
+    state.setdefault("groups", {})
+
+    for group in groups:
+        sensor_names = list(group["sensors"])
+        group_state = state["groups"].get(group["name"])
+        if group_state is None:
+            state["groups"][group["name"]] = {
+                "assets": list(group["assets"]),
+                "sensors": sensor_names,
+                "rngs": [make_rng(asset_seed(seed, asset) if seed is not None else None)
+                         for asset in group["assets"]],
+                "last_values": np.full((len(group["assets"]), len(sensor_names)), np.nan),
+                "normal_values": np.full((len(group["assets"]), len(sensor_names)), np.nan),
+                "active_issues": [empty_issue_state() for _ in group["assets"]]
+            }
+        elif group_state["assets"] != list(group["assets"]) or group_state["sensors"] != sensor_names:
+            raise ValueError(f"Simulator state of group '{group['name']}' was created for other assets or sensors")
+        else:
+            # States saved before active issues carried their configuration
+            for issue_state in group_state["active_issues"]:
+                if issue_state["issue"] is not None and "config" not in issue_state:
+                    issue_state["config"] = group["issues"][issue_state["issue"]]
+
+    return state
+
+
+def serialize_simulator_state(state):
+    """
+    Convert the simulator state into a JSON-compatible dictionary.
+
+    Random streams are saved with their full internal state (random.Random for the
+    scalar engine, numpy Generators for the vectorized one), value arrays as
+    nested lists (null for values not drawn yet) and issue times as ISO strings,
+    so restore_simulator_state continues the exact same sequence.
+
+    Args:
+        state: Simulator state dictionary (see init_simulator_state)
+
+    Returns:
+        Dictionary that can be written with json.dump
+    """
+    groups = {}
+    for group_name, group_state in state["groups"].items():
+        rngs = []
+        for rng in group_state["rngs"]:
+            if isinstance(rng, random.Random):
+                rngs.append({"type": "random", "state": rng.getstate()})
+            else:
+                rngs.append({"type": "numpy", "state": rng.bit_generator.state})
+
+        active_issues = []
+        for issue_state in group_state["active_issues"]:
+            issue_state = dict(issue_state)
+            for key in ("start_time", "end_time", "next_onset"):
+                if issue_state.get(key) is not None:
+                    issue_state[key] = issue_state[key].isoformat()
+            active_issues.append(issue_state)
+
+        groups[group_name] = {
+            "assets": group_state["assets"],
+            "sensors": group_state["sensors"],
+            "rngs": rngs,
+            "last_values": [[None if value != value else value for value in row]
+                            for row in group_state["last_values"].tolist()],
+            "normal_values": [[None if value != value else value for value in row]
+                              for row in group_state["normal_values"].tolist()],
+            "active_issues": active_issues
+        }
+
+    return {"groups": groups}
+
+
+def restore_simulator_state(data):
+    """
+    Rebuild a simulator state dictionary saved by serialize_simulator_state.
+
+    Args:
+        data: Dictionary returned by serialize_simulator_state (after a JSON round trip)
+
+    Returns:
+        Simulator state dictionary to pass to the generators as state
+    """
+    groups = {}
+    for group_name, saved_group in data["groups"].items():
+        rngs = []
+        for saved in saved_group["rngs"]:
+            if saved["type"] == "random":
+                version, internal_state, gauss_next = saved["state"]
+                rng = random.Random()
+                rng.setstate((version, tuple(internal_state), gauss_next))
+            else:
+                rng = np.random.Generator(getattr(np.random, saved["state"]["bit_generator"])())
+                rng.bit_generator.state = saved["state"]
+            rngs.append(rng)
+
+        active_issues = []
+        for issue_state in saved_group["active_issues"]:
+            issue_state = dict(issue_state)
+            for key in ("start_time", "end_time", "next_onset"):
+                if issue_state.get(key) is not None:
+                    issue_state[key] = datetime.fromisoformat(issue_state[key])
+            active_issues.append(issue_state)
+
+        num_sensors = len(saved_group["sensors"])
+        groups[group_name] = {
+            "assets": saved_group["assets"],
+            "sensors": saved_group["sensors"],
+            "rngs": rngs,
+            "last_values": np.array(saved_group["last_values"], dtype=float).reshape(-1, num_sensors),
+            "normal_values": np.array(saved_group["normal_values"], dtype=float).reshape(-1, num_sensors),
+            "active_issues": active_issues
+        }
+
+    return {"groups": groups}
+
+
+def rollup_documents(asset_name, day_start, sensor_names, units, values, rollup_intervals,
+                     sample_seconds=DEFAULT_SAMPLE_SECONDS, sensor_steps=None):
+    """
+    Pre-aggregate one asset's readings for a day into rollup documents.
+
+    Each rollup document holds sample_count, sensor_sum, sensor_min and
+    sensor_max for one asset/sensor/bucket, and the average as sensor_value,
+    so dashboards can point avg aggregations at a rollup index unchanged.
+
+    Args:
+        asset_name: Asset the readings belong to
+        day_start: Midnight of the day
+        sensor_names: Sensor names, one per column of values
+        units: Sensor units, one per column of values
+        values: Array of shape (steps, sensors) with the day's simulated values from midnight
+        rollup_intervals: Rollup granularities to produce (keys of ROLLUP_INTERVALS)
+        sample_seconds: Seconds per row of values
+        sensor_steps: Rows between readings per sensor (from sensor_sample_steps, defaults to every row);
+            only the rows a sensor reports are aggregated
+
+    Returns:
+        List of rollup documents
+    """
+    if sensor_steps is None:
+        sensor_steps = [1] * values.shape[1]
+    # Sensors reporting at the same rate are aggregated together
+    columns_by_step = {}
+    for column, every in enumerate(sensor_steps):
+        columns_by_step.setdefault(every, []).append(column)
+
+    documents = []
+    for interval in rollup_intervals:
+        minutes = ROLLUP_INTERVALS[interval]
+        bucket_count = values.shape[0] * sample_seconds // (minutes * 60)
+        sums = np.empty((bucket_count, values.shape[1]))
+        mins = np.empty_like(sums)
+        maxs = np.empty_like(sums)
+        counts = np.empty(values.shape[1], dtype=int)
+        for every, columns in columns_by_step.items():
+            readings = values if every == 1 and len(columns) == values.shape[1] else values[::every, columns]
+            buckets = readings.reshape(bucket_count, -1, len(columns))
+            sums[:, columns] = buckets.sum(axis=1)
+            mins[:, columns] = buckets.min(axis=1)
+            maxs[:, columns] = buckets.max(axis=1)
+            counts[columns] = buckets.shape[1]
+        counts = counts.tolist()
+        timestamps = [(day_start + timedelta(minutes=bucket * minutes)).strftime("%Y-%m-%dT%H:%M:%S") + ".000Z"
+                      for bucket in range(bucket_count)]
+        for timestamp, bucket_sums, bucket_mins, bucket_maxs, bucket_avgs in zip(
+                timestamps, np.round(sums, 4).tolist(), mins.tolist(), maxs.tolist(),
+                np.round(sums / counts, 4).tolist()):
+            for sensor_name, unit, count, total, low, high, avg in zip(sensor_names, units, counts, bucket_sums,
+                                                                       bucket_mins, bucket_maxs, bucket_avgs):
+                documents.append({
+                    "timestamp": timestamp,
+                    "asset_name": asset_name,
+                    "sensor_name": sensor_name,
+                    "sensor_unit": unit,
+                    "interval": interval,
+                    "sample_count": count,
+                    "sensor_sum": total,
+                    "sensor_min": low,
+                    "sensor_max": high,
+                    "sensor_value": avg
+                })
+    return documents
+
+
+def sensor_sample_steps(sensors_to_use, sample_seconds):
+    """
+    Validate the sampling intervals and return every how many simulation steps each sensor reports.
+
+    Args:
+        sensors_to_use: Sensor configurations (an optional sample_seconds overrides the step interval)
+        sample_seconds: Seconds per simulation step
+
+    Returns:
+        List with the steps between readings per sensor position
+    """
+    if sample_seconds <= 0 or 60 % sample_seconds:
+        raise ValueError(f"sample_seconds must divide a minute (got {sample_seconds})")
+    steps = []
+    for sensor_name, sensor_config in sensors_to_use.items():
+        sensor_seconds = sensor_config.get("sample_seconds", sample_seconds)
+        if sensor_seconds % sample_seconds or 300 % sensor_seconds:
+            raise ValueError(f"Sensor '{sensor_name}': sample_seconds {sensor_seconds} must be a multiple of "
+                             f"{sample_seconds} that divides 300")
+        steps.append(sensor_seconds // sample_seconds)
+    return steps
+
+
+def per_step_rate(rate, step_minutes):
+    """Fraction per simulation step that compounds to rate per minute"""
+    return rate if step_minutes == 1 else 1 - (1 - rate) ** step_minutes
+
+
+def per_step_noise(width, step_minutes):
+    """Noise width per simulation step whose random walk spreads like width per minute"""
+    return width if step_minutes == 1 else width * math.sqrt(step_minutes)
+
+
+def issue_adjustment_rate(issue_name):
+    """Fraction of the distance to the issue target value that affected sensors move per reading"""
+    if issue_name in FAST_ISSUES:
+        return 0.3  # Fast changes (30% per reading)
+    if issue_name in MEDIUM_ISSUES:
+        return 0.2  # Medium changes (20% per reading)
+    return 0.1  # Slower changes (10% per reading)
+
+
+def issue_fluctuation(issue_name):
+    """Maximum relative fluctuation of affected sensors per reading while the issue is active"""
+    return 0.03 if issue_name in ERRATIC_ISSUES else 0.01  # More erratic or more stable
+
+
+def scalar_group_tables(sensors_to_use, issues, sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Lookup tables the scalar engine simulates an asset group with, indexed by sensor position.
+
+    Args:
+        sensors_to_use: Sensor configurations of the group
+        issues: Issue model of the group (issue name -> probability, duration, description, effects)
+        sample_seconds: Seconds per simulation step (rates and fluctuations are scaled to it)
+
+    Returns:
+        Dictionary with the sensors as (name, min, max, unit, is_float, steps between readings) tuples and,
+        per issue, the effect factor of every sensor (None if unaffected), the adjustment rate per step and
+        the fluctuation as the (offset, width) rng.uniform would use
+    """
+    sensor_names = list(sensors_to_use)
+    step_minutes = sample_seconds / 60
+    fluctuations = {issue_name: per_step_noise(issue_fluctuation(issue_name), step_minutes) for issue_name in issues}
+    return {
+        "sensors": [(name, config["min"], config["max"], config["unit"], config["is_float"], every)
+                    for (name, config), every in zip(sensors_to_use.items(),
+                                                     sensor_sample_steps(sensors_to_use, sample_seconds))],
+        "effects": {issue_name: [issue_config["effects"][name]["factor"] if name in issue_config["effects"] else None
+                                 for name in sensor_names]
+                    for issue_name, issue_config in issues.items()},
+        "adjustment_rates": {issue_name: per_step_rate(issue_adjustment_rate(issue_name), step_minutes)
+                             for issue_name in issues},
+        "fluctuations": {issue_name: (-width, width - -width) for issue_name, width in fluctuations.items()}
+    }
+
+
+def reading_lookup(groups):
+    """
+    Lookup tables for the asset and sensor codes of the reading blocks a generator produces.
+
+    Args:
+        groups: Asset groups being simulated (from catalog_groups)
+
+    Returns:
+        Tuple of (lookup with the asset names and the sensors as (name, unit, is_float) entries,
+        dictionary with the sensor codes of each group's sensor positions)
+    """
+    lookup = {"assets": [asset_name for group in groups for asset_name in group["assets"]], "sensors": []}
+    sensor_codes = {}
+    group_codes = {}
+    for group in groups:
+        codes = []
+        for sensor_name, sensor_config in group["sensors"].items():
+            entry = (sensor_name, sensor_config["unit"], bool(sensor_config["is_float"]))
+            if entry not in sensor_codes:
+                sensor_codes[entry] = len(lookup["sensors"])
+                lookup["sensors"].append(entry)
+            codes.append(sensor_codes[entry])
+        group_codes[group["name"]] = np.array(codes, dtype=READING_DTYPE["sensor"])
+    return lookup, group_codes
+
+
+def reading_block(lookup, times=(), asset_codes=(), sensor_codes=(), values=()):
+    """
+    Build a reading block: long-format readings held as READING_DTYPE columns.
+
+    Generators yield reading blocks as their "data" instead of lists of documents,
+    and the writers serialize them directly (see serialize_bulk_body); use
+    batch_documents where documents are needed.
+
+    Args:
+        lookup: Lookup tables from reading_lookup
+        times: Reading times in epoch seconds
+        asset_codes: Asset codes (or a single code for all readings)
+        sensor_codes: Sensor codes
+        values: Reading values
+
+    Returns:
+        Dictionary with the lookup tables and the readings array
+    """
+    readings = np.empty(len(values), dtype=READING_DTYPE)
+    readings["time"] = times
+    readings["asset"] = asset_codes
+    readings["sensor"] = sensor_codes
+    readings["value"] = values
+    return {"lookup": lookup, "readings": readings}
+
+
+def asset_day_block(lookup, asset_code, day_start, sample_seconds, sensor_codes, values, reports):
+    """
+    Reading block of one asset's day, in the generators' (step, sensor) order.
+
+    Args:
+        lookup: Lookup tables from reading_lookup
+        asset_code: Code of the asset
+        day_start: Midnight of the day
+        sample_seconds: Seconds per row of values
+        sensor_codes: Sensor code per column of values
+        values: Array of shape (steps, sensors) with the day's values
+        reports: Boolean array of the same shape, whether the sensor reports at the step
+
+    Returns:
+        Reading block
+    """
+    steps, columns = np.nonzero(reports)
+    day_seconds = (day_start - datetime(1970, 1, 1)) // timedelta(seconds=1)
+    return reading_block(lookup, day_seconds + steps * sample_seconds, asset_code, sensor_codes[columns],
+                         values[steps, columns])
+
+
+def sensor_reports(steps_per_day, sensor_steps):
+    """Boolean array of shape (steps, sensors): whether each sensor reports at each step of a day"""
+    return np.arange(steps_per_day)[:, None] % np.array(sensor_steps)[None, :] == 0
+
+
+def document_count(data):
+    """Number of documents in a list of documents or a reading block"""
+    return len(data["readings"]) if isinstance(data, dict) else len(data)
+
+
+def slice_documents(data, start, stop):
+    """Documents start to stop of a list of documents or a reading block"""
+    if isinstance(data, dict):
+        return {"lookup": data["lookup"], "readings": data["readings"][start:stop]}
+    return data[start:stop]
+
+
+def select_documents(data, positions):
+    """Documents at positions of a list of documents or a reading block"""
+    if isinstance(data, dict):
+        return {"lookup": data["lookup"], "readings": data["readings"][np.array(positions, dtype=np.intp)]}
+    return [data[position] for position in positions]
+
+
+def join_documents(pieces):
+    """
+    Concatenate lists of documents or reading blocks.
+
+    Blocks with different lookup tables (from the shards of the parallel
+    generator) are recoded into a merged lookup.
+
+    Args:
+        pieces: Lists of documents or reading blocks
+
+    Returns:
+        One list of documents or reading block ([] without pieces)
+    """
+    if not pieces:
+        return []
+    if not isinstance(pieces[0], dict):
+        return [document for piece in pieces for document in piece]
+    if len(pieces) == 1:
+        return pieces[0]
+
+    lookup = pieces[0]["lookup"]
+    if all(piece["lookup"] is lookup or piece["lookup"] == lookup for piece in pieces):
+        return {"lookup": lookup, "readings": np.concatenate([piece["readings"] for piece in pieces])}
+
+    merged = {"assets": [], "sensors": []}
+    positions = {"assets": {}, "sensors": {}}
+    recoded = []
+    for piece in pieces:
+        readings = piece["readings"].copy()
+        for table, column in (("assets", "asset"), ("sensors", "sensor")):
+            codes = []
+            for entry in piece["lookup"][table]:
+                if entry not in positions[table]:
+                    positions[table][entry] = len(merged[table])
+                    merged[table].append(entry)
+                codes.append(positions[table][entry])
+            readings[column] = np.array(codes, dtype=READING_DTYPE[column])[readings[column]]
+        recoded.append(readings)
+    return {"lookup": merged, "readings": np.concatenate(recoded)}
+
+
+def split_full_batches(batch, chunk_size):
+    """Split a reading block into full chunk_size blocks and the rest, returning (full blocks, rest)"""
+    full = []
+    position = 0
+    while document_count(batch) - position >= chunk_size:
+        full.append(slice_documents(batch, position, position + chunk_size))
+        position += chunk_size
+    return full, slice_documents(batch, position, None)
+
+
+def epoch_timestamps(times):
+    """Format epoch seconds as the generators' timestamp strings (2024-10-08T08:08:00.000Z)"""
+    return [timestamp + ".000Z" for timestamp in
+            np.datetime_as_string(np.asarray(times).astype("datetime64[s]"), unit="s").tolist()]
+
+
+def reading_values(block):
+    """Values of a reading block as a list, with ints for the sensors that are not floats"""
+    readings = block["readings"]
+    values = readings["value"].tolist()
+    is_float = np.array([entry[2] for entry in block["lookup"]["sensors"]], dtype=bool)
+    int_positions = np.flatnonzero(~is_float[readings["sensor"]])
+    for position, value in zip(int_positions.tolist(), readings["value"][int_positions].astype(np.int64).tolist()):
+        values[position] = value
+    return values
+
+
+def reading_documents(block):
+    """Materialize a reading block as long-format documents"""
+    readings = block["readings"]
+    times, time_codes = np.unique(readings["time"], return_inverse=True)
+    timestamps = epoch_timestamps(times)
+    assets = block["lookup"]["assets"]
+    sensors = block["lookup"]["sensors"]
+    documents = []
+    for time_code, asset_code, sensor_code, value in zip(time_codes.tolist(), readings["asset"].tolist(),
+                                                         readings["sensor"].tolist(), reading_values(block)):
+        sensor_name, unit, _ = sensors[sensor_code]
+        documents.append({
+            "timestamp": timestamps[time_code],
+            "asset_name": assets[asset_code],
+            "sensor_name": sensor_name,
+            "sensor_value": value,
+            "sensor_unit": unit
+        })
+    return documents
+
+
+def batch_documents(data):
+    """Documents of a list of documents or a reading block"""
+    return reading_documents(data) if isinstance(data, dict) else data
+
+
+def generate_esp_pump_data(start_date, end_date, assets=None, specific_sensors=None, seed=None, state=None,
+                           chunk_size=DEFAULT_CHUNK_SIZE, rollup_intervals=None, catalog=None,
+                           sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Generate ESP pump sensor data documents with readings every minute (or sample_seconds) for date range.
+    Simulates continuously running pumps with occasional operational issues.
+    Documents are yielded in chunks of at most chunk_size as they are generated.
+
+    Args:
+        start_date: Starting timestamp
+        end_date: Ending timestamp
+        assets: List of assets to generate data for (defaults to all if None)
+        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        seed: Optional random seed for reproducible output (each asset gets its own stream)
+        state: Optional simulator state to continue from; updated in place after every day
+        chunk_size: Maximum number of documents per yielded batch
+        rollup_intervals: Optional rollup granularities; the rollups of each day come with the day's last batch
+        catalog: Optional fleet catalog from load_catalog (defaults to the built-in assets, sensors and issues)
+        sample_seconds: Seconds per simulation step; sensors report every step unless their configuration
+            has a larger sample_seconds
+
+    Returns:
+        Generator that yields dictionaries with ESP pump data in batches (reading blocks) and annotations
+    """
+    # Asset groups sharing a sensor set and issue model (specified assets/sensors or all of them)
+    groups = catalog_groups(catalog, assets, specific_sensors)
+    lookup, group_sensor_codes = reading_lookup(groups)
+
+    # Process data in daily chunks to manage memory
+    current_date = start_date
+    day_count = 0
+
+    # Per-group state: last and normal values per asset-sensor pair, active issues and random streams
+    state = init_simulator_state(state if state is not None else {}, groups, seed,
+                                 lambda asset_seed_value: random.Random(
+                                     str(asset_seed_value) if asset_seed_value is not None else None))
+
+    # Simulate asset by asset: (group, position in the group's state, asset name); assets are coded in this order
+    asset_rows = [(group, row, asset_name) for group in groups for row, asset_name in enumerate(group["assets"])]
+
+    # Issue onsets are scheduled per asset from each group's issue model (see issue_schedule)
+    schedules = {group["name"]: issue_schedule(group["issues"]) for group in groups}
+
+    # Per-group lookup tables indexed by sensor position, built once instead of per reading
+    group_tables = {group["name"]: scalar_group_tables(group["sensors"], group["issues"], sample_seconds)
+                    for group in groups}
+
+    # Simulation steps; issues start and end on whole minutes, rates and noise are scaled to the step
+    steps_per_minute = 60 // sample_seconds
+    step_minutes = sample_seconds / 60
+    one_step = timedelta(seconds=sample_seconds)
+    # Which sensors report at each step of a day, per group
+    group_reports = {name: sensor_reports(24 * 60 * steps_per_minute, [row[5] for row in tables["sensors"]])
+                     for name, tables in group_tables.items()}
+
+    # Base drift - small random changes for continuous operation (0.5% maximum change per minute),
+    # as the offset and width rng.uniform(-0.005, 0.005) would use
+    drift_factor = per_step_noise(0.005, step_minutes)
+    drift_low, drift_width = -drift_factor, drift_factor - -drift_factor
+    recovery_low, recovery_width = drift_low, drift_width
+    recovery_rate = per_step_rate(0.05, step_minutes)
+    # Minute steps continue from the reported (rounded) value; sub-minute steps from the unrounded one,
+    # as truncating integer sensors every step would drag them down in proportion to the step count
+    round_state = step_minutes == 1
+
+    # List to store annotations
+    annotations = []
+
+    # Calculate total days for progress reporting
+    total_days = (end_date - start_date).days + 1
+
+    # Process one day at a time
+    while current_date <= end_date:
+        day_count += 1
+        print(f"Generating day {day_count}/{total_days}: {current_date.strftime('%Y-%m-%d')}")
+
+        batch = reading_block(lookup)
+        rollups = []
+        day_start = datetime(current_date.year, current_date.month, current_date.day, 0, 0, 0)
+
+        for asset_code, (group, row, asset_name) in enumerate(asset_rows):
+            sensors_to_use = group["sensors"]
+            tables = group_tables[group["name"]]
+            sensor_rows = tables["sensors"]
+            group_state = state["groups"][group["name"]]
+            active_issues = group_state["active_issues"]
+            rng = group_state["rngs"][row]
+            rng_random = rng.random
+            asset_readings = array("d")  # Values of every step and sensor in (step, sensor) order
+
+            # Initialize normal values for this asset if not already done
+            if np.isnan(group_state["normal_values"][row]).all():
+                for s, sensor_config in enumerate(sensors_to_use.values()):
+                    if sensor_config["is_float"]:
+                        group_state["normal_values"][row, s] = round(rng.uniform(
+                            sensor_config["min"] + (sensor_config["max"] - sensor_config["min"]) * 0.3,
+                            sensor_config["max"] - (sensor_config["max"] - sensor_config["min"]) * 0.3), 2)
+                    else:
+                        group_state["normal_values"][row, s] = rng.randint(
+                            int(sensor_config["min"] + (sensor_config["max"] - sensor_config["min"]) * 0.3),
+                            int(sensor_config["max"] - (sensor_config["max"] - sensor_config["min"]) * 0.3))
+
+            # Work on plain lists for the day; sensors without a reading yet start at their normal value
+            asset_normal_values = group_state["normal_values"][row].tolist()
+            asset_last_values = [normal if last != last else last for last, normal in
+                                 zip(group_state["last_values"][row].tolist(), asset_normal_values)]
+
+            schedule = schedules[group["name"]]
+            issue_state = active_issues[row]
+            next_event_step = 0  # Step of the next issue end or scheduled onset, settled at the first step
+            issue_effects = None  # Per-sensor (effect x severity) of the active issue, None while idle
+            annotation_from = None  # First step an annotation may be created for the active issue
+
+            # Generate step-by-step readings for the day
+            for step in range(24 * 60 * steps_per_minute):
+                # Issues only start or end at the asset's next event
+                if step >= next_event_step:
+                    current_time = day_start + one_step * step
+
+                    # Check if an active issue has ended
+                    if issue_state["end_time"] and current_time >= issue_state["end_time"]:
+                        issue_state = active_issues[row] = empty_issue_state()
+                        # Don't immediately reset values - they'll gradually return to normal
+
+                    # Schedule the next issue when the asset becomes idle, and start it when it is due
+                    if issue_state["issue"] is None:
+                        if issue_state["next_onset"] is None:
+                            issue_state["next_onset"] = schedule_issue_onset(rng, schedule, current_time)
+                        if current_time >= issue_state["next_onset"]:
+                            # Start a new issue
+                            issue_name = choose_issue(rng, schedule)
+                            issue_config = group["issues"][issue_name]
+                            duration_minutes = rng.randint(issue_config["duration"][0],
+                                                           issue_config["duration"][1])
+
+                            # Round to nearest 5 minutes for better visibility in charts
+                            rounded_minutes = (current_time.minute // 5) * 5
+                            issue_start_time = current_time.replace(minute=rounded_minutes, second=0, microsecond=0)
+                            issue_end_time = issue_start_time + timedelta(minutes=duration_minutes)
+
+                            # Use higher severity for more dramatic effects
+                            severity = rng.uniform(0.9, 1.0)  # 90-100% severity
+
+                            issue_state = active_issues[row] = {
+                                "issue": issue_name,
+                                "config": issue_config,
+                                "start_time": issue_start_time,
+                                "end_time": issue_end_time,
+                                "severity": severity,
+                                "affected_sensors": {},
+                                "annotation_created": False
+                            }
+
+                    next_event = issue_state["end_time"] or issue_state["next_onset"]
+                    next_event_step = (next_event - day_start) // one_step
+
+                    # Everything about the active issue that does not change from minute to minute
+                    if issue_state["issue"]:
+                        issue_name = issue_state["issue"]
+                        severity = issue_state["severity"]
+                        issue_raw_effects = tables["effects"][issue_name]
+                        issue_effects = [None if effect is None else effect * severity
+                                         for effect in issue_raw_effects]
+                        adjustment_rate = tables["adjustment_rates"][issue_name]
+                        fluctuation_low, fluctuation_width = tables["fluctuations"][issue_name]
+                        issue_start_seconds = (issue_state["start_time"] - day_start).total_seconds()
+                        issue_duration = (issue_state["end_time"] - issue_state["start_time"]).total_seconds()
+
+                        # Store initial values of the affected sensors if not already stored
+                        affected_sensors = issue_state["affected_sensors"]
+                        affected_entries = [None] * len(sensor_rows)
+                        for s, effect in enumerate(issue_raw_effects):
+                            if effect is not None:
+                                sensor_name, _, _, unit, _, _ = sensor_rows[s]
+                                if sensor_name not in affected_sensors:
+                                    affected_sensors[sensor_name] = {
+                                        "initial": asset_last_values[s],
+                                        "current": asset_last_values[s],
+                                        "unit": unit,
+                                        "effect": effect
+                                    }
+                                affected_entries[s] = affected_sensors[sensor_name]
+
+                        annotation_from = None
+                        if not issue_state["annotation_created"]:
+                            annotation_from = (issue_state["start_time"] + ANNOTATION_DELAY - day_start) \
+                                // one_step  # Wait 5 minutes
+                    else:
+                        issue_effects = None
+                        annotation_from = None
+
+                if issue_effects is not None:
+                    # Calculate time progression through the issue (0.0 to 1.0)
+                    progression = min(1.0, (step * sample_seconds - issue_start_seconds) / issue_duration)
+                    # Start with small changes and gradually increase to full effect
+                    ramp = min(1.0, progression * 2)  # Faster ramp-up
+
+                # Generate sensor readings for this timestamp
+                for s, (sensor_name, sensor_min, sensor_max, unit, is_float, _) in enumerate(sensor_rows):
+                    # Get current value
+                    current_value = asset_last_values[s]
+
+                    # Calculate sensor value based on normal operation or active issue
+                    if issue_effects is not None:
+                        scaled_effect = issue_effects[s]
+
+                        # Apply issue effects if this sensor is affected
+                        if scaled_effect is not None:
+                            applied_effect = scaled_effect * ramp
+
+                            # Calculate target value during issue - use direct percentage changes
+                            normal_value = asset_normal_values[s]
+
+                            if scaled_effect < 0:  # Reduction effect
+                                if issue_raw_effects[s] == -1.0:  # Complete shutdown
+                                    target_value = 0 if sensor_name != "motor_temperature" else sensor_min
+                                else:
+                                    # Calculate target as percentage reduction from normal, not below minimum
+                                    target_value = max(normal_value * (1 - abs(applied_effect)), sensor_min)
+                            else:  # Increase effect
+                                # Calculate target as percentage increase from normal, not above maximum
+                                target_value = min(normal_value * (1 + applied_effect), sensor_max)
+
+                            # Move toward the target value at the issue's adjustment rate
+                            sensor_value = current_value + (target_value - current_value) * adjustment_rate
+
+                            # Add appropriate fluctuation based on issue type
+                            sensor_value += sensor_value * (fluctuation_low + fluctuation_width * rng_random())
+
+                            # Update the current value in affected_sensors
+                            affected_entries[s]["current"] = sensor_value
+                        else:
+                            # Sensors not directly affected still have normal drift
+                            sensor_value = current_value + current_value * (drift_low + drift_width * rng_random())
+                    else:
+                        # Normal operation with drift
+                        # If recovering from an issue, gradually return to normal
+                        normal_value = asset_normal_values[s]
+                        if abs(current_value - normal_value) > 0.05 * normal_value:  # If more than 5% off from normal
+                            # Move 5% per minute closer to normal value, with a small random fluctuation
+                            sensor_value = current_value + (normal_value - current_value) * recovery_rate
+                            sensor_value += sensor_value * (recovery_low + recovery_width * rng_random())
+                        else:
+                            # Regular drift
+                            sensor_value = current_value + current_value * (drift_low + drift_width * rng_random())
+
+                    # Ensure value is within allowed range
+                    clipped_value = max(min(sensor_value, sensor_max), sensor_min)
+                    sensor_value = round(clipped_value, 2) if is_float else int(clipped_value)
+
+                    # Record the reading - ONLY sensor data, no issue information
+                    asset_readings.append(sensor_value)
+
+                    # Update for next iteration
+                    asset_last_values[s] = sensor_value if round_state else clipped_value
+
+                # Check if we should create annotation after processing all sensors for this timestamp
+                if annotation_from is not None and step >= annotation_from:
+                    # Create annotation based on actual sensor values
+                    annotation = build_issue_annotation(asset_name, issue_state, sensors_to_use,
+                                                        day_start + one_step * step)
+                    if annotation:
+                        # Add to annotations list
+                        annotations.append(annotation)
+
+                        # Mark annotation as created
+                        issue_state["annotation_created"] = True
+                        annotation_from = None
+
+            group_state["last_values"][row] = asset_last_values
+
+            # Documents of the readings the sensors report, yielded in batches of chunk_size
+            readings = np.frombuffer(asset_readings, dtype=float).reshape(-1, len(sensors_to_use))
+            batch = join_documents([batch, asset_day_block(lookup, asset_code, day_start, sample_seconds,
+                                                           group_sensor_codes[group["name"]], readings,
+                                                           group_reports[group["name"]])])
+            full_batches, batch = split_full_batches(batch, chunk_size)
+            for data in full_batches:
+                yield {"data": data, "annotations": annotations}
+                annotations = []
+
+            if rollup_intervals:
+                rollups.extend(rollup_documents(asset_name, current_date, list(sensors_to_use),
+                                                [config["unit"] for config in sensors_to_use.values()],
+                                                readings, rollup_intervals, sample_seconds,
+                                                [row[5] for row in sensor_rows]))
+
+        # Yield the rest of the day along with any annotations; day_end marks that the day is complete
+        day_batch = {"data": batch, "annotations": annotations, "day_end": current_date}
+        if rollup_intervals:
+            day_batch["rollups"] = rollups
+        yield day_batch
+        annotations = []  # Clear annotations after yielding
+        current_date += timedelta(days=1)
+
+
+def build_issue_annotation(asset_name, issue_state, sensors_to_use, current_time):
+    """
+    Build an annotation for an active pump issue based on actual sensor values.
+
+    Args:
+        asset_name: Asset the issue is active on
+        issue_state: Active issue state for the asset (issue and its configuration from the group's
+            issue model, severity, times, affected sensors)
+        sensors_to_use: Sensor configurations being generated
+        current_time: Timestamp the annotation is created at
+
+    Returns:
+        Annotation dictionary, or None if no affected sensor changed significantly
+    """
+    issue_name = issue_state["issue"]
+    issue_config = issue_state["config"]
+    affected_sensors = issue_state["affected_sensors"]
+
+    # Calculate actual changes for indicator
+    indicator_parts = []
+    for sensor_name, data in affected_sensors.items():
+        initial = data["initial"]
+        current = data["current"]
+        unit = data["unit"]
+
+        # Calculate actual percentage change
+        if initial > 0:
+            pct_change = (current - initial) / initial * 100
+            direction = "↓" if pct_change < 0 else "↑"
+
+            # Only include if change is significant
+            if abs(pct_change) > 5:
+                if sensors_to_use[sensor_name]["is_float"]:
+                    current_formatted = round(current, 2)
+                else:
+                    current_formatted = int(current)
+
+                indicator_parts.append(
+                    f"{sensor_name.replace('_', ' ')}: {direction}{abs(int(pct_change))}% ({current_formatted} {unit})"
+                )
+
+    # Only create annotation if we have significant changes to report
+    if not indicator_parts:
+        return None
+
+    # Sort by absolute percentage change (largest first)
+    indicator_parts.sort(key=lambda x: int(x.split('%')[0].split('↓')[-1].split('↑')[-1]),
+                         reverse=True)
+    indicator_text = ", ".join(indicator_parts[:3])  # Top 3 most affected
+
+    # Create urgency based on severity
+    severity = issue_state["severity"]
+    if severity > 0.95:
+        urgency = "URGENT: Immediate action required. "
+    elif severity > 0.9:
+        urgency = "High priority: Schedule maintenance within 24 hours. "
+    else:
+        urgency = "Medium priority: Monitor closely and plan intervention. "
+
+    createdBy = {
+        "email": "system@labelexpress.com",
+        "userId": "1",
+    }
+
+    # Create annotation with actual values
+    return {
+        "sourceIndex": "esp_pump_data",
+        "filterField": "asset_name",
+        "filterValue": asset_name,
+        "description": f"{issue_config['description']} (Severity: {int(severity * 100)}%)",
+        "startDate": issue_state["start_time"].strftime("%Y-%m-%dT%H:%M:%S") + ".000Z",
+        "endDate": issue_state["end_time"].strftime("%Y-%m-%dT%H:%M:%S") + ".000Z",
+        "deleted": False,
+        "annotationType": issue_name.replace("_", " ").title(),
+        "indicator": f"Detected {issue_name.replace('_', ' ')} in {asset_name}: {indicator_text}",
+        "recommendation": f"{urgency}{ISSUE_RECOMMENDATIONS[issue_name]}",
+        "createdBy": createdBy,
+        "createdAt": current_time.strftime("%Y-%m-%dT%H:%M:%S") + ".000Z",
+        "status": "created"
+    }
+
+
+def vectorized_group_tables(sensors_to_use, issues, sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Per-sensor and per-issue arrays the vectorized engine simulates an asset group with.
+
+    Args:
+        sensors_to_use: Sensor configurations of the group
+        issues: Issue model of the group (issue name -> probability, duration, description, effects)
+        sample_seconds: Seconds per simulation step (adjustment rates and noise are scaled to it)
+
+    Returns:
+        Dictionary of sensor names/limits and issue tables; the extra last issue row stands for "no active issue"
+    """
+    sensor_names = list(sensors_to_use)
+    issue_names = list(issues)
+    num_sensors, num_issues = len(sensor_names), len(issue_names)
+    sensor_steps = sensor_sample_steps(sensors_to_use, sample_seconds)
+    step_minutes = sample_seconds / 60
+
+    # Per-sensor configuration as arrays
+    sensor_min = np.array([sensors_to_use[s]["min"] for s in sensor_names], dtype=float)
+    sensor_max = np.array([sensors_to_use[s]["max"] for s in sensor_names], dtype=float)
+
+    # Per-issue tables; the extra last row stands for "no active issue"
+    effect_table = np.zeros((num_issues + 1, num_sensors))
+    affected_table = np.zeros((num_issues + 1, num_sensors), dtype=bool)
+    adjustment_rates = np.zeros(num_issues + 1)
+    fluctuations = np.zeros(num_issues + 1)
+    for i, issue_name in enumerate(issue_names):
+        for s, sensor_name in enumerate(sensor_names):
+            if sensor_name in issues[issue_name]["effects"]:
+                effect_table[i, s] = issues[issue_name]["effects"][sensor_name]["factor"]
+                affected_table[i, s] = True
+        adjustment_rates[i] = per_step_rate(issue_adjustment_rate(issue_name), step_minutes)
+        fluctuations[i] = per_step_noise(issue_fluctuation(issue_name), step_minutes)
+
+    return {
+        "sensor_names": sensor_names,
+        "units": [sensors_to_use[s]["unit"] for s in sensor_names],
+        "sensor_min": sensor_min,
+        "sensor_max": sensor_max,
+        "is_float": np.array([sensors_to_use[s]["is_float"] for s in sensor_names]),
+        "sample_seconds": sample_seconds,
+        "sensor_steps": sensor_steps,
+        # Drift outside of issues and the rate values recover to normal at, per step
+        "drift_factor": per_step_noise(0.005, step_minutes),
+        "recovery_rate": per_step_rate(0.05, step_minutes),
+        # Target for a complete shutdown (effect of -1.0)
+        "shutdown_target": np.where(np.array(sensor_names) == "motor_temperature", sensor_min, 0.0),
+        "issue_names": issue_names,
+        "schedule": issue_schedule(issues),
+        "effect_table": effect_table,
+        "affected_table": affected_table,
+        "adjustment_rates": adjustment_rates,
+        "fluctuations": fluctuations
+    }
+
+
+def simulate_vectorized_block(day_start, group, tables, rngs, active_issues, normal_values, last_values):
+    """
+    Simulate one day for a block of assets of the same group.
+
+    Noise for the whole day is drawn up front; issue onsets come from the
+    asset's scheduled next onset, per-step issue targets are computed as arrays,
+    and the readings advance as one recurrence over the (assets x sensors) plane
+    per step with np.clip/np.round applied like the scalar engine does per reading.
+
+    Args:
+        day_start: Midnight of the day
+        group: Asset group (its issue model is used for durations)
+        tables: Arrays from vectorized_group_tables for the group
+        rngs: Random streams of the block's assets
+        active_issues: Issue states of the block's assets (list, updated in place)
+        normal_values: (assets x sensors) normal values of the block
+        last_values: (assets x sensors) values at the end of the previous day
+
+    Returns:
+        Tuple of (values, raw_values, segments): (steps x assets x sensors) readings after and before
+        clipping/rounding, and (asset position, issue state, first step, end step) per issue segment
+    """
+    minutes_per_day = 24 * 60
+    steps_per_minute = 60 // tables["sample_seconds"]
+    steps_per_day = minutes_per_day * steps_per_minute
+    issue_names = tables["issue_names"]
+    num_assets, num_sensors, num_issues = len(rngs), len(tables["sensor_names"]), len(issue_names)
+    sensor_min, sensor_max = tables["sensor_min"], tables["sensor_max"]
+
+    noise = np.empty((steps_per_day, num_assets, num_sensors))
+    for a in range(num_assets):
+        noise[:, a] = rngs[a].uniform(-1.0, 1.0, (steps_per_day, num_sensors))
+
+    # Lay out the issue timeline for the day: issue index, severity and ramp per step (issues span whole minutes)
+    issue_index = np.full((steps_per_day, num_assets), num_issues)
+    issue_severity = np.zeros((steps_per_day, num_assets))
+    issue_ramp = np.zeros((steps_per_day, num_assets))
+    segments = []  # (asset position, issue state, first step, end step) for annotations
+
+    for a in range(num_assets):
+        minute = 0
+        while minute < minutes_per_day:
+            issue_state = active_issues[a]
+            if issue_state["issue"] is None:
+                # Schedule the next issue when the asset becomes idle, and jump to it if it starts today
+                if issue_state["next_onset"] is None:
+                    issue_state["next_onset"] = schedule_issue_onset(rngs[a], tables["schedule"],
+                                                                     day_start + timedelta(minutes=minute))
+                if issue_state["next_onset"] >= day_start + timedelta(days=1):
+                    break
+                minute = max(minute, int((issue_state["next_onset"] - day_start).total_seconds() // 60))
+                issue_name = choose_issue(rngs[a], tables["schedule"])
+                issue_config = group["issues"][issue_name]
+
+                duration_minutes = int(rngs[a].integers(issue_config["duration"][0],
+                                                        issue_config["duration"][1], endpoint=True))
+                # Round to nearest 5 minutes for better visibility in charts
+                issue_start_time = day_start + timedelta(minutes=minute - minute % 5)
+                severity = float(rngs[a].uniform(0.9, 1.0))  # 90-100% severity
+
+                issue_state = {
+                    "issue": issue_name,
+                    "config": issue_config,
+                    "start_time": issue_start_time,
+                    "end_time": issue_start_time + timedelta(minutes=duration_minutes),
+                    "severity": severity,
+                    "affected_sensors": {},
+                    "annotation_created": False
+                }
+                active_issues[a] = issue_state
+
+            start_offset = int((issue_state["start_time"] - day_start).total_seconds() // 60)
+            end_offset = int((issue_state["end_time"] - day_start).total_seconds() // 60)
+            if end_offset <= minute:
+                # Issue has ended - values gradually return to normal
+                active_issues[a] = empty_issue_state()
+                continue
+
+            segment_end = min(end_offset, minutes_per_day)
+            first_step, end_step = minute * steps_per_minute, segment_end * steps_per_minute
+            duration = (end_offset - start_offset) * steps_per_minute
+            elapsed = np.arange(first_step, end_step) - start_offset * steps_per_minute
+            issue_index[first_step:end_step, a] = issue_names.index(issue_state["issue"])
+            issue_severity[first_step:end_step, a] = issue_state["severity"]
+            issue_ramp[first_step:end_step, a] = np.minimum(1.0, np.minimum(1.0, elapsed / duration) * 2)
+            segments.append((a, issue_state, first_step, end_step))
+            minute = segment_end
+
+    # Issue targets and adjustment rates for every step, asset and sensor
+    effect = tables["effect_table"][issue_index]
+    affected = tables["affected_table"][issue_index]
+    applied_effect = effect * (issue_severity * issue_ramp)[:, :, None]
+    reduced_target = np.where(effect == -1.0, tables["shutdown_target"],
+                              np.maximum(normal_values * (1 - np.abs(applied_effect)), sensor_min))
+    increased_target = np.minimum(normal_values * (1 + applied_effect), sensor_max)
+    goal = np.where(affected, np.where(effect < 0, reduced_target, increased_target), normal_values)
+    rate = np.where(affected, tables["adjustment_rates"][issue_index][:, :, None], 0.0)
+    noise *= np.where(affected, tables["fluctuations"][issue_index][:, :, None], tables["drift_factor"])
+    recovering_allowed = (issue_index == num_issues)[:, :, None]
+    recovery_band = 0.05 * normal_values
+    recovery_rate = tables["recovery_rate"]
+    round_state = steps_per_minute == 1
+    is_float = tables["is_float"]
+
+    # Advance every asset/sensor pair one step at a time
+    raw_values = np.empty((steps_per_day, num_assets, num_sensors))
+    values = np.empty((steps_per_day, num_assets, num_sensors))
+    current = last_values
+    for step in range(steps_per_day):
+        # Outside of issues, move 5% per minute closer to normal when more than 5% off
+        recovering = recovering_allowed[step] & (np.abs(current - normal_values) > recovery_band)
+        step_rate = rate[step] + recovering * recovery_rate
+        sensor_value = current + (goal[step] - current) * step_rate
+        sensor_value += sensor_value * noise[step]
+        raw_values[step] = sensor_value
+
+        # Ensure value is within allowed range (sub-minute steps continue from the unrounded value)
+        sensor_value = np.clip(sensor_value, sensor_min, sensor_max)
+        values[step] = np.where(is_float, np.round(sensor_value, 2), np.trunc(sensor_value))
+        current = values[step] if round_state else sensor_value
+
+    return values, raw_values, segments
+
+
+def generate_esp_pump_data_vectorized(start_date, end_date, assets=None, specific_sensors=None, seed=None,
+                                      state=None, chunk_size=DEFAULT_CHUNK_SIZE, rollup_intervals=None,
+                                      catalog=None, block_readings=VECTORIZED_BLOCK_READINGS,
+                                      sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Generate ESP pump sensor data with NumPy, one whole day (steps x assets x sensors) at a time.
+
+    Produces the same document and annotation format, value ranges, drift, issue
+    ramps and recovery behavior as generate_esp_pump_data. Each asset group is
+    simulated in blocks of assets (see simulate_vectorized_block) small enough
+    that a block's day stays within block_readings readings, so memory does not
+    grow with the size of the fleet.
+
+    Args:
+        start_date: Starting timestamp
+        end_date: Ending timestamp
+        assets: List of assets to generate data for (defaults to all if None)
+        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        seed: Optional random seed for reproducible output (each asset gets its own stream)
+        state: Optional simulator state to continue from; updated in place after every day
+        chunk_size: Maximum number of documents per yielded batch
+        rollup_intervals: Optional rollup granularities; the rollups of each day come with the day's last batch
+        catalog: Optional fleet catalog from load_catalog (defaults to the built-in assets, sensors and issues)
+        block_readings: Upper bound on steps x assets x sensors simulated at once
+        sample_seconds: Seconds per simulation step; sensors report every step unless their configuration
+            has a larger sample_seconds
+
+    Returns:
+        Generator that yields dictionaries with ESP pump data in batches (reading blocks) and annotations
+    """
+    steps_per_day = 24 * 60 * 60 // sample_seconds
+    one_step = timedelta(seconds=sample_seconds)
+
+    groups = catalog_groups(catalog, assets, specific_sensors)
+    lookup, group_sensor_codes = reading_lookup(groups)
+    asset_codes = {asset_name: code for code, asset_name in enumerate(lookup["assets"])}
+    state = init_simulator_state(state if state is not None else {}, groups, seed, np.random.default_rng)
+
+    group_tables = []
+    for group in groups:
+        tables = vectorized_group_tables(group["sensors"], group["issues"], sample_seconds)
+        group_state = state["groups"][group["name"]]
+        rngs = group_state["rngs"]
+
+        # Normal operating values, 30%-70% of each sensor's range
+        sensor_min, sensor_max, is_float = tables["sensor_min"], tables["sensor_max"], tables["is_float"]
+        low = sensor_min + (sensor_max - sensor_min) * 0.3
+        high = sensor_max - (sensor_max - sensor_min) * 0.3
+        for a in range(len(group["assets"])):
+            if np.isnan(group_state["normal_values"][a]).all():
+                for s in range(len(tables["sensor_names"])):
+                    if is_float[s]:
+                        group_state["normal_values"][a, s] = round(float(rngs[a].uniform(low[s], high[s])), 2)
+                    else:
+                        group_state["normal_values"][a, s] = int(rngs[a].integers(int(low[s]), int(high[s]),
+                                                                                  endpoint=True))
+        group_tables.append(tables)
+
+    current_date = start_date
+    day_count = 0
+    total_days = (end_date - start_date).days + 1
+
+    while current_date <= end_date:
+        day_count += 1
+        print(f"Generating day {day_count}/{total_days}: {current_date.strftime('%Y-%m-%d')}")
+
+        day_start = datetime(current_date.year, current_date.month, current_date.day, 0, 0, 0)
+        batch = reading_block(lookup)
+        annotations = []
+        rollups = []
+
+        for group, tables in zip(groups, group_tables):
+            group_state = state["groups"][group["name"]]
+            sensors_to_use = group["sensors"]
+            sensor_names, units = tables["sensor_names"], tables["units"]
+            affected_table, effect_table = tables["affected_table"], tables["effect_table"]
+            num_sensors = len(sensor_names)
+            block_size = max(1, block_readings // (steps_per_day * num_sensors))
+            reports = sensor_reports(steps_per_day, tables["sensor_steps"])
+
+            for block_start in range(0, len(group["assets"]), block_size):
+                block = slice(block_start, block_start + block_size)
+                block_assets = group["assets"][block]
+                normal_values = group_state["normal_values"][block]
+                last_values = group_state["last_values"][block]
+                block_issues = group_state["active_issues"][block]
+                day_start_values = np.where(np.isnan(last_values), normal_values, last_values)
+                values, raw_values, segments = simulate_vectorized_block(
+                    day_start, group, tables, group_state["rngs"][block], block_issues, normal_values,
+                    day_start_values)
+                group_state["last_values"][block] = values[-1]
+                group_state["active_issues"][block] = block_issues
+
+                # Create annotations from the actual sensor values, 5 minutes after each issue starts
+                for a, issue_state, first_step, segment_end in segments:
+                    asset_name = block_assets[a]
+                    issue_position = tables["issue_names"].index(issue_state["issue"])
+                    affected_positions = np.flatnonzero(affected_table[issue_position])
+                    if not issue_state["affected_sensors"]:
+                        initial = values[first_step - 1, a] if first_step > 0 else day_start_values[a]
+                        for s in affected_positions:
+                            issue_state["affected_sensors"][sensor_names[s]] = {
+                                "initial": float(initial[s]),
+                                "current": float(initial[s]),
+                                "unit": units[s],
+                                "effect": float(effect_table[issue_position, s])
+                            }
+                    if not issue_state["annotation_created"]:
+                        check_from = (issue_state["start_time"] + ANNOTATION_DELAY - day_start) // one_step
+                        for step in range(max(first_step, check_from), segment_end):
+                            for s in affected_positions:
+                                issue_state["affected_sensors"][sensor_names[s]]["current"] = float(
+                                    raw_values[step, a, s])
+                            annotation = build_issue_annotation(asset_name, issue_state, sensors_to_use,
+                                                                day_start + one_step * step)
+                            if annotation:
+                                annotations.append(annotation)
+                                issue_state["annotation_created"] = True
+                                break
+                    for s in affected_positions:
+                        issue_state["affected_sensors"][sensor_names[s]]["current"] = float(
+                            raw_values[segment_end - 1, a, s])
+
+                # Reading blocks in the same order as the scalar engine (asset, step, sensor)
+                for a, asset_name in enumerate(block_assets):
+                    batch = join_documents([batch, asset_day_block(
+                        lookup, asset_codes[asset_name], day_start, sample_seconds,
+                        group_sensor_codes[group["name"]], values[:, a, :], reports)])
+                    full_batches, batch = split_full_batches(batch, chunk_size)
+                    for data in full_batches:
+                        yield {"data": data, "annotations": annotations}
+                        annotations = []
+                    if rollup_intervals:
+                        rollups.extend(rollup_documents(asset_name, current_date, sensor_names, units,
+                                                        values[:, a, :], rollup_intervals, sample_seconds,
+                                                        tables["sensor_steps"]))
+
+        # day_end marks that the day is complete (see chunk_documents)
+        day_batch = {"data": batch, "annotations": annotations, "day_end": current_date}
+        if rollup_intervals:
+            day_batch["rollups"] = rollups
+        yield day_batch
+        current_date += timedelta(days=1)
+
+
+# Simulation engines selectable by name (used by worker processes)
+GENERATION_ENGINES = {
+    "scalar": generate_esp_pump_data,
+    "vectorized": generate_esp_pump_data_vectorized
+}
+
+
+def generate_shard(engine, asset_name, shard_start, shard_end, specific_sensors, seed, state, chunk_size,
+                   rollup_intervals=None, catalog=None, sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Generate one asset/date-range shard in a worker process.
+
+    Args:
+        engine: Name of the simulation engine
+        asset_name: Asset to simulate
+        shard_start: First day of the shard
+        shard_end: Last day of the shard
+        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        seed: Random seed shared by all shards
+        state: Simulator state at the end of the asset's previous shard (None for the first shard)
+        chunk_size: Maximum number of documents per batch
+        rollup_intervals: Optional rollup granularities to produce
+        catalog: Optional fleet catalog containing the asset (ideally only its group with just this asset)
+        sample_seconds: Seconds per simulation step
+
+    Returns:
+        Dictionary with the shard's batches and the simulator state to continue from
+    """
+    state = state if state is not None else {}
+    batches = list(GENERATION_ENGINES[engine](shard_start, shard_end, [asset_name], specific_sensors,
+                                              seed=seed, state=state, chunk_size=chunk_size,
+                                              rollup_intervals=rollup_intervals, catalog=catalog,
+                                              sample_seconds=sample_seconds))
+    return {"batches": batches, "state": state}
+
+
+def generate_esp_pump_data_parallel(start_date, end_date, assets=None, specific_sensors=None, seed=None,
+                                    engine="scalar", processes=4, shard_days=1, queue_size=None,
+                                    chunk_size=DEFAULT_CHUNK_SIZE, rollup_intervals=None, catalog=None,
+                                    sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Generate ESP pump data across a process pool, sharded by asset x date range.
+
+    Every asset has its own seeded random stream, and each shard continues from the
+    simulator state (last_values, normal_values, active_issues, RNG) returned by the
+    asset's previous shard, so the generated data is the same for any number of
+    processes. Shards of different assets run in parallel; finished shards are
+    handed to the consumer through a bounded queue, which stops scheduling new
+    shards while the indexer is behind.
+
+    Args:
+        start_date: Starting timestamp
+        end_date: Ending timestamp
+        assets: List of assets to generate data for (defaults to all if None)
+        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        seed: Random seed (a random one is chosen and printed if None)
+        engine: Name of the simulation engine ("scalar" or "vectorized")
+        processes: Number of worker processes
+        shard_days: Number of days per shard
+        queue_size: Maximum number of finished shards waiting for the consumer (defaults to 2 x processes)
+        chunk_size: Maximum number of documents per yielded batch
+        rollup_intervals: Optional rollup granularities to produce
+        catalog: Optional fleet catalog from load_catalog (defaults to the built-in assets, sensors and issues)
+        sample_seconds: Seconds per simulation step
+
+    Returns:
+        Generator that yields dictionaries with ESP pump data in batches and annotations
+    """
+    # Each shard gets a catalog holding only its asset, so workers do not receive the whole fleet
+    asset_catalogs = [(asset, {"groups": [dict(group, assets=[asset])]})
+                      for group in catalog_groups(catalog, assets, specific_sensors) for asset in group["assets"]]
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+        print(f"Using random seed {seed}")
+
+    # Split the date range into shards of shard_days days
+    shard_ranges = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        shard_end = min(shard_start + timedelta(days=shard_days - 1), end_date)
+        shard_ranges.append((shard_start, shard_end))
+        shard_start = shard_end + timedelta(days=1)
+
+    finished_shards = queue.Queue(maxsize=queue_size or processes * 2)
+    stop_event = threading.Event()
+    done = object()
+
+    def put_finished(item):
+        # Block while the queue is full, unless the consumer went away
+        while not stop_event.is_set():
+            try:
+                finished_shards.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def schedule_shards():
+        try:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                # Next shard to run per asset: (asset, its catalog, shard position, state from previous shard)
+                waiting = deque((asset, asset_catalog, 0, None) for asset, asset_catalog in asset_catalogs)
+                running = {}
+
+                while waiting or running:
+                    while waiting and len(running) < processes:
+                        asset, asset_catalog, position, shard_state = waiting.popleft()
+                        future = pool.submit(generate_shard, engine, asset, *shard_ranges[position],
+                                             specific_sensors, seed, shard_state, chunk_size, rollup_intervals,
+                                             asset_catalog, sample_seconds)
+                        running[future] = (asset, asset_catalog, position)
+
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        asset, asset_catalog, position = running.pop(future)
+                        result = future.result()
+                        if not put_finished(result["batches"]):
+                            return
+                        if position + 1 < len(shard_ranges):
+                            waiting.append((asset, asset_catalog, position + 1, result["state"]))
+            put_finished(done)
+        except Exception as e:
+            put_finished(e)
+
+    scheduler = threading.Thread(target=schedule_shards, daemon=True)
+    scheduler.start()
+
+    try:
+        while True:
+            item = finished_shards.get()
+            metric_set("generator_queue_depth", finished_shards.qsize())
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop_event.set()
+        scheduler.join()
+
+
+def summarize_generated_data(documents_generator):
+    """
+    Collect per-sensor statistics and annotation counts from a data generator.
+
+    Args:
+        documents_generator: Generator yielding batches of documents and annotations
+
+    Returns:
+        Dictionary with document count, per-sensor count/mean/std/min/max and annotation counts by type
+    """
+    sensors = {}
+    annotation_types = {}
+    total_docs = 0
+
+    for batch_data in documents_generator:
+        documents = batch_documents(batch_data["data"])
+        for doc in documents:
+            value = doc["sensor_value"]
+            stats = sensors.get(doc["sensor_name"])
+            if stats is None:
+                stats = sensors[doc["sensor_name"]] = {"count": 0, "sum": 0.0, "sum_sq": 0.0,
+                                                       "min": value, "max": value}
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["sum_sq"] += value * value
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+        total_docs += len(documents)
+
+        for annotation in batch_data["annotations"]:
+            annotation_type = annotation["annotationType"]
+            annotation_types[annotation_type] = annotation_types.get(annotation_type, 0) + 1
+
+    for stats in sensors.values():
+        mean = stats["sum"] / stats["count"]
+        stats["mean"] = mean
+        stats["std"] = max(stats["sum_sq"] / stats["count"] - mean * mean, 0.0) ** 0.5
+        del stats["sum"], stats["sum_sq"]
+
+    return {"documents": total_docs, "sensors": sensors, "annotations": annotation_types}
+
+
+def compare_engines(start_date, end_date, assets=None, specific_sensors=None, seed=None, catalog=None,
+                    sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    Run the scalar and vectorized engines with the same seed and print their statistics side by side.
+
+    Args:
+        start_date: Starting timestamp
+        end_date: Ending timestamp
+        assets: List of assets to generate data for (defaults to all if None)
+        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        seed: Random seed passed to both engines
+        catalog: Optional fleet catalog from load_catalog
+        sample_seconds: Seconds per simulation step
+
+    Returns:
+        Tuple of (scalar summary, vectorized summary)
+    """
+    results = []
+    for engine in (generate_esp_pump_data, generate_esp_pump_data_vectorized):
+        engine_start = time.time()
+        summary = summarize_generated_data(engine(start_date, end_date, assets, specific_sensors, seed=seed,
+                                                  catalog=catalog, sample_seconds=sample_seconds))
+        summary["elapsed"] = time.time() - engine_start
+        results.append(summary)
+    scalar, vectorized = results
+
+    print("\n===== Engine Comparison =====")
+    print(f"Documents: scalar {scalar['documents']:,}, vectorized {vectorized['documents']:,}")
+    print(f"Time: scalar {scalar['elapsed']:.2f}s, vectorized {vectorized['elapsed']:.2f}s")
+    print(f"{'sensor':<38}{'scalar mean/std':>22}{'vectorized mean/std':>24}")
+    for sensor_name, stats in scalar["sensors"].items():
+        other = vectorized["sensors"][sensor_name]
+        print(f"{sensor_name:<38}{stats['mean']:>13.2f} / {stats['std']:<6.2f}"
+              f"{other['mean']:>15.2f} / {other['std']:<6.2f}")
+    print("Annotations by type:")
+    for annotation_type in sorted(set(scalar["annotations"]) | set(vectorized["annotations"])):
+        print(f"  {annotation_type:<36}scalar {scalar['annotations'].get(annotation_type, 0):>4}"
+              f"   vectorized {vectorized['annotations'].get(annotation_type, 0):>4}")
+    print("============================")
+
+    return scalar, vectorized
+
+
+def to_wide_documents(documents_generator):
+    """
+    Combine long-format readings into one document per asset per timestamp with every sensor as a numeric field.
+
+    Relies on the generators emitting all sensors of an asset/timestamp consecutively.
+
+    Args:
+        documents_generator: Generator yielding batches of long-format documents and annotations
+
+    Returns:
+        Generator that yields batches of wide documents and annotations
+    """
+    current = None
+
+    for batch_data in documents_generator:
+        batch = []
+        for doc in batch_documents(batch_data["data"]):
+            if current is None or doc["timestamp"] != current["timestamp"] or \
+                    doc["asset_name"] != current["asset_name"]:
+                if current is not None:
+                    batch.append(current)
+                current = {"timestamp": doc["timestamp"], "asset_name": doc["asset_name"]}
+            current[doc["sensor_name"]] = doc["sensor_value"]
+        if "day_end" in batch_data:
+            # The end of a day is also the end of a minute, so the day_end marker stays exact (rollups pass through)
+            if current is not None:
+                batch.append(current)
+                current = None
+            yield dict(batch_data, data=batch)
+            continue
+        yield {"data": batch, "annotations": batch_data["annotations"]}
+
+    if current is not None:
+        yield {"data": [current], "annotations": []}
+
+
+def to_hourly_documents(documents_generator):
+    """
+    Pack long-format readings into one document per asset/sensor per hour.
+
+    sensor_value holds the hour's readings as an array in time order, so
+    avg/min/max aggregations on sensor_value still work at hourly or coarser
+    intervals.
+
+    Args:
+        documents_generator: Generator yielding batches of long-format documents and annotations
+
+    Returns:
+        Generator that yields batches of hourly documents and annotations
+    """
+    current_key = None
+    pending = {}  # Hourly documents per sensor for the current asset/hour
+
+    for batch_data in documents_generator:
+        batch = []
+        for doc in batch_documents(batch_data["data"]):
+            hour = doc["timestamp"][:13]
+            if (doc["asset_name"], hour) != current_key:
+                batch.extend(pending.values())
+                pending = {}
+                current_key = (doc["asset_name"], hour)
+
+            hourly = pending.get(doc["sensor_name"])
+            if hourly is None:
+                hourly = pending[doc["sensor_name"]] = {
+                    "timestamp": hour + ":00:00.000Z",
+                    "asset_name": doc["asset_name"],
+                    "sensor_name": doc["sensor_name"],
+                    "sensor_unit": doc["sensor_unit"],
+                    "sensor_value": []
+                }
+            hourly["sensor_value"].append(doc["sensor_value"])
+        if "day_end" in batch_data:
+            # The end of a day is also the end of an hour, so the day_end marker stays exact (rollups pass through)
+            batch.extend(pending.values())
+            pending = {}
+            current_key = None
+            yield dict(batch_data, data=batch)
+            continue
+        yield {"data": batch, "annotations": batch_data["annotations"]}
+
+    if pending:
+        yield {"data": list(pending.values()), "annotations": []}
+
+
+# Output document formats: one reading per document, or the compact transforms
+DOC_FORMATS = {
+    "long": None,
+    "wide": to_wide_documents,
+    "hourly": to_hourly_documents
+}
+
+
+# Histogram bucket upper bounds for durations (seconds) and request sizes (bytes)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+SIZE_BUCKETS = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 10 * 1024 * 1024, 25 * 1024 * 1024,
+                100 * 1024 * 1024]
+
+# Pipeline metrics shared by the generator, writer threads and the reporter
+_metrics_lock = threading.Lock()
+METRICS = {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def metric_inc(name, value=1):
+    """Add to a counter"""
+    with _metrics_lock:
+        METRICS["counters"][name] = METRICS["counters"].get(name, 0) + value
+
+
+def metric_set(name, value):
+    """Set a gauge"""
+    with _metrics_lock:
+        METRICS["gauges"][name] = value
+
+
+def metric_observe(name, value, buckets=LATENCY_BUCKETS):
+    """Record a value in a histogram with fixed bucket upper bounds"""
+    with _metrics_lock:
+        histogram = METRICS["histograms"].get(name)
+        if histogram is None:
+            histogram = METRICS["histograms"][name] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1),
+                                                       "count": 0, "sum": 0.0, "max": 0.0}
+        position = 0
+        while position < len(buckets) and value > buckets[position]:
+            position += 1
+        histogram["counts"][position] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+
+
+def histogram_quantile(histogram, quantile):
+    """Estimate a quantile as the upper bound of the bucket it falls in"""
+    rank = quantile * histogram["count"]
+    seen = 0
+    for bound, count in zip(histogram["buckets"] + [histogram["max"]], histogram["counts"]):
+        seen += count
+        if seen >= rank:
+            return bound
+    return histogram["max"]
+
+
+def metrics_snapshot():
+    """
+    Copy the current metrics.
+
+    Returns:
+        Dict of counters, gauges and histogram summaries (count, sum, mean, p50, p95, max)
+    """
+    with _metrics_lock:
+        histograms = {}
+        for name, histogram in METRICS["histograms"].items():
+            histograms[name] = {
+                "count": histogram["count"],
+                "sum": round(histogram["sum"], 6),
+                "mean": round(histogram["sum"] / histogram["count"], 6) if histogram["count"] else 0,
+                "p50": histogram_quantile(histogram, 0.5),
+                "p95": histogram_quantile(histogram, 0.95),
+                "max": round(histogram["max"], 6)
+            }
+        return {
+            "counters": dict(METRICS["counters"]),
+            "gauges": dict(METRICS["gauges"]),
+            "histograms": histograms
+        }
+
+
+def reset_metrics():
+    """Clear all metrics, e.g. between runs in one process"""
+    with _metrics_lock:
+        for group in METRICS.values():
+            group.clear()
+
+
+def prometheus_text(prefix="esp_"):
+    """Render the metrics in the Prometheus text exposition format"""
+    lines = []
+    with _metrics_lock:
+        for name, value in sorted(METRICS["counters"].items()):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            lines.append(f"{prefix}{name} {value}")
+        for name, value in sorted(METRICS["gauges"].items()):
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            lines.append(f"{prefix}{name} {value}")
+        for name, histogram in sorted(METRICS["histograms"].items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f'{prefix}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{prefix}{name}_sum {histogram['sum']}")
+            lines.append(f"{prefix}{name}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(path, metrics_format, previous=None, interval=None):
+    """
+    Write the current metrics to path.
+
+    JSON lines are appended with per-second rates of the counters since the
+    previous export; a Prometheus textfile is replaced atomically, as the
+    node_exporter textfile collector expects.
+
+    Args:
+        path: File to write
+        metrics_format: "jsonl" or "prometheus"
+        previous: Snapshot from the previous export, for the rates
+        interval: Seconds since the previous export
+
+    Returns:
+        The snapshot that was exported
+    """
+    snapshot = metrics_snapshot()
+    if metrics_format == "prometheus":
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(prometheus_text())
+        os.replace(temp_path, path)
+        return snapshot
+
+    record = {"time": datetime.now().isoformat(timespec="seconds")}
+    record.update(snapshot)
+    if previous is not None and interval:
+        record["rates"] = {
+            name: round((value - previous["counters"].get(name, 0)) / interval, 2)
+            for name, value in snapshot["counters"].items()
+        }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return snapshot
+
+
+def start_metrics_reporter(path, metrics_format="jsonl", interval=10):
+    """
+    Export the metrics to path every interval seconds from a background thread.
+
+    Returns:
+        Function that stops the reporter after a final export
+    """
+    stop_event = threading.Event()
+
+    def report():
+        previous = None
+        last_time = time.perf_counter()
+        while not stop_event.wait(interval):
+            now = time.perf_counter()
+            previous = export_metrics(path, metrics_format, previous, now - last_time)
+            last_time = now
+        export_metrics(path, metrics_format, previous, time.perf_counter() - last_time)
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+
+    def stop():
+        stop_event.set()
+        reporter.join()
+
+    return stop
+
+
+def write_run_report(path, started_at, elapsed, total_docs, options):
+    """
+    Write a machine-readable report of a completed run.
+
+    Args:
+        path: JSON file to write
+        started_at: Datetime the run started
+        elapsed: Run duration in seconds
+        total_docs: Documents in the index (or written to files) at the end
+        options: Run options to record, e.g. the parsed command line
+    """
+    snapshot = metrics_snapshot()
+    histograms = snapshot["histograms"]
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "elapsed_seconds": round(elapsed, 3),
+        "total_docs": total_docs,
+        "docs_per_sec": round(total_docs / elapsed, 2) if elapsed else 0,
+        # Where the time went, summed over all threads
+        "stage_seconds": {
+            name: histograms[name]["sum"]
+            for name in ("generate_batch_seconds", "serialize_seconds", "bulk_request_seconds", "submit_wait_seconds")
+            if name in histograms
+        },
+        "options": options,
+        "metrics": snapshot
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Run report written to {path}")
+
+
+def annotation_id(annotation):
+    """Deterministic document ID for an annotation, so reruns overwrite instead of duplicating"""
+    key = "|".join([annotation["sourceIndex"], annotation["filterField"], annotation["filterValue"],
+                    annotation["annotationType"], annotation["startDate"]])
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def rollup_id(rollup):
+    """Deterministic document ID for a rollup document"""
+    return "|".join([rollup["asset_name"], rollup["sensor_name"], rollup["interval"], rollup["timestamp"]])
+
+
+def document_id(document):
+    """Deterministic document ID from asset, sensor (if any) and timestamp, so resumed loads overwrite"""
+    if "sensor_name" in document:
+        return "|".join([document["asset_name"], document["sensor_name"], document["timestamp"]])
+    return "|".join([document["asset_name"], document["timestamp"]])
+
+
+def checkpoint_tracker(path, state, run_info):
+    """
+    Track which days of a load are fully acknowledged, for resuming with --resume.
+
+    Every bulk request is numbered. At the end of each day (see chunk_documents)
+    the simulator state is snapshotted and tagged with the last request number
+    of that day; the checkpoint file only advances to the day once all requests
+    up to that number have completed without failed documents. A failed request
+    stops the checkpoint for the rest of the run.
+
+    Args:
+        path: Checkpoint file path
+        state: Simulator state dictionary the generator updates in place
+        run_info: Run parameters recorded in the checkpoint (engine, seed, dates, index, ...)
+
+    Returns:
+        Tracker state dictionary
+    """
+    return {
+        "path": path,
+        "state": state,
+        "run_info": run_info,
+        "completed_days": [],  # (day, state snapshot) not yet tied to a request number
+        "markers": deque(),  # (last request number, day, state snapshot)
+        "pending": set(),  # Request numbers submitted but not acknowledged
+        "failed_from": None,  # First request number with failed documents
+        "day": None  # Last day written to the checkpoint file
+    }
+
+
+def record_day_end(tracker, day):
+    """Snapshot the simulator state at the end of day (deep copy through JSON)"""
+    snapshot = json.loads(json.dumps(serialize_simulator_state(tracker["state"])))
+    tracker["completed_days"].append((day, snapshot))
+
+
+def mark_completed_days(tracker, last_batch_num):
+    """Tie the recorded days to the last request submitted for them"""
+    for day, snapshot in tracker["completed_days"]:
+        tracker["markers"].append((last_batch_num, day, snapshot))
+    tracker["completed_days"] = []
+    advance_checkpoint(tracker)
+
+
+def acknowledge_batch(tracker, batch_num, success):
+    """Record a completed request and advance the checkpoint if possible"""
+    tracker["pending"].discard(batch_num)
+    if not success and (tracker["failed_from"] is None or batch_num < tracker["failed_from"]):
+        tracker["failed_from"] = batch_num
+    advance_checkpoint(tracker)
+
+
+def advance_checkpoint(tracker):
+    """Write the checkpoint for the latest day whose requests all completed without failures"""
+    limit = min(tracker["pending"], default=float("inf"))
+    if tracker["failed_from"] is not None:
+        limit = min(limit, tracker["failed_from"])
+
+    latest = None
+    while tracker["markers"] and tracker["markers"][0][0] < limit:
+        latest = tracker["markers"].popleft()
+    if latest is None:
+        return
+
+    _, day, snapshot = latest
+    checkpoint = dict(tracker["run_info"])
+    checkpoint.update({
+        "day": day.strftime("%Y-%m-%d"),
+        "resume_from": (day + timedelta(days=1)).strftime("%Y-%m-%d"),
+        "updated_at": datetime.now().isoformat(),
+        "state": snapshot
+    })
+    write_checkpoint(tracker["path"], checkpoint)
+    tracker["day"] = checkpoint["day"]
+
+
+def write_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path):
+    """Read a checkpoint file written by write_checkpoint"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def report_checkpoint(tracker):
+    """Print where the checkpoint stands at the end of a load"""
+    if tracker["failed_from"] is not None:
+        print(f"Some bulk requests failed; checkpoint {tracker['path']} stops at day {tracker['day']}. "
+              f"Run again with --resume to continue from there")
+    elif tracker["day"] is not None:
+        print(f"Checkpoint {tracker['path']} is at day {tracker['day']}")
+
+
+def configure_connection(hosts=None, sniff=False, require_auth=True):
+    """
+    Point OPENSEARCH_CONNECTION at the cluster to use.
+
+    Hosts come from hosts or the OPENSEARCH_HOSTS environment variable (comma
+    separated URLs), otherwise the default host is kept. The credentials come
+    from OPENSEARCH_USERNAME and OPENSEARCH_PASSWORD, the variables the app
+    reads; there are no default credentials. With sniff, clients discover the
+    cluster's nodes on start and after connection failures (see SNIFF_OPTIONS).
+
+    Args:
+        hosts: Optional list of node URLs
+        sniff: Discover the other nodes of the cluster from the given hosts
+        require_auth: Raise ValueError if the credentials are not set (False for clusters without security)
+    """
+    hosts = hosts or [host.strip() for host in os.environ.get("OPENSEARCH_HOSTS", "").split(",") if host.strip()]
+    if hosts:
+        OPENSEARCH_CONNECTION["hosts"] = hosts
+    if os.environ.get("OPENSEARCH_USERNAME") and os.environ.get("OPENSEARCH_PASSWORD"):
+        OPENSEARCH_CONNECTION["http_auth"] = (os.environ["OPENSEARCH_USERNAME"], os.environ["OPENSEARCH_PASSWORD"])
+    elif require_auth:
+        raise ValueError("set OPENSEARCH_USERNAME and OPENSEARCH_PASSWORD, or pass --no-auth for a cluster "
+                         "without security")
+    if sniff:
+        OPENSEARCH_CONNECTION.update(SNIFF_OPTIONS)
+        # Sniffed nodes come as host:port, without the scheme of the configured hosts
+        if any(str(host).startswith("https://") for host in OPENSEARCH_CONNECTION["hosts"]):
+            OPENSEARCH_CONNECTION["use_ssl"] = True
+
+
+def data_node_urls(os_client):
+    """HTTP URLs of the cluster's data nodes from the nodes info API, with the scheme of the configured hosts"""
+    scheme = "https" if OPENSEARCH_CONNECTION.get("use_ssl") or \
+        str(OPENSEARCH_CONNECTION["hosts"][0]).startswith("https://") else "http"
+    urls = []
+    for node in os_client.nodes.info(metric="http")["nodes"].values():
+        if "http" not in node or not any(role.startswith("data") for role in node.get("roles", ["data"])):
+            continue
+        # publish_address is "ip:port" or "hostname/ip:port"
+        urls.append(f"{scheme}://{node['http']['publish_address'].rsplit('/', 1)[-1]}")
+    return sorted(urls)
+
+
+def node_dispatcher(os_client, pool_size):
+    """
+    Set up spreading bulk requests across the cluster's nodes.
+
+    The nodes are the data nodes found by sniffing when it is enabled (see
+    configure_connection), the configured hosts otherwise. Every node gets its
+    own client, so a request goes to the node acquire_node picks instead of
+    through one coordinating node.
+
+    Args:
+        os_client: Client connected to the cluster
+        pool_size: Keep-alive connections per node
+
+    Returns:
+        Dispatcher state dictionary, or None if there is only one node to send to
+    """
+    if OPENSEARCH_CONNECTION.get("sniff_on_start"):
+        urls = data_node_urls(os_client)
+    else:
+        urls = list(OPENSEARCH_CONNECTION["hosts"])
+    if len(urls) < 2:
+        return None
+
+    settings = {key: value for key, value in OPENSEARCH_CONNECTION.items()
+                if key != "hosts" and key not in SNIFF_OPTIONS}
+    nodes = [{"url": url, "client": OpenSearch(hosts=[url], **settings, pool_maxsize=pool_size), "in_flight": 0,
+              "latency": 0.0, "rejection_rate": 0.0, "requests": 0, "rejected": 0, "errors": 0, "down_until": 0.0}
+             for url in urls]
+    print(f"Dispatching bulk requests across {len(nodes)} nodes: {', '.join(urls)}")
+    return {"nodes": nodes, "lock": threading.Lock()}
+
+
+def acquire_node(dispatcher):
+    """
+    Pick the node for the next bulk request and count the request as in flight there.
+
+    Nodes are scored by the wait to expect, (requests in flight + 1) x average
+    latency, inflated by their recent rejection rate. Nodes without a request
+    yet score 0, so every node gets tried; nodes that failed to answer are
+    skipped for NODE_COOLDOWN_SECONDS unless all of them did.
+    """
+    now = time.monotonic()
+    with dispatcher["lock"]:
+        nodes = [node for node in dispatcher["nodes"] if node["down_until"] <= now] or dispatcher["nodes"]
+        node = min(nodes, key=lambda node: ((node["in_flight"] + 1) * node["latency"] *
+                                            (1 + NODE_REJECTION_WEIGHT * node["rejection_rate"]),
+                                            node["in_flight"], node["requests"]))
+        node["in_flight"] += 1
+    return node
+
+
+def release_node(dispatcher, node, latency, rejected=0.0, failed=False):
+    """
+    Record a finished bulk request on the node acquire_node picked for it.
+
+    Args:
+        dispatcher: Dispatcher state from node_dispatcher
+        node: Node the request went to
+        latency: Seconds the request took
+        rejected: Fraction of the request's items the node rejected (1.0 for a rejected request)
+        failed: The node did not answer (connection error or timeout)
+    """
+    with dispatcher["lock"]:
+        node["in_flight"] -= 1
+        node["requests"] += 1
+        if failed:
+            node["errors"] += 1
+            node["down_until"] = time.monotonic() + NODE_COOLDOWN_SECONDS
+            return
+        node["latency"] += NODE_EWMA_ALPHA * (latency - node["latency"]) if node["latency"] else latency
+        node["rejection_rate"] += NODE_EWMA_ALPHA * (rejected - node["rejection_rate"])
+        if rejected:
+            node["rejected"] += 1
+
+
+def dispatch_bulk(os_client, body, dispatcher=None):
+    """
+    Send an NDJSON _bulk body and return the response.
+
+    With a dispatcher the request goes to the node acquire_node picks, and on
+    to another node if that one does not answer; otherwise through os_client.
+    """
+    attempts = len(dispatcher["nodes"]) if dispatcher is not None else 1
+    for attempt in range(attempts):
+        node = acquire_node(dispatcher) if dispatcher is not None else None
+        client = node["client"] if node is not None else os_client
+        start_time = time.perf_counter()
+        try:
+            response = client.transport.perform_request(
+                "POST",
+                "/_bulk",
+                body=body,
+                headers={"Content-Type": "application/x-ndjson"},
+                params={"request_timeout": 60}
+            )
+        except Exception as e:
+            if node is None:
+                raise
+            # Connection errors and timeouts have no HTTP status
+            status = getattr(e, "status_code", None)
+            failed = not isinstance(status, int)
+            release_node(dispatcher, node, time.perf_counter() - start_time, 1.0 if status == 429 else 0.0, failed)
+            if not failed or attempt == attempts - 1:
+                raise
+            metric_inc("bulk_node_failovers_total")
+            continue
+
+        if node is not None:
+            rejected = 0.0
+            if response["errors"] and response["items"]:
+                rejected = sum(is_rejected_item(next(iter(item.values())))
+                               for item in response["items"]) / len(response["items"])
+            release_node(dispatcher, node, time.perf_counter() - start_time, rejected)
+        return response
+
+
+def report_dispatcher(dispatcher):
+    """Print the requests, average latency, rejections and failures per node at the end of a load"""
+    for node in dispatcher["nodes"]:
+        print(f"Node {node['url']}: {node['requests']:,} bulk requests, "
+              f"{node['latency'] * 1000:.0f} ms recent latency, {node['rejected']:,} with rejections, "
+              f"{node['errors']:,} failed")
+
+
+def opensearch_doc_generator(documents, index_name, id_func=None):
+    """Generator for OpenSearch helpers.bulk"""
+    for doc in documents:
+        action = {
+            "_index": index_name,
+            "_source": doc
+        }
+        if id_func:
+            action["_id"] = id_func(doc)
+        yield action
+
+
+def write_batch_to_opensearch(os_client, batch, index_name, batch_num, id_func=None, stats=None, dispatcher=None):
+    """Write a batch of documents to OpenSearch (through the node the dispatcher picks, if given)"""
+    node = acquire_node(dispatcher) if dispatcher is not None else None
+    try:
+        start_time = time.perf_counter()
+        success, failed = helpers.bulk(
+            node["client"] if node is not None else os_client,
+            opensearch_doc_generator(batch_documents(batch), index_name, id_func),
+            max_retries=3,
+            request_timeout=60,
+            stats_only=True
+        )
+
+        latency = time.perf_counter() - start_time
+        if node is not None:
+            # helpers.bulk retries rejections itself; what still failed counts as rejected
+            release_node(dispatcher, node, latency, failed / max(1, success + failed))
+            node = None
+        if stats is not None:
+            stats["latency"] = latency
+            stats["errors"] = failed
+
+        # helpers.bulk hides its requests and retries, so the whole call counts as one request
+        metric_inc("bulk_requests_total")
+        metric_observe("bulk_request_seconds", latency)
+        metric_inc("bulk_docs_indexed_total", success)
+        metric_inc("bulk_docs_failed_total", failed)
+
+        print(f"Batch {batch_num}: Indexed {success} documents, Failed: {failed}")
+        return success, failed
+    except Exception as e:
+        if node is not None:
+            release_node(dispatcher, node, time.perf_counter() - start_time, 1.0,
+                         not isinstance(getattr(e, "status_code", None), int))
+        metric_inc("bulk_errors_total")
+        metric_inc("bulk_docs_failed_total", document_count(batch))
+        print(f"Error in batch {batch_num}: {str(e)}")
+        return 0, document_count(batch)
+
+
+# Precomputed bulk action line per index
+_bulk_action_lines = {}
+
+# Reusable request body buffer per writer thread
+_bulk_buffers = threading.local()
+
+
+def bulk_action_line(index_name):
+    """Return the NDJSON action line for indexing into index_name"""
+    action_line = _bulk_action_lines.get(index_name)
+    if action_line is None:
+        action_line = json.dumps({"index": {"_index": index_name}}, separators=(",", ":")).encode("utf-8") + b"\n"
+        _bulk_action_lines[index_name] = action_line
+    return action_line
+
+
+def encode_json_line(document):
+    """Encode a document as one NDJSON line (orjson if available, stdlib json otherwise)"""
+    if orjson is not None:
+        return orjson.dumps(document, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def serialize_reading_block(buffer, block, index_name, with_ids=False):
+    """
+    Append the _bulk lines of a reading block to buffer without materializing its documents.
+
+    Lines are assembled from fragments encoded once per timestamp, asset/sensor
+    pair and value, and are byte for byte what encoding reading_documents(block)
+    with encode_json_line (and document_id for with_ids) produces.
+
+    Args:
+        buffer: bytearray to append to
+        block: Reading block
+        index_name: Name of the index to write to
+        with_ids: Send document_id IDs
+    """
+    readings = block["readings"]
+    assets = block["lookup"]["assets"]
+    sensors = block["lookup"]["sensors"]
+    times, time_codes = np.unique(readings["time"], return_inverse=True)
+    pairs, pair_codes = np.unique(readings["asset"].astype(np.int64) * len(sensors) + readings["sensor"],
+                                  return_inverse=True)
+    timestamps = epoch_timestamps(times)
+
+    # Line fragments: up to the asset name per timestamp, up to the value and after it per asset/sensor pair
+    time_heads = [b'{"timestamp":' + encode_json_line(timestamp)[:-1] + b',' for timestamp in timestamps]
+    pair_heads = []
+    pair_tails = []
+    for pair in pairs.tolist():
+        asset_name = assets[pair // len(sensors)]
+        sensor_name, unit, _ = sensors[pair % len(sensors)]
+        pair_heads.append(b'"asset_name":' + encode_json_line(asset_name)[:-1] + b',"sensor_name":' +
+                          encode_json_line(sensor_name)[:-1] + b',"sensor_value":')
+        pair_tails.append(b',"sensor_unit":' + encode_json_line(unit)[:-1] + b'}\n')
+    values = reading_values(block)
+    if orjson is not None:
+        values = orjson.dumps(values)[1:-1].split(b",")
+    else:
+        values = json.dumps(values, separators=(",", ":"))[1:-1].encode("utf-8").split(b",")
+
+    if with_ids:
+        # Action line prefix up to the _id value, then "asset|sensor|" per pair and "timestamp" per time
+        id_prefix = bulk_action_line(index_name)[:-3] + b',"_id":"'
+        pair_ids = [id_prefix + "|".join([assets[pair // len(sensors)], sensors[pair % len(sensors)][0],
+                                          ""]).encode("utf-8") for pair in pairs.tolist()]
+        time_ids = [timestamp.encode("utf-8") + b'"}}\n' for timestamp in timestamps]
+        for time_code, pair_code, value in zip(time_codes.tolist(), pair_codes.tolist(), values):
+            buffer += pair_ids[pair_code]
+            buffer += time_ids[time_code]
+            buffer += time_heads[time_code]
+            buffer += pair_heads[pair_code]
+            buffer += value
+            buffer += pair_tails[pair_code]
+    else:
+        action_line = bulk_action_line(index_name)
+        time_heads = [action_line + time_head for time_head in time_heads]
+        for time_code, pair_code, value in zip(time_codes.tolist(), pair_codes.tolist(), values):
+            buffer += time_heads[time_code]
+            buffer += pair_heads[pair_code]
+            buffer += value
+            buffer += pair_tails[pair_code]
+
+
+def serialize_bulk_body(documents, index_name, id_func=None):
+    """
+    Build an NDJSON bulk request body for documents.
+
+    The body is assembled in a per-thread buffer that is reused between requests.
+    Reading blocks are serialized directly (see serialize_reading_block).
+
+    Args:
+        documents: Documents (or reading block) to index
+        index_name: Name of the index to write to
+        id_func: Optional function returning the _id for a document
+
+    Returns:
+        Request body as bytes
+    """
+    start_time = time.perf_counter()
+    buffer = getattr(_bulk_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _bulk_buffers.buffer = bytearray()
+    buffer.clear()
+
+    if isinstance(documents, dict) and id_func in (None, document_id):
+        serialize_reading_block(buffer, documents, index_name, id_func is not None)
+    elif id_func:
+        # Action line prefix up to the _id value
+        id_prefix = bulk_action_line(index_name)[:-3] + b',"_id":"'
+        for document in batch_documents(documents):
+            buffer += id_prefix
+            buffer += id_func(document).encode("utf-8")
+            buffer += b'"}}\n'
+            buffer += encode_json_line(document)
+    else:
+        action_line = bulk_action_line(index_name)
+        for document in batch_documents(documents):
+            buffer += action_line
+            buffer += encode_json_line(document)
+
+    metric_observe("serialize_seconds", time.perf_counter() - start_time)
+    metric_inc("serialized_bytes_total", len(buffer))
+    return bytes(buffer)
+
+
+def is_rejected_item(result):
+    """Whether a bulk item failed because the node's write queue was full"""
+    error = result.get("error")
+    error_type = error.get("type", "") if isinstance(error, dict) else ""
+    return result["status"] == 429 or error_type.endswith("rejected_execution_exception")
+
+
+def record_bulk_request(attempt, body_bytes, latency, indexed, rejected, failed):
+    """Record the metrics of one _bulk request (attempt 0 is the first try, later ones are retries)"""
+    metric_inc("bulk_requests_total")
+    if attempt:
+        metric_inc("bulk_retries_total")
+    metric_observe("bulk_request_seconds", latency)
+    metric_observe("bulk_request_bytes", body_bytes, SIZE_BUCKETS)
+    metric_inc("bulk_docs_indexed_total", indexed)
+    metric_inc("bulk_docs_rejected_total", rejected)
+    metric_inc("bulk_item_errors_total", failed)
+
+
+def split_bulk_response(documents, response):
+    """
+    Sort the documents of a _bulk request by outcome.
+
+    Args:
+        documents: Documents (or reading block) in the order they were sent
+        response: _bulk response body
+
+    Returns:
+        Tuple of (indexed count, rejected documents to retry, failed count)
+    """
+    if not response["errors"]:
+        return document_count(documents), [], 0
+
+    success = 0
+    failed = 0
+    rejected = []
+    for position, item in enumerate(response["items"]):
+        result = next(iter(item.values()))
+        if result["status"] < 300:
+            success += 1
+        elif is_rejected_item(result):
+            rejected.append(position)
+        else:
+            failed += 1
+    return success, select_documents(documents, rejected) if rejected else [], failed
+
+
+def rejected_response(documents):
+    """_bulk response equivalent to the whole request being rejected with HTTP 429"""
+    return {"errors": True, "items": [{"index": {"status": 429}}] * document_count(documents)}
+
+
+def retry_delay(attempt, initial_backoff):
+    """Exponential backoff for a retry; half of the delay is fixed, half random, so workers don't retry in lockstep"""
+    delay = initial_backoff * 2 ** (attempt - 1)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def write_ndjson_batch_to_opensearch(os_client, batch, index_name, batch_num, id_func=None, max_retries=3,
+                                     initial_backoff=2, stats=None, preformatted=False, dispatcher=None):
+    """
+    Write a batch of documents to OpenSearch as a pre-serialized NDJSON _bulk request.
+
+    Documents rejected by the cluster (HTTP 429 / rejected_execution_exception) are
+    retried with jittered exponential backoff; other per-item errors are not retried.
+
+    Args:
+        os_client: OpenSearch client
+        batch: Documents to index
+        index_name: Name of the index to write to
+        batch_num: Batch number for progress reporting
+        id_func: Optional function returning the _id for a document
+        max_retries: Number of retries for rejected documents
+        initial_backoff: Seconds to wait before the first retry (doubled on every retry)
+        stats: Optional dict filled with the request size, latency, rejected and failed item counts
+            for the adaptive controller
+        preformatted: batch holds encoded action and source line pairs (as written by write_to_files)
+            instead of documents
+        dispatcher: Optional node dispatcher (see node_dispatcher) choosing the node for every request
+
+    Returns:
+        Tuple of (indexed documents, failed documents)
+    """
+    success = 0
+    rejected_items = 0
+    failed_items = 0
+    pending = batch
+
+    try:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(retry_delay(attempt, initial_backoff))
+
+            body = b"".join(pending) if preformatted else serialize_bulk_body(pending, index_name, id_func)
+            start_time = time.perf_counter()
+            try:
+                response = dispatch_bulk(os_client, body, dispatcher)
+            except TransportError as e:
+                if e.status_code != 429:
+                    raise
+                # The whole request was rejected
+                response = rejected_response(pending)
+
+            latency = time.perf_counter() - start_time
+            if attempt == 0 and stats is not None:
+                stats["bytes"] = len(body)
+                stats["latency"] = latency
+
+            indexed, pending, failed = split_bulk_response(pending, response)
+            record_bulk_request(attempt, len(body), latency, indexed, document_count(pending), failed)
+            success += indexed
+            failed_items += failed
+            rejected_items += document_count(pending)
+            if not document_count(pending):
+                break
+
+        if stats is not None:
+            stats["rejected"] = rejected_items
+            stats["errors"] = failed_items
+
+        failed = document_count(batch) - success
+        metric_inc("bulk_docs_failed_total", failed)
+        print(f"Batch {batch_num}: Indexed {success} documents, Failed: {failed}")
+        return success, failed
+    except Exception as e:
+        metric_inc("bulk_errors_total")
+        metric_inc("bulk_docs_failed_total", document_count(batch) - success)
+        print(f"Error in batch {batch_num}: {str(e)}")
+        return success, document_count(batch) - success
+
+
+# Bulk writers selectable by name
+BULK_WRITERS = {
+    "ndjson": write_ndjson_batch_to_opensearch,
+    "helpers": write_batch_to_opensearch
+}
+
+
+def chunk_documents(documents_generator, chunk_size, on_day_end=None):
+    """
+    Re-chunk generator batches into fixed-size document chunks.
+
+    Args:
+        documents_generator: Generator yielding batches of documents and annotations
+        chunk_size: Number of documents per chunk, or a function returning it (called for every chunk)
+        on_day_end: Optional function called with the day whenever a batch marks a day as complete.
+            The partial chunk is yielded first, and the generator is still paused at the end of
+            that day when the function runs, so it can snapshot the simulator state.
+
+    Returns:
+        Generator of (documents, annotations, rollups) tuples, where documents is a list or a reading block
+        ([] if the chunk has none); every chunk but the last holds chunk_size documents (unless on_day_end
+        is set, in which case chunks also end at day boundaries)
+    """
+    current_size = chunk_size if callable(chunk_size) else lambda: chunk_size
+    size = current_size()
+    pieces = []  # Slices of the generator batches making up the chunk
+    chunk_count = 0
+    annotations = []
+    rollups = []
+
+    batches = iter(documents_generator)
+    while True:
+        # Time spent waiting for the generator is the generation stage
+        pull_start = time.perf_counter()
+        batch_data = next(batches, None)
+        if batch_data is None:
+            break
+        metric_observe("generate_batch_seconds", time.perf_counter() - pull_start)
+        data = batch_data["data"]
+        data_count = document_count(data)
+        metric_inc("generated_docs_total", data_count)
+        metric_inc("generated_annotations_total", len(batch_data["annotations"]))
+
+        annotations.extend(batch_data["annotations"])
+        rollups.extend(batch_data.get("rollups", ()))
+        position = 0
+        while position < data_count:
+            take = size - chunk_count
+            pieces.append(slice_documents(data, position, position + take))
+            chunk_count += document_count(pieces[-1])
+            position += take
+            if chunk_count == size:
+                yield join_documents(pieces), annotations, rollups
+                pieces = []
+                chunk_count = 0
+                annotations = []
+                rollups = []
+                size = current_size()
+
+        if on_day_end is not None and "day_end" in batch_data:
+            if pieces or annotations or rollups:
+                yield join_documents(pieces), annotations, rollups
+                pieces = []
+                chunk_count = 0
+                annotations = []
+                rollups = []
+                size = current_size()
+            on_day_end(batch_data["day_end"])
+
+    if pieces or annotations or rollups:
+        yield join_documents(pieces), annotations, rollups
+
+
+def estimate_chunk_bytes(chunk, index_name):
+    """Estimate the bulk request size of a chunk (list of documents or reading block) from its first document"""
+    if not document_count(chunk):
+        return 0
+    action = {"index": {"_index": index_name}}
+    first = batch_documents(slice_documents(chunk, 0, 1))[0]
+    return (len(json.dumps(action)) + len(json.dumps(first)) + 2) * document_count(chunk)
+
+
+def bulk_controller(chunk_size, max_in_flight, target_bytes=DEFAULT_TARGET_BULK_BYTES):
+    """
+    Create the state of the adaptive bulk controller.
+
+    The controller starts with chunk_size documents per request and max_in_flight
+    requests in flight, then moves towards requests of target_bytes.
+
+    Args:
+        chunk_size: Initial number of documents per bulk request
+        max_in_flight: Most bulk requests queued or in flight at once
+        target_bytes: Bulk request size to aim for
+
+    Returns:
+        Controller state dict, read by the indexing loop and updated by update_bulk_controller
+    """
+    return {
+        "target_bytes": target_bytes,
+        "scale": 1.0,  # Fraction of target_bytes currently aimed for, lowered under pressure
+        "doc_bytes": None,  # Moving average of request bytes per document
+        "best_latency": None,  # Fastest observed seconds per MB of request
+        "chunk_size": max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size)),
+        "max_in_flight": max_in_flight,
+        "in_flight_limit": max_in_flight,
+        "epoch": 0  # Bumped on every decrease; older requests can't trigger another one
+    }
+
+
+def update_bulk_controller(controller, stats):
+    """
+    Adjust chunk size and in-flight requests from the outcome of one bulk request.
+
+    Rejections halve the in-flight requests and the request size, latency well above
+    the best observed or per-item errors take one request out of flight, and clean
+    requests grow both back (additive increase, multiplicative decrease).
+
+    Args:
+        controller: State from bulk_controller
+        stats: Request stats with docs, bytes, latency, rejected, errors and the epoch it was sent in
+    """
+    if not stats["docs"] or "latency" not in stats:
+        return
+
+    doc_bytes = stats["bytes"] / stats["docs"]
+    if controller["doc_bytes"] is None:
+        controller["doc_bytes"] = doc_bytes
+    else:
+        controller["doc_bytes"] = 0.8 * controller["doc_bytes"] + 0.2 * doc_bytes
+
+    # Compare latency per MB so requests of different sizes are comparable
+    latency = stats["latency"] / max(stats["bytes"], 1) * 1024 * 1024
+    if controller["best_latency"] is None or latency < controller["best_latency"]:
+        controller["best_latency"] = latency
+
+    if stats["epoch"] < controller["epoch"]:
+        # Sent before the last decrease, so it says nothing about the current settings
+        return
+
+    max_in_flight = controller["max_in_flight"]
+    scale = controller["scale"]
+    overloaded = stats.get("errors") or latency > 2 * controller["best_latency"]
+    if stats.get("rejected"):
+        max_in_flight = max(1, max_in_flight // 2)
+        scale = max(0.05, scale / 2)
+    elif overloaded:
+        max_in_flight = max(1, max_in_flight - 1)
+    else:
+        max_in_flight = min(controller["in_flight_limit"], max_in_flight + 1)
+        scale = min(1.0, scale * 1.1)
+
+    chunk_size = int(controller["target_bytes"] * scale / controller["doc_bytes"])
+    controller["chunk_size"] = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size))
+    controller["max_in_flight"] = max_in_flight
+    controller["scale"] = scale
+    metric_set("bulk_chunk_size", controller["chunk_size"])
+    metric_set("bulk_max_in_flight", max_in_flight)
+
+    if stats.get("rejected") or overloaded:
+        controller["epoch"] += 1
+    if stats.get("rejected"):
+        print(f"Cluster rejected {stats['rejected']} documents; backing off to {controller['chunk_size']} "
+              f"documents per request, {max_in_flight} requests in flight")
+
+
+def estimate_shard_count(estimated_docs, docs_per_shard=DEFAULT_DOCS_PER_SHARD, max_shards=32):
+    """Derive the number of primary shards from the estimated document volume"""
+    return max(1, min(max_shards, -(-estimated_docs // docs_per_shard)))
+
+
+def index_template_settings(number_of_shards, sort_fields):
+    """Index settings shared by the managed templates"""
+    return {
+        "number_of_shards": number_of_shards,
+        "number_of_replicas": 0,
+        "codec": "best_compression",
+        "sort.field": sort_fields,
+        "sort.order": ["asc"] * len(sort_fields),
+        "max_result_window": 100000
+    }
+
+
+def esp_index_template(index_name, number_of_shards=2, read_alias=None):
+    """
+    Build the versioned index template for the long (one reading per document) format.
+
+    Dimensions are keyword-only (no text or .keyword subfields), sensor_value is a
+    scaled_float with two decimals whatever sensor arrives first, and the index
+    is sorted on (asset_name, sensor_name, timestamp) so the per-asset/sensor
+    date histograms the app runs read contiguous, well-compressed blocks.
+
+    Args:
+        index_name: Index (pattern) the template applies to
+        number_of_shards: Number of primary shards
+        read_alias: Optional alias every matching index is added to
+
+    Returns:
+        Composable index template body
+    """
+    template = {
+        "index_patterns": [index_name],
+        "priority": 100,
+        "version": INDEX_TEMPLATE_VERSION,
+        "template": {
+            "settings": {"index": index_template_settings(number_of_shards,
+                                                          ["asset_name", "sensor_name", "timestamp"])},
+            "mappings": {
+                "dynamic": "strict",
+                "properties": {
+                    "timestamp": {"type": "date"},
+                    "asset_name": DIMENSION_MAPPING,
+                    "sensor_name": DIMENSION_MAPPING,
+                    "sensor_unit": DIMENSION_MAPPING,
+                    "sensor_value": {"type": "scaled_float", "scaling_factor": 100}
+                }
+            }
+        },
+        "_meta": {"doc_format": "long"}
+    }
+    if read_alias:
+        template["template"]["aliases"] = {read_alias: {}}
+    return template
+
+
+def rollup_index_template(index_name, number_of_shards=1):
+    """
+    Build the index template for the rollup indices (see rollup_documents).
+
+    Args:
+        index_name: Index (pattern) the template applies to
+        number_of_shards: Number of primary shards
+
+    Returns:
+        Composable index template body
+    """
+    return {
+        "index_patterns": [index_name],
+        "priority": 100,
+        "version": INDEX_TEMPLATE_VERSION,
+        "template": {
+            "settings": {"index": index_template_settings(number_of_shards,
+                                                          ["asset_name", "sensor_name", "timestamp"])},
+            "mappings": {
+                "dynamic": "strict",
+                "properties": {
+                    "timestamp": {"type": "date"},
+                    "asset_name": DIMENSION_MAPPING,
+                    "sensor_name": DIMENSION_MAPPING,
+                    "sensor_unit": DIMENSION_MAPPING,
+                    "interval": {"type": "keyword"},
+                    "sample_count": {"type": "integer"},
+                    "sensor_sum": {"type": "double"},
+                    "sensor_min": {"type": "double"},
+                    "sensor_max": {"type": "double"},
+                    "sensor_value": {"type": "double"}
+                }
+            }
+        },
+        "_meta": {"doc_format": "rollup"}
+    }
+
+
+def compact_index_template(doc_format, index_name, sensors_to_use=None, trim_source=False, number_of_shards=2,
+                           read_alias=None):
+    """
+    Build an index template for the compact document formats.
+
+    Dimensions are keyword fields, sensor values are doc_values-only numeric
+    fields (aggregations work, range queries on them do not) and dynamic
+    mapping is disabled.
+
+    Args:
+        doc_format: "wide" or "hourly"
+        index_name: Index (pattern) the template applies to
+        sensors_to_use: Sensor configurations (defaults to all sensors)
+        trim_source: Disable _source for the wide format (values remain available to aggregations)
+        number_of_shards: Number of primary shards
+        read_alias: Optional alias every matching index is added to
+
+    Returns:
+        Composable index template body
+    """
+    sensors_to_use = sensors_to_use or ALL_SENSORS
+    scaled_value = {"type": "scaled_float", "scaling_factor": 100, "index": False}
+
+    if doc_format == "wide":
+        properties = {
+            "timestamp": {"type": "date"},
+            "asset_name": DIMENSION_MAPPING
+        }
+        for sensor_name, sensor_config in sensors_to_use.items():
+            properties[sensor_name] = scaled_value if sensor_config["is_float"] else {"type": "integer",
+                                                                                       "index": False}
+        mappings = {"dynamic": "strict", "properties": properties}
+        if trim_source:
+            mappings["_source"] = {"enabled": False}
+        sort_fields = ["asset_name", "timestamp"]
+    elif doc_format == "hourly":
+        # _source is kept so the minute order of the packed arrays can be recovered
+        mappings = {
+            "dynamic": "strict",
+            "properties": {
+                "timestamp": {"type": "date"},
+                "asset_name": DIMENSION_MAPPING,
+                "sensor_name": DIMENSION_MAPPING,
+                "sensor_unit": {"type": "keyword", "index": False},
+                "sensor_value": scaled_value
+            }
+        }
+        sort_fields = ["asset_name", "sensor_name", "timestamp"]
+    else:
+        raise ValueError(f"No compact index template for document format '{doc_format}'")
+
+    template = {
+        "index_patterns": [index_name],
+        "priority": 100,
+        "version": INDEX_TEMPLATE_VERSION,
+        "template": {
+            "settings": {"index": index_template_settings(number_of_shards, sort_fields)},
+            "mappings": mappings
+        },
+        "_meta": {"doc_format": doc_format}
+    }
+    if read_alias:
+        template["template"]["aliases"] = {read_alias: {}}
+    return template
+
+
+def ensure_index_template(os_client, template_name, index_template):
+    """
+    Install an index template unless the cluster already has the same or a newer version.
+
+    Args:
+        os_client: OpenSearch client
+        template_name: Name of the index template
+        index_template: Index template body with a "version"
+
+    Returns:
+        True if the template was installed or updated
+    """
+    if os_client.indices.exists_index_template(name=template_name):
+        existing = os_client.indices.get_index_template(name=template_name)["index_templates"][0]
+        existing_version = existing["index_template"].get("version") or 0
+        if existing_version >= index_template["version"]:
+            print(f"Index template '{template_name}' is up to date (version {existing_version})")
+            return False
+
+    os_client.indices.put_index_template(name=template_name, body=index_template)
+    print(f"Installed index template '{template_name}' (version {index_template['version']})")
+    return True
+
+
+def rollup_index_name(index_name, interval):
+    """Name of the rollup index for index_name at one granularity"""
+    return f"{index_name}_rollup_{interval}"
+
+
+def split_rollups(rollups, index_name):
+    """Group rollup documents by their target rollup index"""
+    pieces = {}
+    for rollup in rollups:
+        pieces.setdefault(rollup_index_name(index_name, rollup["interval"]), []).append(rollup)
+    return pieces
+
+
+def monthly_index_name(index_name, timestamp):
+    """Name of the monthly partition (index_name-YYYY.MM) a timestamp string belongs to"""
+    return f"{index_name}-{timestamp[:4]}.{timestamp[5:7]}"
+
+
+def split_by_month(chunk, index_name):
+    """Group a chunk of documents (or reading block) by the monthly partition they belong to"""
+    if isinstance(chunk, dict):
+        months = chunk["readings"]["time"].astype("datetime64[s]").astype("datetime64[M]")
+        return {monthly_index_name(index_name, str(month)): select_documents(chunk, np.flatnonzero(months == month))
+                for month in np.unique(months)}
+    pieces = {}
+    for doc in chunk:
+        pieces.setdefault(monthly_index_name(index_name, doc["timestamp"]), []).append(doc)
+    return pieces
+
+
+def ism_policy(index_name, warm_after="45d"):
+    """
+    Build an ISM policy stub for the monthly partitions of index_name.
+
+    Partitions move to a warm state after warm_after, where they are merged to
+    one segment and made read-only. Index age counts from index creation, so
+    for backfilled history (where every month is created during one run) the
+    --force-merge option of this script does the compaction instead.
+
+    Args:
+        index_name: Read alias / partition prefix
+        warm_after: Minimum index age before a partition is compacted
+
+    Returns:
+        ISM policy body
+    """
+    return {
+        "policy": {
+            "description": f"Monthly {index_name} partitions: compact and freeze completed months",
+            "default_state": "hot",
+            "states": [
+                {
+                    "name": "hot",
+                    "actions": [],
+                    "transitions": [{"state_name": "warm", "conditions": {"min_index_age": warm_after}}]
+                },
+                {
+                    "name": "warm",
+                    "actions": [{"force_merge": {"max_num_segments": 1}}, {"read_only": {}}],
+                    "transitions": []
+                }
+            ],
+            "ism_template": [{"index_patterns": [f"{index_name}-*"], "priority": 100}]
+        }
+    }
+
+
+def install_ism_policy(os_client, index_name):
+    """Install the ISM policy stub for the monthly partitions (requires the ISM plugin)"""
+    policy_id = f"{index_name}_monthly"
+    try:
+        os_client.transport.perform_request("PUT", f"/_plugins/_ism/policies/{policy_id}",
+                                            body=ism_policy(index_name))
+        print(f"Installed ISM policy '{policy_id}'")
+    except Exception as e:
+        print(f"Could not install ISM policy '{policy_id}': {str(e)}")
+
+
+def ensure_annotations_index(os_client, annotations_index):
+    """Create the annotations index if it doesn't exist"""
+    if not os_client.indices.exists(index=annotations_index):
+        annotations_index_body = {
+            "settings": {
+                "number_of_shards": 1,  # Smaller index
+                "number_of_replicas": 0,
+                "refresh_interval": "-1"  # Faster refresh for smaller index
+            },
+            "mappings": {
+                "properties": {
+                    "startDate": {"type": "date"},
+                    "endDate": {"type": "date"}
+                }
+            }
+        }
+        os_client.indices.create(index=annotations_index, body=annotations_index_body)
+        print(f"Created index '{annotations_index}' for pump issue annotations")
+
+
+def prepare_indices(os_client, index_name="esp_pump_data", annotations_index="annotations", index_template=None,
+                    monthly_indices=False, install_ism=False, rollup_intervals=None):
+    """
+    Install the index template and create the indices for a bulk load.
+
+    Args:
+        os_client: OpenSearch client
+        index_name: Name of the index (or read alias with monthly_indices) to write to
+        annotations_index: Name of the index for annotations
+        index_template: Index template body to install before the index is created
+            (defaults to the long-format template)
+        monthly_indices: Write into monthly partitions behind an index_name alias
+        install_ism: Install the ISM policy stub for the monthly partitions
+        rollup_intervals: Rollup granularities to create <index_name>_rollup_<interval> indices for
+
+    Returns:
+        Tuple of (function creating a data index on first use, set of data indices written to)
+    """
+    # Install the versioned index template so it applies when the index is created
+    if index_template is None:
+        index_template = esp_index_template(f"{index_name}-*" if monthly_indices else index_name,
+                                            read_alias=index_name if monthly_indices else None)
+    ensure_index_template(os_client, f"{index_name}_template", index_template)
+
+    # Mappings, shards and sorting come from the template
+    index_body = {
+        "settings": {
+            "number_of_replicas": 0,
+            "refresh_interval": "-1"  # Reduced refresh rate for better performance
+        }
+    }
+    written_indices = set()
+
+    def ensure_index(name):
+        if name in written_indices:
+            return
+        if not os_client.indices.exists(index=name):
+            os_client.indices.create(index=name, body=index_body)
+            print(f"Created index '{name}' with optimized settings for large datasets")
+        else:
+            print(f"Index '{name}' already exists; template changes only apply to newly created indices")
+        written_indices.add(name)
+
+    if monthly_indices:
+        if os_client.indices.exists(index=index_name) and not os_client.indices.exists_alias(name=index_name):
+            raise ValueError(f"'{index_name}' is a concrete index and cannot become the read alias "
+                             f"of the monthly partitions")
+        if install_ism:
+            install_ism_policy(os_client, index_name)
+    else:
+        # Create main index if it doesn't exist
+        ensure_index(index_name)
+
+    ensure_annotations_index(os_client, annotations_index)
+
+    # Rollup indices are small, so one unpartitioned index per granularity
+    if rollup_intervals:
+        ensure_index_template(os_client, f"{index_name}_rollup_template",
+                              rollup_index_template(rollup_index_name(index_name, "*")))
+        for interval in rollup_intervals:
+            name = rollup_index_name(index_name, interval)
+            if not os_client.indices.exists(index=name):
+                os_client.indices.create(index=name, body=index_body)
+                print(f"Created index '{name}' for {interval} rollups")
+
+    return ensure_index, written_indices
+
+
+def finalize_indices(os_client, index_name, annotations_index, written_indices, monthly_indices=False,
+                     force_merge=False, rollup_intervals=None):
+    """
+    Make the indices searchable and redundant once a bulk load is complete.
+
+    Args:
+        os_client: OpenSearch client
+        index_name: Name of the index (or read alias) written to
+        annotations_index: Name of the index for annotations
+        written_indices: Data indices written to, from prepare_indices
+        monthly_indices: Whether monthly partitions were written
+        force_merge: Force-merge completed monthly partitions to one segment
+        rollup_intervals: Rollup granularities whose indices were written
+
+    Returns:
+        Tuple of (document count, annotation count)
+    """
+    # Refresh indexes to make sure count is accurate
+    print("Finalizing indexes...")
+    os_client.indices.refresh(index=index_name)
+    os_client.indices.refresh(index=annotations_index)
+
+    # Set to one replica for redundancy now that indexing is complete
+    os_client.indices.put_settings(
+        index=index_name,
+        body={"index": {"refresh_interval": "1s", "number_of_replicas": 1}}
+    )
+
+    # Annotations are bulk-written without refreshes; writers after the load (the app) rely on the periodic refresh
+    os_client.indices.put_settings(
+        index=annotations_index,
+        body={"index": {"refresh_interval": "1s", "number_of_replicas": 1}}
+    )
+
+    # Compact monthly partitions whose month is over
+    if monthly_indices and force_merge:
+        current_month = monthly_index_name(index_name, datetime.now().strftime("%Y-%m"))
+        for name in sorted(written_indices):
+            if name < current_month:
+                print(f"Force-merging '{name}' to one segment...")
+                os_client.indices.forcemerge(index=name, max_num_segments=1, request_timeout=3600)
+
+    for interval in rollup_intervals or ():
+        name = rollup_index_name(index_name, interval)
+        os_client.indices.refresh(index=name)
+        os_client.indices.put_settings(index=name, body={"index": {"refresh_interval": "1s",
+                                                                   "number_of_replicas": 1}})
+        print(f"Rollup index '{name}': {os_client.count(index=name)['count']:,} documents")
+
+    final_count = os_client.count(index=index_name)["count"]
+    annotations_count = os_client.count(index=annotations_index)["count"]
+
+    return final_count, annotations_count
+
+
+async def write_ndjson_batch_async(os_client, batch, index_name, batch_num, id_func=None, max_retries=3,
+                                   initial_backoff=2, stats=None):
+    """
+    Write a batch of documents as an NDJSON _bulk request on an AsyncOpenSearch client.
+
+    Same request, retry and stats handling as write_ndjson_batch_to_opensearch.
+    The body is serialized in a worker thread so encoding a large batch does not
+    stall the other bulk coroutines on the event loop.
+
+    Returns:
+        Tuple of (indexed documents, failed documents)
+    """
+    loop = asyncio.get_running_loop()
+    success = 0
+    rejected_items = 0
+    failed_items = 0
+    pending = batch
+
+    try:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                await asyncio.sleep(retry_delay(attempt, initial_backoff))
+
+            body = await loop.run_in_executor(None, serialize_bulk_body, pending, index_name, id_func)
+            start_time = time.perf_counter()
+            try:
+                response = await os_client.transport.perform_request(
+                    "POST",
+                    "/_bulk",
+                    body=body,
+                    headers={"Content-Type": "application/x-ndjson"},
+                    params={"request_timeout": 60}
+                )
+            except TransportError as e:
+                if e.status_code != 429:
+                    raise
+                response = rejected_response(pending)
+
+            latency = time.perf_counter() - start_time
+            if attempt == 0 and stats is not None:
+                stats["bytes"] = len(body)
+                stats["latency"] = latency
+
+            indexed, pending, failed = split_bulk_response(pending, response)
+            record_bulk_request(attempt, len(body), latency, indexed, document_count(pending), failed)
+            success += indexed
+            failed_items += failed
+            rejected_items += document_count(pending)
+            if not document_count(pending):
+                break
+
+        if stats is not None:
+            stats["rejected"] = rejected_items
+            stats["errors"] = failed_items
+
+        failed = document_count(batch) - success
+        metric_inc("bulk_docs_failed_total", failed)
+        print(f"Batch {batch_num}: Indexed {success} documents, Failed: {failed}")
+        return success, failed
+    except Exception as e:
+        metric_inc("bulk_errors_total")
+        metric_inc("bulk_docs_failed_total", document_count(batch) - success)
+        print(f"Error in batch {batch_num}: {str(e)}")
+        return success, document_count(batch) - success
+
+
+async def async_chunks(documents_generator, chunk_size, on_day_end=None):
+    """
+    Async generator over chunk_documents.
+
+    The synchronous generator is advanced in a worker thread, so producing the
+    next chunk overlaps with the bulk requests instead of blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = chunk_documents(documents_generator, chunk_size, on_day_end)
+    while True:
+        item = await loop.run_in_executor(None, next, chunks, None)
+        if item is None:
+            return
+        yield item
+
+
+async def write_bulk_async(documents_generator, index_name, annotations_index, ensure_index, controller,
+                           adaptive=True, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, monthly_indices=False,
+                           pool_size=16, doc_ids=False, tracker=None, rollup_intervals=None):
+    """
+    Stream documents to OpenSearch from concurrent bulk coroutines.
+
+    The asyncio backend of write_to_opensearch: requests go through one
+    AsyncOpenSearch client with pool_size keep-alive connections, and at most
+    controller["max_in_flight"] of them run at once.
+
+    Args:
+        documents_generator: Generator yielding batches of documents and annotations
+        index_name: Name of the index (or read alias) to write to
+        annotations_index: Name of the index for annotations
+        ensure_index: Function creating a data index on first use (called in a worker thread)
+        controller: State from bulk_controller
+        adaptive: Adjust chunk size and requests in flight from cluster feedback
+        max_inflight_bytes: Maximum estimated bytes of bulk requests in flight
+        monthly_indices: Write into monthly partitions behind an index_name alias
+        pool_size: Number of keep-alive connections
+        doc_ids: Send deterministic document IDs (see document_id)
+        tracker: Optional state from checkpoint_tracker
+        rollup_intervals: Rollup granularities the generator produces
+
+    Returns:
+        Tuple of (documents indexed, annotations indexed)
+    """
+    os_client = AsyncOpenSearch(**OPENSEARCH_CONNECTION, pool_maxsize=pool_size)
+    loop = asyncio.get_running_loop()
+    data_id_func = document_id if doc_ids else None
+
+    total_docs = 0
+    total_annotations = 0
+    batch_num = 0
+
+    # Requests in flight, with their estimated request size and request stats
+    in_flight = {}
+    in_flight_bytes = 0
+    pending_annotations = []
+    pending_rollups = {}
+
+    async def collect_completed():
+        nonlocal total_docs, total_annotations, in_flight_bytes
+        completed, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in completed:
+            success, failed = task.result()
+            chunk_bytes, stats, task_batch_num, kind = in_flight.pop(task)
+            if tracker is not None:
+                acknowledge_batch(tracker, task_batch_num, failed == 0)
+            if kind == "annotations":
+                total_annotations += success
+            elif kind == "data":
+                total_docs += success
+                if adaptive:
+                    update_bulk_controller(controller, stats)
+            in_flight_bytes -= chunk_bytes
+            metric_set("bulk_in_flight_requests", len(in_flight))
+            metric_set("bulk_in_flight_bytes", in_flight_bytes)
+
+    async def submit_chunk(piece, target_index, kind="data"):
+        nonlocal batch_num, in_flight_bytes
+
+        # Wait for room before taking more data from the generator
+        chunk_bytes = estimate_chunk_bytes(piece, target_index)
+        wait_start = time.perf_counter()
+        while in_flight and (len(in_flight) >= controller["max_in_flight"] or
+                             in_flight_bytes + chunk_bytes > max_inflight_bytes):
+            await collect_completed()
+        metric_observe("submit_wait_seconds", time.perf_counter() - wait_start)
+
+        # Annotation and rollup batches are small and not used as feedback
+        stats = None if kind != "data" else {"docs": document_count(piece), "bytes": chunk_bytes,
+                                             "epoch": controller["epoch"]}
+        id_func = {"annotations": annotation_id, "rollups": rollup_id}.get(kind, data_id_func)
+
+        batch_num += 1
+        if tracker is not None:
+            tracker["pending"].add(batch_num)
+        task = asyncio.ensure_future(write_ndjson_batch_async(
+            os_client, piece, target_index, batch_num, id_func=id_func, stats=stats
+        ))
+        in_flight[task] = (chunk_bytes, stats, batch_num, kind)
+        in_flight_bytes += chunk_bytes
+        metric_set("bulk_in_flight_requests", len(in_flight))
+        metric_set("bulk_in_flight_bytes", in_flight_bytes)
+
+    async def queue_rollups(rollups, flush=False):
+        # Buffer rollups per rollup index and send them in bulk alongside the data
+        for target_index, piece in split_rollups(rollups, index_name).items():
+            pending_rollups.setdefault(target_index, []).extend(piece)
+        for target_index in list(pending_rollups):
+            if flush or len(pending_rollups[target_index]) >= ROLLUP_CHUNK_SIZE:
+                await submit_chunk(pending_rollups.pop(target_index), target_index, kind="rollups")
+
+    on_day_end = (lambda day: record_day_end(tracker, day)) if tracker is not None else None
+
+    try:
+        async for chunk, chunk_annotations, chunk_rollups in async_chunks(
+                documents_generator, lambda: controller["chunk_size"], on_day_end):
+            # Days completed before this chunk: send their annotations and rollups, then mark them
+            if tracker is not None and tracker["completed_days"]:
+                if pending_annotations:
+                    await submit_chunk(pending_annotations, annotations_index, kind="annotations")
+                    pending_annotations = []
+                await queue_rollups([], flush=True)
+                mark_completed_days(tracker, batch_num)
+
+            # Buffer annotations and send them in bulk alongside the data
+            pending_annotations.extend(chunk_annotations)
+            if len(pending_annotations) >= ANNOTATION_CHUNK_SIZE:
+                await submit_chunk(pending_annotations, annotations_index, kind="annotations")
+                pending_annotations = []
+            if chunk_rollups:
+                await queue_rollups(chunk_rollups)
+
+            if not chunk:
+                continue
+
+            pieces = split_by_month(chunk, index_name) if monthly_indices else {index_name: chunk}
+            for target_index, piece in pieces.items():
+                await loop.run_in_executor(None, ensure_index, target_index)
+                await submit_chunk(piece, target_index)
+
+        if pending_annotations:
+            await submit_chunk(pending_annotations, annotations_index, kind="annotations")
+        await queue_rollups([], flush=True)
+        if tracker is not None:
+            mark_completed_days(tracker, batch_num)
+
+        # Collect remaining results
+        while in_flight:
+            await collect_completed()
+    finally:
+        await os_client.close()
+
+    return total_docs, total_annotations
+
+
+def write_to_opensearch(documents_generator, index_name="esp_pump_data", annotations_index="annotations",
+                        max_workers=4, chunk_size=DEFAULT_CHUNK_SIZE,
+                        max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, bulk_writer="ndjson", index_template=None,
+                        monthly_indices=False, force_merge=False, install_ism=False, adaptive=True,
+                        target_bulk_bytes=DEFAULT_TARGET_BULK_BYTES, backend="threads", concurrency=16,
+                        pool_size=None, doc_ids=False, checkpoint=None, rollup_intervals=None, dispatch_nodes=True):
+    """
+    Write documents to OpenSearch using parallel processing
+
+    Documents are streamed from the generator in chunks. At most two chunks per
+    worker, and no more than max_inflight_bytes of estimated request data, are
+    queued or in flight at once; the generator is only advanced when there is
+    room, so peak memory does not depend on the amount of data.
+
+    With adaptive, chunk_size is only the starting point: the chunk size and the
+    number of requests in flight follow the cluster's latency, rejections and
+    errors (see update_bulk_controller), aiming at target_bulk_bytes per request.
+
+    Annotations are buffered and written through the same bulk workers with
+    deterministic IDs, and the annotations index is refreshed once at the end.
+
+    The "threads" backend sends requests from max_workers threads sharing one
+    client; the "asyncio" backend runs concurrency bulk coroutines on an
+    AsyncOpenSearch client instead (see write_bulk_async).
+
+    With monthly_indices, documents are written to index_name-YYYY.MM
+    partitions (created on first use) and index_name becomes a read alias over
+    all of them, so date-range queries only touch the relevant months.
+
+    With rollup_intervals, the rollup documents the generator produces are
+    written to <index_name>_rollup_<interval> indices the same way.
+
+    With a checkpoint tracker, the checkpoint file advances as days are fully
+    acknowledged, and documents get deterministic IDs so resuming after a
+    partially written day overwrites instead of duplicating.
+
+    With dispatch_nodes and more than one node configured or sniffed, the
+    threads backend sends every bulk request to the node with the least
+    expected wait (see node_dispatcher). The asyncio backend spreads its
+    requests over the client's connection pool instead.
+
+    Args:
+        documents_generator: Generator yielding batches of documents and annotations
+        index_name: Name of the index to write to
+        annotations_index: Name of the index for annotations
+        max_workers: Number of parallel workers for batch processing
+        chunk_size: Number of documents per bulk request
+        max_inflight_bytes: Maximum estimated bytes of bulk requests queued or in flight
+        bulk_writer: "ndjson" for pre-serialized _bulk bodies or "helpers" for opensearch-py helpers.bulk
+        index_template: Index template body to install before the index is created
+            (defaults to the long-format template)
+        monthly_indices: Write into monthly partitions behind an index_name alias
+        force_merge: Force-merge completed monthly partitions to one segment at the end
+        install_ism: Install the ISM policy stub for the monthly partitions
+        adaptive: Adjust chunk size and requests in flight from cluster feedback
+        target_bulk_bytes: Bulk request size the adaptive controller aims for
+        backend: "threads" or "asyncio"
+        concurrency: Number of concurrent bulk coroutines for the asyncio backend
+        pool_size: Keep-alive connections for the asyncio backend (defaults to concurrency)
+        doc_ids: Send deterministic document IDs (see document_id)
+        checkpoint: Optional state from checkpoint_tracker (implies doc_ids)
+        rollup_intervals: Rollup granularities the generator produces (see rollup_documents)
+        dispatch_nodes: Spread the bulk requests of the threads backend across the cluster's nodes
+
+    Returns:
+        Total count of documents in the index
+    """
+    if backend == "asyncio" and AsyncOpenSearch is None:
+        raise ImportError("The asyncio backend needs aiohttp (pip install 'opensearch-py[async]')")
+
+    # Connect to OpenSearch, with a connection per worker so threads don't wait for the pool
+    os_client = OpenSearch(**OPENSEARCH_CONNECTION, pool_maxsize=max_workers)
+    dispatcher = node_dispatcher(os_client, max_workers) if dispatch_nodes and backend == "threads" else None
+
+    ensure_index, written_indices = prepare_indices(os_client, index_name, annotations_index, index_template,
+                                                    monthly_indices, install_ism, rollup_intervals)
+
+    total_docs = 0
+    total_annotations = 0
+    batch_num = 0
+    doc_ids = doc_ids or checkpoint is not None
+    data_id_func = document_id if doc_ids else None
+
+    # Chunk size and requests in flight; fixed unless adaptive
+    max_in_flight = concurrency if backend == "asyncio" else max_workers * 2
+    controller = bulk_controller(chunk_size, max_in_flight, target_bulk_bytes)
+    if not adaptive:
+        controller["chunk_size"] = chunk_size
+
+    if backend == "asyncio":
+        total_docs, total_annotations = asyncio.run(write_bulk_async(
+            documents_generator, index_name, annotations_index, ensure_index, controller, adaptive=adaptive,
+            max_inflight_bytes=max_inflight_bytes, monthly_indices=monthly_indices,
+            pool_size=pool_size or concurrency, doc_ids=doc_ids, tracker=checkpoint,
+            rollup_intervals=rollup_intervals
+        ))
+    else:
+        # Chunks queued or being written, with their estimated request size and request stats
+        in_flight = {}
+        in_flight_bytes = 0
+        pending_annotations = []
+        pending_rollups = {}
+
+        def collect_completed():
+            nonlocal total_docs, total_annotations, in_flight_bytes
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                success, failed = future.result()
+                chunk_bytes, stats, future_batch_num, kind = in_flight.pop(future)
+                if checkpoint is not None:
+                    acknowledge_batch(checkpoint, future_batch_num, failed == 0)
+                if kind == "annotations":
+                    total_annotations += success
+                elif kind == "data":
+                    total_docs += success
+                    if adaptive:
+                        update_bulk_controller(controller, stats)
+                in_flight_bytes -= chunk_bytes
+                metric_set("bulk_in_flight_requests", len(in_flight))
+                metric_set("bulk_in_flight_bytes", in_flight_bytes)
+
+        def submit_chunk(executor, piece, target_index, kind="data"):
+            nonlocal batch_num, in_flight_bytes
+
+            # Wait for room before taking more data from the generator
+            chunk_bytes = estimate_chunk_bytes(piece, target_index)
+            wait_start = time.perf_counter()
+            while in_flight and (len(in_flight) >= controller["max_in_flight"] or
+                                 in_flight_bytes + chunk_bytes > max_inflight_bytes):
+                collect_completed()
+            metric_observe("submit_wait_seconds", time.perf_counter() - wait_start)
+
+            # Annotation and rollup batches are small and not used as feedback
+            stats = None if kind != "data" else {"docs": document_count(piece), "bytes": chunk_bytes,
+                                                 "epoch": controller["epoch"]}
+            id_func = {"annotations": annotation_id, "rollups": rollup_id}.get(kind, data_id_func)
+
+            batch_num += 1
+            if checkpoint is not None:
+                checkpoint["pending"].add(batch_num)
+            future = executor.submit(
+                BULK_WRITERS[bulk_writer],
+                os_client,
+                piece,
+                target_index,
+                batch_num,
+                id_func=id_func,
+                stats=stats,
+                dispatcher=dispatcher
+            )
+            in_flight[future] = (chunk_bytes, stats, batch_num, kind)
+            in_flight_bytes += chunk_bytes
+            metric_set("bulk_in_flight_requests", len(in_flight))
+            metric_set("bulk_in_flight_bytes", in_flight_bytes)
+
+        def queue_rollups(executor, rollups, flush=False):
+            # Buffer rollups per rollup index and send them in bulk alongside the data
+            for target_index, piece in split_rollups(rollups, index_name).items():
+                pending_rollups.setdefault(target_index, []).extend(piece)
+            for target_index in list(pending_rollups):
+                if flush or len(pending_rollups[target_index]) >= ROLLUP_CHUNK_SIZE:
+                    submit_chunk(executor, pending_rollups.pop(target_index), target_index, kind="rollups")
+
+        on_day_end = (lambda day: record_day_end(checkpoint, day)) if checkpoint is not None else None
+
+        # Stream document chunks from the generator
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk, chunk_annotations, chunk_rollups in chunk_documents(
+                    documents_generator, lambda: controller["chunk_size"], on_day_end):
+                # Days completed before this chunk: send their annotations and rollups, then mark them
+                if checkpoint is not None and checkpoint["completed_days"]:
+                    if pending_annotations:
+                        submit_chunk(executor, pending_annotations, annotations_index, kind="annotations")
+                        pending_annotations = []
+                    queue_rollups(executor, [], flush=True)
+                    mark_completed_days(checkpoint, batch_num)
+
+                # Buffer annotations and send them in bulk alongside the data
+                pending_annotations.extend(chunk_annotations)
+                if len(pending_annotations) >= ANNOTATION_CHUNK_SIZE:
+                    submit_chunk(executor, pending_annotations, annotations_index, kind="annotations")
+                    pending_annotations = []
+                if chunk_rollups:
+                    queue_rollups(executor, chunk_rollups)
+
+                if not chunk:
+                    continue
+
+                pieces = split_by_month(chunk, index_name) if monthly_indices else {index_name: chunk}
+                for target_index, piece in pieces.items():
+                    ensure_index(target_index)
+                    submit_chunk(executor, piece, target_index)
+
+            if pending_annotations:
+                submit_chunk(executor, pending_annotations, annotations_index, kind="annotations")
+            queue_rollups(executor, [], flush=True)
+            if checkpoint is not None:
+                mark_completed_days(checkpoint, batch_num)
+
+            # Collect remaining results
+            while in_flight:
+                collect_completed()
+
+    final_count, annotations_count = finalize_indices(os_client, index_name, annotations_index, written_indices,
+                                                      monthly_indices, force_merge, rollup_intervals)
+
+    print(f"Total annotations created: {total_annotations}")
+    print(f"Final annotations count: {annotations_count}")
+    if dispatcher is not None:
+        report_dispatcher(dispatcher)
+    if checkpoint is not None:
+        report_checkpoint(checkpoint)
+
+    return final_count
+
+
+def open_file_shard(output_dir, file_format, target_index, shard_num, schema=None):
+    """Open the next NDJSON.gz or Parquet shard file for target_index"""
+    extension = "parquet" if file_format == "parquet" else "ndjson.gz"
+    file_name = f"{target_index}-{shard_num:05d}.{extension}"
+    shard = {"file": file_name, "index": target_index, "docs": 0, "kind": "data"}
+    if file_format == "parquet":
+        shard["writer"] = pq.ParquetWriter(os.path.join(output_dir, file_name), schema, compression="zstd")
+    else:
+        shard["writer"] = gzip.open(os.path.join(output_dir, file_name), "wb", compresslevel=6)
+    return shard
+
+
+def parquet_table(documents, schema=None):
+    """Build an Arrow table from documents, storing timestamps as UTC timestamps instead of strings"""
+    table = pa.Table.from_pylist(documents)
+    if "timestamp" in table.column_names:
+        timestamps = pc.strptime(table["timestamp"], format="%Y-%m-%dT%H:%M:%S.000Z", unit="ms")
+        table = table.set_column(table.column_names.index("timestamp"), "timestamp",
+                                 timestamps.cast(pa.timestamp("ms", tz="UTC")))
+    # Later chunks of a shard must match the schema of its first chunk
+    return table.cast(schema) if schema is not None else table
+
+
+def write_to_files(documents_generator, output_dir, index_name="esp_pump_data", annotations_index="annotations",
+                   file_format="ndjson", docs_per_file=DEFAULT_DOCS_PER_FILE, chunk_size=DEFAULT_CHUNK_SIZE,
+                   monthly_indices=False, index_template=None, rollup_intervals=None):
+    """
+    Write documents to local shard files instead of OpenSearch, for replay_files to load later.
+
+    NDJSON shards (.ndjson.gz) hold ready-made _bulk bodies, so replaying them
+    needs no encoding at all. Parquet shards (.parquet, needs pyarrow) store each
+    field as a typed column and are much smaller. Annotations are always written
+    as an NDJSON shard with their deterministic IDs, and so are the rollups (one
+    shard per rollup index). A manifest.json records the shards, their target
+    indices and the index template.
+
+    Args:
+        documents_generator: Generator yielding batches of documents and annotations
+        output_dir: Directory to write the shards to (created if missing)
+        index_name: Name of the index (or read alias with monthly_indices) the data is for
+        annotations_index: Name of the index the annotations are for
+        file_format: "ndjson" or "parquet"
+        docs_per_file: Documents per shard before starting the next file
+        chunk_size: Number of documents encoded at a time
+        monthly_indices: Split the data into index_name-YYYY.MM shards
+        index_template: Index template recorded for the replay (defaults to the long-format template)
+        rollup_intervals: Rollup granularities the generator produces (see rollup_documents)
+
+    Returns:
+        Total number of documents written
+    """
+    if file_format == "parquet" and pa is None:
+        raise ImportError("Parquet shards need pyarrow (pip install pyarrow)")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if index_template is None:
+        index_template = esp_index_template(f"{index_name}-*" if monthly_indices else index_name,
+                                            read_alias=index_name if monthly_indices else None)
+
+    # Open shard and shard count per target index
+    open_shards = {}
+    shard_counts = {}
+    files = []
+    total_docs = 0
+
+    def close_shard(shard):
+        shard.pop("writer").close()
+        files.append(shard)
+        print(f"Wrote {shard['docs']:,} documents to {shard['file']}")
+
+    annotations_file = f"{annotations_index}-00000.ndjson.gz"
+    annotations = {"file": annotations_file, "index": annotations_index, "docs": 0, "kind": "annotations"}
+
+    # One NDJSON shard per rollup index
+    rollup_shards = {}
+    for interval in rollup_intervals or ():
+        target_index = rollup_index_name(index_name, interval)
+        file_name = f"{target_index}-00000.ndjson.gz"
+        rollup_shards[target_index] = {"file": file_name, "index": target_index, "docs": 0, "kind": "rollups",
+                                       "writer": gzip.open(os.path.join(output_dir, file_name), "wb",
+                                                           compresslevel=6)}
+
+    with gzip.open(os.path.join(output_dir, annotations_file), "wb", compresslevel=6) as annotations_out:
+        for chunk, chunk_annotations, chunk_rollups in chunk_documents(documents_generator, chunk_size):
+            if chunk_annotations:
+                annotations_out.write(serialize_bulk_body(chunk_annotations, annotations_index, annotation_id))
+                annotations["docs"] += len(chunk_annotations)
+
+            for target_index, piece in split_rollups(chunk_rollups, index_name).items():
+                rollup_shards[target_index]["writer"].write(serialize_bulk_body(piece, target_index, rollup_id))
+                rollup_shards[target_index]["docs"] += len(piece)
+
+            pieces = split_by_month(chunk, index_name) if monthly_indices else {index_name: chunk}
+            for target_index, piece in pieces.items():
+                if not document_count(piece):
+                    continue
+                shard = open_shards.get(target_index)
+                if file_format == "parquet":
+                    table = parquet_table(batch_documents(piece), shard and shard["writer"].schema)
+                    if shard is None:
+                        shard = open_file_shard(output_dir, file_format, target_index,
+                                                shard_counts.get(target_index, 0), table.schema)
+                    shard["writer"].write_table(table)
+                else:
+                    if shard is None:
+                        shard = open_file_shard(output_dir, file_format, target_index,
+                                                shard_counts.get(target_index, 0))
+                    shard["writer"].write(serialize_bulk_body(piece, target_index))
+                shard["docs"] += document_count(piece)
+                total_docs += document_count(piece)
+
+                if shard["docs"] >= docs_per_file:
+                    close_shard(shard)
+                    open_shards.pop(target_index, None)
+                    shard_counts[target_index] = shard_counts.get(target_index, 0) + 1
+                else:
+                    open_shards[target_index] = shard
+
+    for shard in open_shards.values():
+        close_shard(shard)
+    for shard in rollup_shards.values():
+        close_shard(shard)
+    files.append(annotations)
+
+    manifest = {
+        "index_name": index_name,
+        "annotations_index": annotations_index,
+        "monthly_indices": monthly_indices,
+        "file_format": file_format,
+        "index_template": index_template,
+        "rollup_intervals": list(rollup_intervals or ()),
+        "files": files
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Wrote {total_docs:,} documents and {annotations['docs']} annotations to {len(files)} files in {output_dir}")
+    return total_docs
+
+
+def read_file_shard(path, batch_bytes):
+    """
+    Read a shard written by write_to_files in request-sized batches.
+
+    Args:
+        path: Path of an .ndjson.gz or .parquet shard
+        batch_bytes: Approximate request size of each batch
+
+    Returns:
+        Generator of (batch, preformatted) tuples: encoded action/source line pairs for
+        NDJSON shards, documents for Parquet shards
+    """
+    if path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(path)
+        # Size batches from the encoded size of the first document
+        first = next(parquet_file.iter_batches(batch_size=1), None)
+        if first is None:
+            return
+        doc_bytes = len(encode_json_line(parquet_rows(first)[0])) + 40
+        for record_batch in parquet_file.iter_batches(batch_size=max(1, batch_bytes // doc_bytes)):
+            yield parquet_rows(record_batch), False
+        return
+
+    # Split decompressed blocks into lines in bulk rather than reading line by line
+    rest = b""
+    with gzip.open(path, "rb") as f:
+        while True:
+            block = f.read(batch_bytes)
+            lines = (rest + block).split(b"\n")
+            # Carry a partial line, or an action line without its source, over to the next block
+            complete = len(lines) - 1
+            complete -= complete % 2
+            rest = b"\n".join(lines[complete:])
+            if complete:
+                yield [action + b"\n" + source + b"\n"
+                       for action, source in zip(lines[0:complete:2], lines[1:complete:2])], True
+            if not block:
+                break
+
+
+def parquet_rows(record_batch):
+    """Convert an Arrow record batch back to documents with the generator's timestamp strings"""
+    if "timestamp" in record_batch.schema.names:
+        position = record_batch.schema.get_field_index("timestamp")
+        # %S includes the milliseconds for millisecond timestamps
+        timestamps = pc.strftime(record_batch.column(position), format="%Y-%m-%dT%H:%M:%SZ")
+        record_batch = record_batch.set_column(position, "timestamp", timestamps)
+    return record_batch.to_pylist()
+
+
+def replay_shard(os_client, input_dir, shard, batch_bytes, dispatcher=None):
+    """Send one shard file to OpenSearch, returning (indexed documents, failed documents)"""
+    success = 0
+    failed = 0
+    for batch_num, (batch, preformatted) in enumerate(read_file_shard(os.path.join(input_dir, shard["file"]),
+                                                                       batch_bytes), 1):
+        indexed, not_indexed = write_ndjson_batch_to_opensearch(os_client, batch, shard["index"],
+                                                                 f"{shard['file']}#{batch_num}",
+                                                                 preformatted=preformatted, dispatcher=dispatcher)
+        success += indexed
+        failed += not_indexed
+    return success, failed
+
+
+def replay_files(input_dir, max_workers=4, batch_bytes=DEFAULT_TARGET_BULK_BYTES, force_merge=False,
+                 install_ism=False, dispatch_nodes=True):
+    """
+    Load shard files written by write_to_files into OpenSearch.
+
+    Shards are streamed from disk and sent by max_workers threads in parallel,
+    one shard per thread, without running the simulation again. The indices are
+    prepared from the template stored in the manifest.
+
+    Args:
+        input_dir: Directory written by write_to_files
+        max_workers: Number of shards loaded in parallel
+        batch_bytes: Approximate size of each bulk request
+        force_merge: Force-merge completed monthly partitions to one segment at the end
+        install_ism: Install the ISM policy stub for the monthly partitions
+        dispatch_nodes: Spread the bulk requests across the cluster's nodes (see node_dispatcher)
+
+    Returns:
+        Total count of documents in the index
     """
-    Generate ESP pump sensor data documents with readings every minute for date range.
-    Simulates continuously running pumps with occasional operational issues.
+    with open(os.path.join(input_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest["file_format"] == "parquet" and pa is None:
+        raise ImportError("Parquet shards need pyarrow (pip install pyarrow)")
+
+    index_name = manifest["index_name"]
+    annotations_index = manifest["annotations_index"]
+    monthly_indices = manifest["monthly_indices"]
+    rollup_intervals = manifest.get("rollup_intervals", [])
+
+    os_client = OpenSearch(**OPENSEARCH_CONNECTION, pool_maxsize=max_workers)
+    dispatcher = node_dispatcher(os_client, max_workers) if dispatch_nodes else None
+    ensure_index, written_indices = prepare_indices(os_client, index_name, annotations_index,
+                                                    manifest["index_template"], monthly_indices, install_ism,
+                                                    rollup_intervals)
+    for shard in manifest["files"]:
+        if shard["kind"] == "data":
+            ensure_index(shard["index"])
+
+    total_docs = 0
+    total_annotations = 0
+    # Largest shards first so one big file doesn't finish alone at the end
+    shards = sorted(manifest["files"], key=lambda shard: shard["docs"], reverse=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(replay_shard, os_client, input_dir, shard, batch_bytes, dispatcher): shard
+                   for shard in shards}
+        for future in futures:
+            success, failed = future.result()
+            if futures[future]["kind"] == "annotations":
+                total_annotations += success
+            elif futures[future]["kind"] == "data":
+                total_docs += success
+
+    print(f"Replayed {total_docs:,} documents from {len(shards)} files")
+    final_count, annotations_count = finalize_indices(os_client, index_name, annotations_index, written_indices,
+                                                      monthly_indices, force_merge, rollup_intervals)
+
+    print(f"Total annotations created: {total_annotations}")
+    print(f"Final annotations count: {annotations_count}")
+    if dispatcher is not None:
+        report_dispatcher(dispatcher)
+
+    return final_count
+
+
+def composite_buckets(os_client, index_name, query, sources, aggs=None, page_size=COMPOSITE_PAGE_SIZE):
+    """
+    Page through a composite aggregation, yielding its buckets in key order.
 
     Args:
-        start_date: Starting timestamp
-        end_date: Ending timestamp
-        assets: List of assets to generate data for (defaults to all if None)
-        specific_sensors: List of specific sensors to generate data for (defaults to all if None)
+        os_client: OpenSearch client
+        index_name: Index, alias or pattern to search
+        query: Query selecting the documents
+        sources: Composite sources, in sort order
+        aggs: Optional sub-aggregations computed per bucket
+        page_size: Buckets per search request
 
     Returns:
-        Generator that yields dictionaries with ESP pump data in batches and annotations
+        Generator of composite buckets
     """
-    # Define possible assets, sensors, and units
-    all_assets = [
-        "ESP_PUMP_01", "ESP_PUMP_02", "ESP_PUMP_03",
-        "ESP_PUMP_04", "ESP_PUMP_05"
-    ]
-
-    all_sensors = {
-        # Existing sensors
-        "intake_pressure": {"min": 100, "max": 500, "unit": "psi", "is_float": False},
-        "discharge_pressure": {"min": 1000, "max": 3000, "unit": "psi", "is_float": False},
-        "motor_temperature": {"min": 70, "max": 250, "unit": "°F", "is_float": False},
-        "vibration": {"min": 0.1, "max": 5.0, "unit": "mm/s", "is_float": True},
-        "motor_current": {"min": 10, "max": 50, "unit": "A", "is_float": False},
-        "motor_voltage": {"min": 380, "max": 480, "unit": "V", "is_float": False},
-        "flow_rate": {"min": 100, "max": 2000, "unit": "bbl/d", "is_float": False},
-        "motor_frequency": {"min": 40, "max": 60, "unit": "Hz", "is_float": True},
-        "motor_power": {"min": 5, "max": 100, "unit": "kW", "is_float": False},
-
-        # New sensors
-        "pump_efficiency": {"min": 40, "max": 85, "unit": "%", "is_float": True},
-        "wellhead_pressure": {"min": 50, "max": 400, "unit": "psi", "is_float": False},
-        "motor_oil_temperature": {"min": 60, "max": 200, "unit": "°F", "is_float": False},
-        "pump_stage_differential_pressure": {"min": 50, "max": 300, "unit": "psi", "is_float": False},
-        "casing_pressure": {"min": 20, "max": 300, "unit": "psi", "is_float": False},
-        "tubing_pressure": {"min": 50, "max": 500, "unit": "psi", "is_float": False},
-        "gas_oil_ratio": {"min": 200, "max": 2000, "unit": "scf/bbl", "is_float": False},
-        "water_cut": {"min": 0, "max": 100, "unit": "%", "is_float": True},
-        "sand_rate": {"min": 0, "max": 50, "unit": "ppm", "is_float": True},
-        "motor_vibration_axial": {"min": 0.05, "max": 4.0, "unit": "mm/s", "is_float": True},
-        "motor_vibration_radial": {"min": 0.05, "max": 4.0, "unit": "mm/s", "is_float": True},
-        "motor_leakage_current": {"min": 0, "max": 10, "unit": "mA", "is_float": True},
-        "motor_winding_resistance": {"min": 0.1, "max": 2.0, "unit": "Ω", "is_float": True},
-        "motor_insulation_resistance": {"min": 1, "max": 100, "unit": "MΩ", "is_float": True},
-        "variable_frequency_drive_temperature": {"min": 70, "max": 180, "unit": "°F", "is_float": False}
-    }
+    after_key = None
+    while True:
+        composite = {"size": page_size, "sources": sources}
+        if after_key is not None:
+            composite["after"] = after_key
+        body = {"size": 0, "query": query, "aggs": {"pages": {"composite": composite}}}
+        if aggs:
+            body["aggs"]["pages"]["aggs"] = aggs
+        result = os_client.search(index=index_name, body=body)["aggregations"]["pages"]
+        yield from result["buckets"]
+        after_key = result.get("after_key")
+        if not result["buckets"] or after_key is None:
+            return
 
-    # Define ESP pump operational issues with additional types
-    pump_issues = {
-        "gas_locking": {
-            "probability": 0.000005,
-            "duration": (30, 120),
-            "description": "Gas locking detected - pump efficiency severely reduced",
-            "effects": {
-                "intake_pressure": {"factor": -0.5},
-                "discharge_pressure": {"factor": -0.4},
-                "flow_rate": {"factor": -0.7},
-                "motor_current": {"factor": -0.3},
-                "motor_power": {"factor": -0.4},
-                "vibration": {"factor": 0.5},
-                "motor_temperature": {"factor": -0.1},
-                "pump_efficiency": {"factor": -0.6},  # Major efficiency drop
-                "pump_stage_differential_pressure": {"factor": -0.5},
-                "gas_oil_ratio": {"factor": 0.7},  # Increased GOR
-                "motor_vibration_axial": {"factor": 0.4},
-                "motor_vibration_radial": {"factor": 0.5}
-            }
-        },
-        "gas_interference": {
-            "probability": 0.00001,
-            "duration": (15, 60),
-            "description": "Gas interference detected - flow rate fluctuations observed",
-            "effects": {
-                "flow_rate": {"factor": -0.4},
-                "intake_pressure": {"factor": -0.3},
-                "discharge_pressure": {"factor": -0.2},
-                "vibration": {"factor": 0.3},
-                "motor_current": {"factor": -0.2},
-                "motor_power": {"factor": -0.25},
-                "motor_frequency": {"factor": 0.1},
-                "pump_efficiency": {"factor": -0.3},
-                "gas_oil_ratio": {"factor": 0.5},
-                "pump_stage_differential_pressure": {"factor": -0.25},
-                "motor_vibration_axial": {"factor": 0.2},
-                "motor_vibration_radial": {"factor": 0.3}
-            }
-        },
-        "sanding": {
-            "probability": 0.000002,
-            "duration": (60, 240),
-            "description": "Sand production detected - increased wear and vibration",
-            "effects": {
-                "flow_rate": {"factor": -0.5},
-                "intake_pressure": {"factor": -0.2},
-                "discharge_pressure": {"factor": -0.3},
-                "vibration": {"factor": 0.8},
-                "motor_current": {"factor": 0.3},
-                "motor_power": {"factor": 0.35},
-                "motor_temperature": {"factor": 0.2},
-                "motor_frequency": {"factor": -0.05},
-                "pump_efficiency": {"factor": -0.4},
-                "sand_rate": {"factor": 0.9},  # Major increase in sand
-                "motor_vibration_axial": {"factor": 0.7},
-                "motor_vibration_radial": {"factor": 0.8},
-                "pump_stage_differential_pressure": {"factor": -0.3}
-            }
-        },
-        "shutdown": {
-            "probability": 0.0000005,
-            "duration": (120, 480),
-            "description": "Pump shutdown - maintenance required",
-            "effects": {
-                "flow_rate": {"factor": -1.0},
-                "motor_current": {"factor": -1.0},
-                "motor_power": {"factor": -1.0},
-                "motor_frequency": {"factor": -1.0},
-                "vibration": {"factor": -0.9},
-                "motor_temperature": {"factor": -0.5},
-                "intake_pressure": {"factor": -0.3},
-                "discharge_pressure": {"factor": -0.8},
-                "pump_efficiency": {"factor": -1.0},
-                "wellhead_pressure": {"factor": -0.4},
-                "motor_vibration_axial": {"factor": -0.9},
-                "motor_vibration_radial": {"factor": -0.9},
-                "variable_frequency_drive_temperature": {"factor": -0.3}
-            }
-        },
-        "motor_overheating": {
-            "probability": 0.000003,
-            "duration": (45, 180),
-            "description": "Motor overheating detected - cooling system issue or excessive load",
-            "effects": {
-                "motor_temperature": {"factor": 0.7},
-                "motor_current": {"factor": 0.2},
-                "motor_power": {"factor": 0.25},
-                "vibration": {"factor": 0.3},
-                "flow_rate": {"factor": -0.2},
-                "motor_frequency": {"factor": -0.1},
-                "motor_oil_temperature": {"factor": 0.8},  # Significant oil temp increase
-                "variable_frequency_drive_temperature": {"factor": 0.5},
-                "motor_winding_resistance": {"factor": 0.3},
-                "motor_insulation_resistance": {"factor": -0.4},  # Decreased insulation resistance
-                "motor_leakage_current": {"factor": 0.6}  # Increased leakage current
-            }
-        },
-        "pump_cavitation": {
-            "probability": 0.0000025,
-            "duration": (20, 90),
-            "description": "Pump cavitation - insufficient suction pressure causing vapor bubbles",
-            "effects": {
-                "intake_pressure": {"factor": -0.6},
-                "discharge_pressure": {"factor": -0.3},
-                "vibration": {"factor": 0.9},
-                "flow_rate": {"factor": -0.4},
-                "motor_current": {"factor": 0.1},
-                "motor_power": {"factor": 0.15},
-                "pump_efficiency": {"factor": -0.5},
-                "pump_stage_differential_pressure": {"factor": -0.4},
-                "motor_vibration_axial": {"factor": 0.8},
-                "motor_vibration_radial": {"factor": 0.9},
-                "wellhead_pressure": {"factor": -0.2}
-            }
-        },
-        "scale_buildup": {
-            "probability": 0.0000015,
-            "duration": (240, 720),
-            "description": "Scale buildup detected - gradual performance degradation",
-            "effects": {
-                "flow_rate": {"factor": -0.35},
-                "discharge_pressure": {"factor": -0.25},
-                "motor_power": {"factor": 0.3},
-                "motor_current": {"factor": 0.25},
-                "motor_temperature": {"factor": 0.2},
-                "vibration": {"factor": 0.15},
-                "pump_efficiency": {"factor": -0.4},
-                "pump_stage_differential_pressure": {"factor": -0.3},
-                "tubing_pressure": {"factor": -0.2},
-                "wellhead_pressure": {"factor": -0.15},
-                "water_cut": {"factor": 0.2}  # Often associated with water production
-            }
-        },
-        "electrical_fault": {
-            "probability": 0.0000008,
-            "duration": (10, 60),
-            "description": "Electrical fault detected - power supply or motor winding issue",
-            "effects": {
-                "motor_voltage": {"factor": -0.4},
-                "motor_current": {"factor": 0.5},
-                "motor_frequency": {"factor": -0.3},
-                "motor_power": {"factor": 0.4},
-                "vibration": {"factor": 0.6},
-                "motor_temperature": {"factor": 0.5},
-                "motor_leakage_current": {"factor": 0.9},  # Major increase
-                "motor_winding_resistance": {"factor": 0.5},
-                "motor_insulation_resistance": {"factor": -0.7},  # Major decrease
-                "variable_frequency_drive_temperature": {"factor": 0.6}
-            }
-        },
-        "bearing_wear": {
-            "probability": 0.0000012,
-            "duration": (180, 600),
-            "description": "Bearing wear detected - increased friction and vibration",
-            "effects": {
-                "vibration": {"factor": 0.7},
-                "motor_temperature": {"factor": 0.4},
-                "motor_current": {"factor": 0.2},
-                "motor_power": {"factor": 0.3},
-                "flow_rate": {"factor": -0.15},
-                "motor_frequency": {"factor": -0.05},
-                "motor_vibration_axial": {"factor": 0.8},
-                "motor_vibration_radial": {"factor": 0.9},
-                "motor_oil_temperature": {"factor": 0.5},
-                "pump_efficiency": {"factor": -0.2}
-            }
-        },
-        "pump_wear": {
-            "probability": 0.0000018,
-            "duration": (240, 720),
-            "description": "Pump wear detected - impeller or diffuser erosion",
-            "effects": {
-                "flow_rate": {"factor": -0.45},
-                "discharge_pressure": {"factor": -0.4},
-                "motor_power": {"factor": 0.15},
-                "vibration": {"factor": 0.4},
-                "intake_pressure": {"factor": -0.1},
-                "pump_efficiency": {"factor": -0.5},
-                "pump_stage_differential_pressure": {"factor": -0.4},
-                "motor_vibration_axial": {"factor": 0.3},
-                "motor_vibration_radial": {"factor": 0.4}
-            }
-        },
-        "water_breakthrough": {
-            "probability": 0.0000014,
-            "duration": (360, 1440),  # Can be long-lasting
-            "description": "Water breakthrough detected - increased water production",
-            "effects": {
-                "water_cut": {"factor": 0.8},  # Major increase in water cut
-                "flow_rate": {"factor": -0.2},
-                "pump_efficiency": {"factor": -0.25},
-                "motor_power": {"factor": 0.1},
-                "motor_current": {"factor": 0.1},
-                "gas_oil_ratio": {"factor": -0.3}  # Usually decreases with water
-            }
-        },
-        "vfd_fault": {
-            "probability": 0.0000007,
-            "duration": (15, 120),
-            "description": "Variable frequency drive fault - electrical or cooling issue",
-            "effects": {
-                "motor_frequency": {"factor": -0.4},
-                "motor_voltage": {"factor": -0.3},
-                "motor_current": {"factor": 0.3},
-                "variable_frequency_drive_temperature": {"factor": 0.8},
-                "motor_power": {"factor": -0.3},
-                "flow_rate": {"factor": -0.3}
-            }
-        }
-    }
 
-    # Increase issue probabilities for more visible events
-    for issue in pump_issues:
-        pump_issues[issue]["probability"] *= 5  # Make issues 5x more common for better visibility
+def asset_bucket_series(os_client, index_name, asset_name, time_range, interval_minutes=5,
+                        page_size=COMPOSITE_PAGE_SIZE):
+    """
+    Average reading per sensor and time bucket for one asset, in time order.
 
-    # Use specified assets or all assets
-    assets_to_use = assets if assets else all_assets
+    Args:
+        os_client: OpenSearch client
+        index_name: Long-format data index (or read alias)
+        asset_name: Asset to read
+        time_range: Range on timestamp (gte/lt)
+        interval_minutes: Minutes per time bucket
+        page_size: Composite buckets per search request
 
-    # Use specified sensors or all sensors
-    sensors_to_use = {k: v for k, v in all_sensors.items()
-                      if not specific_sensors or k in specific_sensors}
+    Returns:
+        Generator of (bucket start, {sensor name: average value}) tuples
+    """
+    query = {"bool": {"filter": [{"term": {"asset_name": asset_name}}, {"range": {"timestamp": time_range}}]}}
+    sources = [{"timestamp": {"date_histogram": {"field": "timestamp", "fixed_interval": f"{interval_minutes}m"}}},
+               {"sensor_name": {"terms": {"field": "sensor_name"}}}]
+    epoch = datetime(1970, 1, 1)
 
-    # Process data in daily chunks to manage memory
-    current_date = start_date
-    day_count = 0
+    bucket_time, values = None, {}
+    for bucket in composite_buckets(os_client, index_name, query, sources,
+                                    {"value": {"avg": {"field": "sensor_value"}}}, page_size):
+        # The sensors of a time bucket are consecutive, but may span two pages
+        key_time = epoch + timedelta(milliseconds=bucket["key"]["timestamp"])
+        if key_time != bucket_time:
+            if values:
+                yield bucket_time, values
+            bucket_time, values = key_time, {}
+        if bucket["value"]["value"] is not None:
+            values[bucket["key"]["sensor_name"]] = bucket["value"]["value"]
+    if values:
+        yield bucket_time, values
 
-    # Keep track of last values for each asset-sensor pair
-    last_values = {}
 
-    # Track active issues for each asset
-    active_issues = {asset: {
-        "issue": None,
-        "end_time": None,
-        "severity": 0,
-        "start_time": None,
-        "affected_sensors": {},
-        "annotation_created": False
-    } for asset in assets_to_use}
+def detected_issue_annotation(asset_name, segment, end_time, sensors_to_use, issues):
+    """
+    Annotation for a closed change-detection segment, or None if no sensor changed enough to report.
 
-    # Track normal values to restore after issues resolve
-    normal_values = {asset: {} for asset in assets_to_use}
+    The segment is attributed to the issue whose expected effects it matched best
+    over its buckets; the annotation is built by build_issue_annotation from the
+    first bucket ANNOTATION_DELAY after the (5-minute rounded) start, exactly as
+    the generators do from their simulated values. sensors_to_use and issues are
+    the sensor configurations and issue model of the asset's group.
+    """
+    issue_name = max(segment["totals"], key=segment["totals"].get)
+    start_time = segment["start"] - timedelta(minutes=segment["start"].minute % 5)
+    issue_state = {
+        "issue": issue_name,
+        "config": issues[issue_name],
+        "start_time": start_time,
+        "end_time": end_time,
+        # The share of the expected effect reached stands in for the simulated severity
+        "severity": min(1.0, segment["peaks"][issue_name]),
+        "affected_sensors": {
+            sensor_name: {
+                "initial": segment["baseline"][sensor_name],
+                "current": segment["baseline"][sensor_name],
+                "unit": sensors_to_use[sensor_name]["unit"],
+                "effect": effect["factor"]
+            }
+            for sensor_name, effect in issues[issue_name]["effects"].items()
+            if sensor_name in sensors_to_use and sensor_name in segment["baseline"]
+        }
+    }
 
-    # List to store annotations
-    annotations = []
+    for bucket_time, values in segment["buckets"]:
+        for sensor_name, data in issue_state["affected_sensors"].items():
+            data["current"] = values.get(sensor_name, data["current"])
+        if bucket_time >= start_time + ANNOTATION_DELAY:
+            annotation = build_issue_annotation(asset_name, issue_state, sensors_to_use, bucket_time)
+            if annotation:
+                return annotation
+    return None
 
-    # Calculate total days for progress reporting
-    total_days = (end_date - start_date).days + 1
 
-    # Process one day at a time
-    while current_date <= end_date:
-        day_count += 1
-        print(f"Generating day {day_count}/{total_days}: {current_date.strftime('%Y-%m-%d')}")
+def detect_annotations(asset_name, series, sensors_to_use, issues):
+    """
+    Re-derive issue annotations from an asset's bucketed readings in one streaming pass.
 
-        batch = []
-        day_end = datetime(current_date.year, current_date.month, current_date.day, 23, 59, 0)
+    Every bucket is scored against each issue's expected effects relative to the
+    sensors' baselines (see ANNOTATION_DETECTION); segments of high scores become
+    annotations. Only the buckets of the open segment are kept in memory.
 
-        for asset_name in assets_to_use:
-            # Initialize normal values for this asset if not already done
-            if not normal_values[asset_name]:
-                for sensor_name in sensors_to_use:
-                    sensor_config = sensors_to_use[sensor_name]
-                    if sensor_config["is_float"]:
-                        normal_values[asset_name][sensor_name] = round(random.uniform(
-                            sensor_config["min"] + (sensor_config["max"] - sensor_config["min"]) * 0.3,
-                            sensor_config["max"] - (sensor_config["max"] - sensor_config["min"]) * 0.3), 2)
-                    else:
-                        normal_values[asset_name][sensor_name] = random.randint(
-                            int(sensor_config["min"] + (sensor_config["max"] - sensor_config["min"]) * 0.3),
-                            int(sensor_config["max"] - (sensor_config["max"] - sensor_config["min"]) * 0.3))
+    Args:
+        asset_name: Asset the series belongs to
+        series: (bucket start, {sensor name: value}) tuples in time order, e.g. from asset_bucket_series
+        sensors_to_use: Sensor configurations of the asset's group
+        issues: Issue model of the asset's group (issue name -> configuration)
 
-            # Process all sensors for this asset at each timestamp
-            current_time = datetime(current_date.year, current_date.month, current_date.day, 0, 0, 0)
-
-            # Generate minute-by-minute readings for the day
-            while current_time <= day_end:
-                # Create timestamp with format: 2024-10-08T08:08:00.000Z
-                timestamp = current_time.strftime("%Y-%m-%dT%H:%M:%S") + ".000Z"
-
-                # Check if an active issue has ended
-                if active_issues[asset_name]["end_time"] and current_time >= active_issues[asset_name]["end_time"]:
-                    active_issues[asset_name] = {
-                        "issue": None,
-                        "end_time": None,
-                        "severity": 0,
-                        "start_time": None,
-                        "affected_sensors": {},
-                        "annotation_created": False
-                    }
-                    # Don't immediately reset values - they'll gradually return to normal
-
-                # Check for new issues if no active issue
-                if active_issues[asset_name]["issue"] is None:
-                    for issue_name, issue_config in pump_issues.items():
-                        if random.random() < issue_config["probability"]:
-                            # Start a new issue
-                            duration_minutes = random.randint(issue_config["duration"][0],
-                                                              issue_config["duration"][1])
+    Returns:
+        Generator of annotations in the schema build_issue_annotation produces
+    """
+    settings = ANNOTATION_DETECTION
+    signatures = [(issue_name, [(sensor_name, effect["factor"]) for sensor_name, effect in config["effects"].items()
+                                if sensor_name in sensors_to_use])
+                  for issue_name, config in issues.items()]
+    max_segment = timedelta(minutes=max(config["duration"][1] for config in issues.values())
+                            * settings["max_segment_ratio"])
+    baseline = {}
+    segment = None
+    recovering = False  # A segment just closed; wait for the sensors to return near their baselines
+    rising = []  # Latest buckets while no segment is open, all but the first above rise_score: (time, values, scores)
+    last_time = None
 
-                            # Round to nearest 5 minutes for better visibility in charts
-                            rounded_minutes = (current_time.minute // 5) * 5
-                            issue_start_time = current_time.replace(minute=rounded_minutes, second=0, microsecond=0)
-                            issue_end_time = issue_start_time + timedelta(minutes=duration_minutes)
+    for bucket_time, values in series:
+        # Share of each issue's effects the readings show: a sensor counts fully at its factor and not at all
+        # without change, overshooting by the factor or moving the other way
+        scores = {}
+        for issue_name, effects in signatures:
+            matched, expected, sensors = 0.0, 0.0, 0
+            for sensor_name, factor in effects:
+                if sensor_name in values and baseline.get(sensor_name, 0) > 0:
+                    change = values[sensor_name] / baseline[sensor_name] - 1
+                    matched += max(0.0, abs(factor) - abs(change - factor))
+                    expected += abs(factor)
+                    sensors += 1
+            if sensors >= settings["min_sensors"]:
+                scores[issue_name] = matched / expected
+        best_score = max(scores.values(), default=0.0)
+        last_time = bucket_time
 
-                            # Use higher severity for more dramatic effects
-                            severity = random.uniform(0.9, 1.0)  # 90-100% severity
+        if segment is not None and bucket_time - segment["start"] > max_segment:
+            # Too long for an issue: normal operation moved, so start over from the current readings
+            segment = None
+            recovering = False
+            baseline = dict(values)
+            continue
+        if segment is not None:
+            if best_score >= max(settings["onset_score"], segment["peak"] * settings["end_ratio"]):
+                segment["buckets"].append((bucket_time, values))
+                for issue_name, score in scores.items():
+                    segment["totals"][issue_name] = segment["totals"].get(issue_name, 0.0) + score
+                    segment["peaks"][issue_name] = max(segment["peaks"].get(issue_name, 0.0), score)
+                segment["peak"] = max(segment["peak"], best_score)
+                continue
+            if segment["peak"] >= settings["confirm_score"]:
+                annotation = detected_issue_annotation(asset_name, segment, bucket_time, sensors_to_use, issues)
+                if annotation:
+                    yield annotation
+                recovering = True
+            segment = None
 
-                            active_issues[asset_name] = {
-                                "issue": issue_name,
-                                "start_time": issue_start_time,
-                                "end_time": issue_end_time,
-                                "severity": severity,
-                                "affected_sensors": {},
-                                "annotation_created": False
-                            }
-                            break
+        if recovering and best_score < settings["onset_score"]:
+            recovering = False
+        if not recovering and best_score >= settings["onset_score"]:
+            rising = [entry for entry in rising
+                      if bucket_time - entry[0] <= timedelta(minutes=settings["rise_minutes"])]
+            rising.append((bucket_time, values, scores))
+            segment = {"start": rising[0][0], "baseline": dict(baseline),
+                       "buckets": [(entry_time, entry_values) for entry_time, entry_values, _ in rising],
+                       "totals": {}, "peaks": {}, "peak": best_score}
+            for _, _, entry_scores in rising:
+                for issue_name, score in entry_scores.items():
+                    segment["totals"][issue_name] = segment["totals"].get(issue_name, 0.0) + score
+                    segment["peaks"][issue_name] = max(segment["peaks"].get(issue_name, 0.0), score)
+            rising = []
+            continue
+        if best_score >= settings["rise_score"] and not recovering:
+            rising.append((bucket_time, values, scores))
+        else:
+            rising = [(bucket_time, values, scores)]
 
-                # Generate sensor readings for this timestamp
-                for sensor_name, sensor_config in sensors_to_use.items():
-                    asset_sensor_key = f"{asset_name}_{sensor_name}"
+        # Follow the slow drift of normal operation
+        for sensor_name, value in values.items():
+            previous = baseline.get(sensor_name)
+            baseline[sensor_name] = value if previous is None else \
+                previous + (value - previous) * settings["baseline_alpha"]
 
-                    # Initialize with normal value if this is the first reading
-                    if asset_sensor_key not in last_values:
-                        last_values[asset_sensor_key] = normal_values[asset_name][sensor_name]
+    # An issue still open at the end of the range ends with it
+    if segment is not None and segment["peak"] >= settings["confirm_score"]:
+        annotation = detected_issue_annotation(asset_name, segment, last_time, sensors_to_use, issues)
+        if annotation:
+            yield annotation
 
-                    # Get current value
-                    current_value = last_values[asset_sensor_key]
 
-                    # Base drift - small random changes for continuous operation
-                    drift_factor = 0.005  # 0.5% maximum change per reading for continuous operation
+def backfill_annotations(start_date, end_date, index_name="esp_pump_data", annotations_index="annotations",
+                         max_workers=4, interval_minutes=5, replace=False, page_size=COMPOSITE_PAGE_SIZE,
+                         catalog=None):
+    """
+    Re-derive the annotations of already indexed data without generating or reindexing it.
 
-                    # Calculate sensor value based on normal operation or active issue
-                    if active_issues[asset_name]["issue"]:
-                        issue_name = active_issues[asset_name]["issue"]
-                        issue_config = pump_issues[issue_name]
-                        severity = active_issues[asset_name]["severity"]
-
-                        # Calculate time progression through the issue (0.0 to 1.0)
-                        issue_start = active_issues[asset_name]["start_time"]
-                        issue_end = active_issues[asset_name]["end_time"]
-                        issue_duration = (issue_end - issue_start).total_seconds()
-                        time_elapsed = (current_time - issue_start).total_seconds()
-                        progression = min(1.0, time_elapsed / issue_duration)
+    Each asset's readings are paged out of the data index with composite
+    aggregations (time bucket x sensor averages), run through detect_annotations
+    and bulk-written to the annotations index with deterministic IDs, one asset
+    per worker thread. Each asset is matched against the sensors and issue model
+    of its catalog group; indexed assets the catalog does not have are skipped.
 
-                        # Apply issue effects if this sensor is affected
-                        if sensor_name in issue_config["effects"]:
-                            effect = issue_config["effects"][sensor_name]["factor"]
-
-                            # Store initial value if not already stored
-                            if sensor_name not in active_issues[asset_name]["affected_sensors"]:
-                                active_issues[asset_name]["affected_sensors"][sensor_name] = {
-                                    "initial": current_value,
-                                    "current": current_value,
-                                    "unit": sensor_config["unit"],
-                                    "effect": effect
-                                }
-
-                            # Make the effect more pronounced based on progression
-                            # Start with small changes and gradually increase to full effect
-                            applied_effect = effect * severity * min(1.0, progression * 2)  # Faster ramp-up
+    Args:
+        start_date: First day to derive annotations for
+        end_date: Last day to derive annotations for
+        index_name: Long-format data index (or read alias) to read
+        annotations_index: Index to write the annotations to
+        max_workers: Assets processed in parallel
+        interval_minutes: Minutes per time bucket (the 5 minute annotation delay needs 1 or 5)
+        replace: Delete the system-created annotations starting in the date range first
+        page_size: Composite buckets per search request
+        catalog: Fleet catalog the data was generated from (defaults to the built-in sensors and issues)
 
-                            # Calculate target value during issue - use direct percentage changes
-                            normal_value = normal_values[asset_name][sensor_name]
+    Returns:
+        Number of annotations written
+    """
+    os_client = OpenSearch(**OPENSEARCH_CONNECTION, pool_maxsize=max_workers)
+    ensure_annotations_index(os_client, annotations_index)
+    time_range = {"gte": start_date.strftime("%Y-%m-%dT00:00:00.000Z"),
+                  "lt": (end_date + timedelta(days=1)).strftime("%Y-%m-%dT00:00:00.000Z")}
 
-                            if effect < 0:  # Reduction effect
-                                if effect == -1.0:  # Complete shutdown
-                                    target_value = 0 if sensor_name != "motor_temperature" else sensor_config["min"]
-                                else:
-                                    # Calculate target as percentage reduction from normal
-                                    reduction = abs(applied_effect)
-                                    target_value = normal_value * (1 - reduction)
-                                    # Ensure it's not below minimum
-                                    target_value = max(target_value, sensor_config["min"])
-                            else:  # Increase effect
-                                # Calculate target as percentage increase from normal
-                                increase = applied_effect
-                                target_value = normal_value * (1 + increase)
-                                # Ensure it's not above maximum
-                                target_value = min(target_value, sensor_config["max"])
-
-                            # Adjust how quickly we move toward the target value based on the issue type
-                            if issue_name in ["shutdown", "electrical_fault", "vfd_fault"]:
-                                adjustment_rate = 0.3  # Fast changes (30% per reading)
-                            elif issue_name in ["gas_locking", "gas_interference", "pump_cavitation"]:
-                                adjustment_rate = 0.2  # Medium changes (20% per reading)
-                            else:
-                                adjustment_rate = 0.1  # Slower changes (10% per reading)
-
-                            # Apply the adjustment
-                            sensor_value = current_value + (target_value - current_value) * adjustment_rate
+    if replace:
+        # Annotations from build_issue_annotation; ones added by people are kept
+        response = os_client.delete_by_query(index=annotations_index, body={"query": {"bool": {"filter": [
+            {"term": {"createdBy.email.keyword": "system@labelexpress.com"}},
+            {"range": {"startDate": time_range}}
+        ]}}}, refresh=True, conflicts="proceed")
+        print(f"Deleted {response.get('deleted', 0):,} existing annotations")
 
-                            # Add appropriate fluctuation based on issue type
-                            if issue_name in ["vibration", "gas_interference", "pump_cavitation"]:
-                                fluctuation = sensor_value * random.uniform(-0.03, 0.03)  # More erratic
-                            else:
-                                fluctuation = sensor_value * random.uniform(-0.01, 0.01)  # More stable
+    assets = [bucket["key"]["asset_name"] for bucket in
+              composite_buckets(os_client, index_name, {"range": {"timestamp": time_range}},
+                                [{"asset_name": {"terms": {"field": "asset_name"}}}], page_size=page_size)]
+    if catalog is not None:
+        known = {asset for group in catalog["groups"] for asset in group["assets"]}
+        skipped = [asset for asset in assets if asset not in known]
+        if skipped:
+            print(f"Skipping {len(skipped):,} assets not in the catalog ({', '.join(skipped[:5])})")
+        assets = [asset for asset in assets if asset in known]
+    asset_groups = {asset: group for group in catalog_groups(catalog, assets) for asset in group["assets"]}
+    print(f"Deriving annotations for {len(assets):,} assets from '{index_name}' "
+          f"({interval_minutes}-minute buckets)")
 
-                            sensor_value += fluctuation
+    def backfill_asset(asset_name):
+        series = asset_bucket_series(os_client, index_name, asset_name, time_range, interval_minutes, page_size)
+        group = asset_groups[asset_name]
+        annotations = list(detect_annotations(asset_name, series, group["sensors"], group["issues"]))
+        written = 0
+        for position in range(0, len(annotations), ANNOTATION_CHUNK_SIZE):
+            success, failed = write_ndjson_batch_to_opensearch(
+                os_client, annotations[position:position + ANNOTATION_CHUNK_SIZE], annotations_index,
+                f"{asset_name}/{position // ANNOTATION_CHUNK_SIZE + 1}", id_func=annotation_id)
+            written += success
+        return written
 
-                            # Update the current value in affected_sensors
-                            active_issues[asset_name]["affected_sensors"][sensor_name]["current"] = sensor_value
-                        else:
-                            # Sensors not directly affected still have normal drift
-                            base_change = current_value * random.uniform(-drift_factor, drift_factor)
-                            sensor_value = current_value + base_change
-                    else:
-                        # Normal operation with drift
-                        # If recovering from an issue, gradually return to normal
-                        normal_value = normal_values[asset_name][sensor_name]
-                        if abs(current_value - normal_value) > 0.05 * normal_value:  # If more than 5% off from normal
-                            # Move 5% closer to normal value
-                            sensor_value = current_value + (normal_value - current_value) * 0.05
-                            # Add small random fluctuation
-                            fluctuation = sensor_value * random.uniform(-0.005, 0.005)
-                            sensor_value += fluctuation
-                        else:
-                            # Regular drift
-                            base_change = current_value * random.uniform(-drift_factor, drift_factor)
-                            sensor_value = current_value + base_change
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        total_annotations = sum(executor.map(backfill_asset, assets))
 
-                    # Ensure value is within allowed range
-                    if sensor_config["is_float"]:
-                        sensor_value = round(max(min(
-                            sensor_value,
-                            sensor_config["max"]),
-                            sensor_config["min"]),
-                            2)
-                    else:
-                        sensor_value = int(max(min(
-                            sensor_value,
-                            sensor_config["max"]),
-                            sensor_config["min"]))
-
-                    # Create document - ONLY include sensor data, no issue information
-                    document = {
-                        "timestamp": timestamp,
-                        "asset_name": asset_name,
-                        "sensor_name": sensor_name,
-                        "sensor_value": sensor_value,
-                        "sensor_unit": sensor_config["unit"]
-                    }
-
-                    batch.append(document)
+    os_client.indices.refresh(index=annotations_index)
+    os_client.indices.put_settings(index=annotations_index, body={"index": {"refresh_interval": "1s"}})
+    print(f"Annotations written: {total_annotations:,} "
+          f"(index now holds {os_client.count(index=annotations_index)['count']:,})")
+    return total_annotations
 
-                    # Update for next iteration
-                    last_values[asset_sensor_key] = sensor_value
 
-                # Check if we should create annotation after processing all sensors for this timestamp
-                if (active_issues[asset_name]["issue"] and
-                        not active_issues[asset_name]["annotation_created"] and
-                        current_time >= active_issues[asset_name]["start_time"] + timedelta(
-                            minutes=5)):  # Wait 5 minutes
+def arrow_fields(properties, top_level=True):
+    """Arrow fields for mapping properties; top-level dates become UTC timestamps, nested ones stay strings"""
+    fields = []
+    for name, field in properties.items():
+        field_type = field.get("type", "object")
+        if "properties" in field:
+            fields.append(pa.field(name, pa.struct(arrow_fields(field["properties"], False))))
+        elif field_type == "date":
+            fields.append(pa.field(name, pa.timestamp("ms", tz="UTC") if top_level else pa.string()))
+        elif field_type in ("keyword", "text", "wildcard", "constant_keyword"):
+            fields.append(pa.field(name, pa.string()))
+        elif field_type in ("float", "half_float", "double", "scaled_float"):
+            fields.append(pa.field(name, pa.float64()))
+        elif field_type in ("byte", "short", "integer", "long"):
+            fields.append(pa.field(name, pa.int64()))
+        elif field_type == "boolean":
+            fields.append(pa.field(name, pa.bool_()))
+    return fields
 
-                    # Create annotation based on actual sensor values
-                    issue_name = active_issues[asset_name]["issue"]
-                    issue_config = pump_issues[issue_name]
-                    affected_sensors = active_issues[asset_name]["affected_sensors"]
-
-                    # Only create annotation if we have affected sensors with significant changes
-                    if affected_sensors:
-                        # Calculate actual changes for indicator
-                        indicator_parts = []
-                        for sensor_name, data in affected_sensors.items():
-                            initial = data["initial"]
-                            current = data["current"]
-                            unit = data["unit"]
-
-                            # Calculate actual percentage change
-                            if initial > 0:
-                                pct_change = (current - initial) / initial * 100
-                                direction = "↓" if pct_change < 0 else "↑"
-
-                                # Only include if change is significant
-                                if abs(pct_change) > 5:
-                                    if sensors_to_use[sensor_name]["is_float"]:
-                                        current_formatted = round(current, 2)
-                                    else:
-                                        current_formatted = int(current)
-
-                                    indicator_parts.append(
-                                        f"{sensor_name.replace('_', ' ')}: {direction}{abs(int(pct_change))}% ({current_formatted} {unit})"
-                                    )
-
-                        # Only create annotation if we have significant changes to report
-                        if indicator_parts:
-                            # Sort by absolute percentage change (largest first)
-                            indicator_parts.sort(key=lambda x: int(x.split('%')[0].split('↓')[-1].split('↑')[-1]),
-                                                 reverse=True)
-                            indicator_text = ", ".join(indicator_parts[:3])  # Top 3 most affected
-
-                            # Create urgency based on severity
-                            severity = active_issues[asset_name]["severity"]
-                            if severity > 0.95:
-                                urgency = "URGENT: Immediate action required. "
-                            elif severity > 0.9:
-                                urgency = "High priority: Schedule maintenance within 24 hours. "
-                            else:
-                                urgency = "Medium priority: Monitor closely and plan intervention. "
-
-                            # Base recommendation
-                            recommendation_base = {
-                                "gas_locking": "Implement gas separation techniques and reduce pump intake pressure.",
-                                "gas_interference": "Adjust pump speed and intake pressure. Consider gas handling equipment.",
-                                "sanding": "Install sand control equipment and schedule pump cleaning.",
-                                "shutdown": "Perform complete maintenance inspection. Check electrical connections.",
-                                "motor_overheating": "Check cooling system and reduce load. Inspect motor insulation.",
-                                "pump_cavitation": "Increase intake pressure and check for flow restrictions.",
-                                "scale_buildup": "Schedule chemical treatment and mechanical cleaning.",
-                                "electrical_fault": "Inspect VFD and power supply. Check motor winding resistance.",
-                                "bearing_wear": "Replace bearings and check shaft alignment. Verify lubrication.",
-                                "pump_wear": "Schedule impeller replacement. Check for abrasive particles.",
-                                "water_breakthrough": "Adjust production strategy and monitor water cut.",
-                                "vfd_fault": "Check VFD cooling and electrical connections. Verify power quality."
-                            }[issue_name]
-
-                            createdBy = {
-                                "email": "system@labelexpress.com",
-                                "userId": "1",
-                            }
 
-                            # Create annotation with actual values
-                            annotation = {
-                                "sourceIndex": "esp_pump_data",
-                                "filterField": "asset_name",
-                                "filterValue": asset_name,
-                                "description": f"{issue_config['description']} (Severity: {int(severity * 100)}%)",
-                                "startDate": active_issues[asset_name]["start_time"].strftime(
-                                    "%Y-%m-%dT%H:%M:%S") + ".000Z",
-                                "endDate": active_issues[asset_name]["end_time"].strftime(
-                                    "%Y-%m-%dT%H:%M:%S") + ".000Z",
-                                "deleted": False,
-                                "annotationType": issue_name.replace("_", " ").title(),
-                                "indicator": f"Detected {issue_name.replace('_', ' ')} in {asset_name}: {indicator_text}",
-                                "recommendation": f"{urgency}{recommendation_base}",
-                                "createdBy": createdBy,
-                                "createdAt": current_time.strftime("%Y-%m-%dT%H:%M:%S") + ".000Z",
-                                "status": "created"
-                            }
+def export_schema(os_client, index_name):
+    """Arrow schema of the documents in an index, alias or pattern, from the mappings of its indices"""
+    properties = {}
+    for index_mapping in os_client.indices.get_mapping(index=index_name).values():
+        properties.update(index_mapping["mappings"].get("properties", {}))
+    return pa.schema(arrow_fields(properties))
 
-                            # Add to annotations list
-                            annotations.append(annotation)
 
-                            # Mark annotation as created
-                            active_issues[asset_name]["annotation_created"] = True
+def export_table(documents, schema):
+    """Build an Arrow table of schema from _source documents, parsing the date strings into timestamps"""
+    source_schema = pa.schema([field.with_type(pa.string()) if pa.types.is_timestamp(field.type) else field
+                               for field in schema])
+    return pa.Table.from_pylist(documents, schema=source_schema).cast(schema)
 
-                # Move to next minute
-                current_time += timedelta(minutes=1)
 
-        # Yield the batch for this day along with any annotations
-        yield {"data": batch, "annotations": annotations}
-        annotations = []  # Clear annotations after yielding
-        current_date += timedelta(days=1)
+def export_slice(os_client, pit, target, slice_id, schema, output_dir, docs_per_file, page_size, save_progress):
+    """
+    Page one slice of a point in time out with search_after and write it to Parquet parts.
 
+    Hits come in partition_field order, so each month's hits are contiguous and
+    a part (<index>/month=YYYY-MM/slice-NN-PPPPP.parquet) ends at the month's
+    end or after docs_per_file documents. Parts are written under a temporary
+    name and renamed when complete; only then is the slice's progress (parts,
+    documents, search_after position) saved, so a resumed export continues after
+    the last complete part and overwrites a partial one.
 
-def opensearch_doc_generator(documents, index_name):
-    """Generator for OpenSearch helpers.bulk"""
-    for doc in documents:
-        yield {
-            "_index": index_name,
-            "_source": doc
-        }
+    Args:
+        os_client: OpenSearch client
+        pit: Dictionary with the point-in-time "id" (updated from the responses)
+        target: Export target from the export state (index, query, sort, partition field, slice progress)
+        slice_id: Slice to export
+        schema: Arrow schema of the index (see export_schema)
+        output_dir: Export directory
+        docs_per_file: Maximum documents per Parquet part
+        page_size: Hits per search request
+        save_progress: Function called after each complete part to persist the export state
+
+    Returns:
+        Number of documents in the slice's parts
+    """
+    progress = target["slices"][slice_id]
+    if progress["done"]:
+        return progress["docs"]
 
+    part = None
 
+    def close_part():
+        part["writer"].close()
+        os.replace(part["path"] + ".tmp", part["path"])
+        progress["parts"] += 1
+        progress["docs"] += part["docs"]
+        progress["search_after"] = part["search_after"]
+        target["files"].append({"file": os.path.relpath(part["path"], output_dir), "slice": slice_id,
+                                "month": part["month"], "docs": part["docs"]})
+        save_progress()
 
-def write_batch_to_opensearch(os_client, batch, index_name, batch_num):
-    """Write a batch of documents to OpenSearch"""
-    try:
-        success, failed = helpers.bulk(
-            os_client,
-            opensearch_doc_generator(batch, index_name),
-            max_retries=3,
-            request_timeout=60,
-            stats_only=True
-        )
+    search_after = progress["search_after"]
+    while True:
+        body = {"size": page_size, "query": target["query"], "sort": target["sort"],
+                "pit": {"id": pit["id"], "keep_alive": EXPORT_KEEP_ALIVE}}
+        if len(target["slices"]) > 1:
+            body["slice"] = {"id": slice_id, "max": len(target["slices"])}
+        if search_after is not None:
+            body["search_after"] = search_after
+        page_start = time.perf_counter()
+        result = os_client.search(body=body)
+        metric_observe("export_page_seconds", time.perf_counter() - page_start)
+        pit["id"] = result.get("pit_id", pit["id"])
+        hits = result["hits"]["hits"]
+        if not hits:
+            break
+        metric_inc("export_docs_total", len(hits))
 
-        print(f"Batch {batch_num}: Indexed {success} documents, Failed: {failed}")
-        return success, failed
-    except Exception as e:
-        print(f"Error in batch {batch_num}: {str(e)}")
-        return 0, len(batch)
+        # Write the page month by month
+        months = [hit["_source"][target["partition_field"]][:7] for hit in hits]
+        position = 0
+        while position < len(hits):
+            month = months[position]
+            if part is not None and (part["month"] != month or part["docs"] >= docs_per_file):
+                close_part()
+                part = None
+            if part is None:
+                month_dir = os.path.join(output_dir, target["index"], f"month={month}")
+                os.makedirs(month_dir, exist_ok=True)
+                path = os.path.join(month_dir, f"slice-{slice_id:02d}-{progress['parts']:05d}.parquet")
+                part = {"path": path, "month": month, "docs": 0,
+                        "writer": pq.ParquetWriter(path + ".tmp", schema, compression="zstd")}
 
+            end = position + 1
+            while end < min(len(hits), position + docs_per_file - part["docs"]) and months[end] == month:
+                end += 1
+            part["writer"].write_table(export_table([hit["_source"] for hit in hits[position:end]], schema))
+            part["docs"] += end - position
+            part["search_after"] = hits[end - 1]["sort"]
+            position = end
+        search_after = hits[-1]["sort"]
 
-def write_to_opensearch(documents_generator, index_name="esp_pump_data", annotations_index="annotations",
-                        max_workers=4):
+    if part is not None:
+        close_part()
+    progress["done"] = True
+    save_progress()
+    return progress["docs"]
+
+
+def export_to_parquet(output_dir, start_date, end_date, index_name="esp_pump_data", annotations_index="annotations",
+                      assets=None, slices=4, docs_per_file=DEFAULT_DOCS_PER_FILE, page_size=EXPORT_PAGE_SIZE,
+                      resume=False):
     """
-    Write documents to OpenSearch using parallel processing
+    Export indexed data and annotations to month-partitioned Parquet files for offline use.
+
+    Each index is read through a point in time with slices sliced search_after
+    readers in parallel (see export_slice), filtered on the date range and
+    optionally the assets. Columns are typed from the index mapping: dates are
+    UTC timestamps, numbers int64/float64 and keywords strings, so the output
+    directory can be read as a hive-partitioned dataset (e.g. with
+    pyarrow.dataset). Progress is kept per slice in export.json; with resume,
+    slices continue after their last complete part. The point in time of a
+    resumed export is a new one, so slices only line up with the first run
+    while the index keeps the same documents and shards.
 
     Args:
-        documents_generator: Generator yielding batches of documents and annotations
-        index_name: Name of the index to write to
-        annotations_index: Name of the index for annotations
-        max_workers: Number of parallel workers for batch processing
+        output_dir: Directory to write the export to (created if missing)
+        start_date: First day to export
+        end_date: Last day to export
+        index_name: Data index (or read alias) to export
+        annotations_index: Annotations index to export (skipped if it doesn't exist)
+        assets: Optional list of assets to export (defaults to all)
+        slices: Number of slices read in parallel per index
+        docs_per_file: Maximum documents per Parquet part
+        page_size: Hits per search request
+        resume: Continue the export recorded in output_dir/export.json
 
     Returns:
-        Total count of documents in the index
+        Number of data documents exported
     """
-    # Connect to OpenSearch
-    os_client = OpenSearch(
-        ['https://127.0.0.1:9200'],
-        http_auth=('admin', 'Alexi@5we%6'),
-        verify_certs=False,  # Disable SSL certificate verification
-        ssl_show_warn=False,
-        ssl_assert_hostname=False,  # Disable hostname verification if required
-        request_timeout=120  # Increased timeout
-    )
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, "export.json")
 
-    # Create main index with optimized settings if it doesn't exist
-    if not os_client.indices.exists(index=index_name):
-        index_body = {
-            "settings": {
-                "number_of_shards": 2,  # Increased for 6 months of data
-                "number_of_replicas": 0,
-                "refresh_interval": "-1",  # Reduced refresh rate for better performance
-                "index.mapping.total_fields.limit": 2000,
-                "index.max_result_window": 100000
-            },
-            "mappings": {
-                "properties": {
-                    "timestamp": {"type": "date"}
-                }
-            }
-        }
-        os_client.indices.create(index=index_name, body=index_body)
-        print(f"Created index '{index_name}' with optimized settings for large datasets")
+    time_range = {"gte": start_date.strftime("%Y-%m-%dT00:00:00.000Z"),
+                  "lt": (end_date + timedelta(days=1)).strftime("%Y-%m-%dT00:00:00.000Z")}
 
-    # Create annotations index if it doesn't exist
-    if not os_client.indices.exists(index=annotations_index):
-        annotations_index_body = {
-            "settings": {
-                "number_of_shards": 1,  # Smaller index
-                "number_of_replicas": 0,
-                "refresh_interval": "-1"  # Faster refresh for smaller index
-            },
-            "mappings": {
-                "properties": {
-                    "startDate": {"type": "date"},
-                    "endDate": {"type": "date"}
-                }
-            }
-        }
-        os_client.indices.create(index=annotations_index, body=annotations_index_body)
-        print(f"Created index '{annotations_index}' for pump issue annotations")
+    def export_target(target_index, partition_field, sort, asset_field):
+        # Hits are sorted on the partition date first, then fields that tell the documents apart
+        query = {"bool": {"filter": [{"range": {partition_field: time_range}}]}}
+        if assets:
+            query["bool"]["filter"].append({"terms": {asset_field: list(assets)}})
+        return {"index": target_index, "partition_field": partition_field, "query": query,
+                "sort": [{partition_field: "asc"}] + sort, "files": [],
+                "slices": [{"search_after": None, "parts": 0, "docs": 0, "done": False} for _ in range(slices)]}
 
-    total_docs = 0
-    total_annotations = 0
-    batch_num = 0
+    export = {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "assets": list(assets) if assets else None,
+        "targets": [
+            export_target(index_name, "timestamp",
+                          [{"asset_name": "asc"}, {"sensor_name": {"order": "asc", "unmapped_type": "keyword"}}],
+                          "asset_name"),
+            export_target(annotations_index, "startDate",
+                          [{"filterValue.keyword": "asc"}, {"annotationType.keyword": "asc"}],
+                          "filterValue.keyword")
+        ]
+    }
+    if resume:
+        saved = load_checkpoint(state_path)
+        mismatched = [key for key in ("start_date", "end_date", "assets") if saved[key] != export[key]]
+        if [target["index"] for target in saved["targets"]] != [target["index"] for target in export["targets"]]:
+            mismatched.append("indices")
+        elif len(saved["targets"][0]["slices"]) != slices:
+            mismatched.append("slice count")
+        if mismatched:
+            raise ValueError(f"{state_path} was written with a different {', '.join(mismatched)}")
+        export = saved
 
-    # Process document batches from the generator
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-
-        for batch_data in documents_generator:
-            day_batch = batch_data["data"]
-            day_annotations = batch_data["annotations"]
-
-            # Process annotations
-            if day_annotations:
-                for annotation in day_annotations:
-                    try:
-                        os_client.index(
-                            index=annotations_index,  # Make sure we're using the string 'annotations'
-                            body=annotation,
-                            refresh=True
-                        )
-                        total_annotations += 1
-                    except Exception as e:
-                        print(f"Error indexing annotation: {str(e)}")
-
-            # Split large day batches into smaller chunks if needed
-            chunk_size = 20000  # Optimal size for bulk operations
-
-            if len(day_batch) > chunk_size:
-                for i in range(0, len(day_batch), chunk_size):
-                    batch_num += 1
-                    chunk = day_batch[i:i + chunk_size]
-                    futures.append(executor.submit(
-                        write_batch_to_opensearch,
-                        os_client,
-                        chunk,
-                        index_name,
-                        batch_num
-                    ))
-            else:
-                batch_num += 1
-                futures.append(executor.submit(
-                    write_batch_to_opensearch,
-                    os_client,
-                    day_batch,
-                    index_name,
-                    batch_num
-                ))
-
-        # Collect results
-        for future in futures:
-            success, failed = future.result()
-            total_docs += success
+    os_client = OpenSearch(**OPENSEARCH_CONNECTION, pool_maxsize=slices)
+    state_lock = threading.Lock()
 
-    # Refresh indexes to make sure count is accurate
-    print("Finalizing indexes...")
-    os_client.indices.refresh(index=index_name)
-    os_client.indices.refresh(index=annotations_index)
+    def save_progress():
+        with state_lock:
+            write_checkpoint(state_path, export)
 
-    # Set to one replica for redundancy now that indexing is complete
-    os_client.indices.put_settings(
-        index=index_name,
-        body={"index": {"refresh_interval": "1s", "number_of_replicas": 1}}
-    )
+    save_progress()
+    totals = {}
+    for target in export["targets"]:
+        if not os_client.indices.exists(index=target["index"]):
+            print(f"Index '{target['index']}' does not exist; skipping it")
+            continue
+        schema = export_schema(os_client, target["index"])
+        pit = {"id": os_client.create_pit(index=target["index"], keep_alive=EXPORT_KEEP_ALIVE)["pit_id"]}
+        print(f"Exporting '{target['index']}' with {slices} slices to {output_dir}")
+        try:
+            with ThreadPoolExecutor(max_workers=slices) as executor:
+                totals[target["index"]] = sum(executor.map(
+                    lambda slice_id: export_slice(os_client, pit, target, slice_id, schema, output_dir,
+                                                  docs_per_file, page_size, save_progress),
+                    range(len(target["slices"]))))
+        finally:
+            os_client.delete_pit(body={"pit_id": [pit["id"]]})
+        print(f"Exported {totals[target['index']]:,} documents from '{target['index']}' "
+              f"to {len(target['files'])} files")
 
-    os_client.indices.put_settings(
-        index=annotations_index,
-        body={"index": {"number_of_replicas": 1}}
-    )
+    save_progress()
+    return totals.get(index_name, 0)
 
-    final_count = os_client.count(index=index_name)["count"]
-    annotations_count = os_client.count(index=annotations_index)["count"]
 
-    print(f"Total annotations created: {total_annotations}")
-    print(f"Final annotations count: {annotations_count}")
+def process_peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where the resource module is unavailable"""
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux and the BSDs
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
 
-    return final_count
 
+def plan_capacity(start_date, end_date, engine="scalar", catalog=None, seed=None,
+                  sample_seconds=DEFAULT_SAMPLE_SECONDS, doc_format="long", rollup_intervals=None, doc_ids=False,
+                  workers=4, processes=0, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, cluster_docs_per_sec=None,
+                  index_name="esp_pump_data", annotations_index="annotations"):
+    """
+    Project a load from one sample day that is simulated and serialized but not written anywhere.
+
+    The first day of the range runs through the selected engine, document
+    format and NDJSON serializer; documents, bulk bytes, time and peak memory of
+    that day are measured and scaled to the whole range. The on-disk size and
+    the cluster side of the run time use INDEX_SIZE_RATIO and
+    ASSUMED_WORKER_DOCS_PER_SEC (or cluster_docs_per_sec) instead.
+
+    Args:
+        start_date: First day of the load (also the sample day)
+        end_date: Last day of the load
+        engine: Name of the simulation engine
+        catalog: Optional fleet catalog from load_catalog
+        seed: Optional random seed
+        sample_seconds: Seconds per simulation step
+        doc_format: Document format (key of DOC_FORMATS)
+        rollup_intervals: Optional rollup granularities
+        doc_ids: Whether documents get deterministic IDs (part of every bulk action line)
+        workers: Bulk workers of the load
+        processes: Generator processes of the load (0 generates in-process)
+        max_inflight_bytes: Bulk bytes the writer may queue or have in flight
+        cluster_docs_per_sec: Measured indexing rate of the target cluster, if known
+        index_name: Index the documents go to (the action lines name it)
+        annotations_index: Index the annotations go to
+
+    Returns:
+        Report dictionary with the sample measurements, projections and assumptions
+    """
+    days = (end_date - start_date).days + 1
+    groups = catalog_groups(catalog)
+    baseline_rss = process_peak_rss_mb()
+
+    documents_generator = GENERATION_ENGINES[engine](start_date, start_date, seed=seed, catalog=catalog,
+                                                     rollup_intervals=rollup_intervals,
+                                                     sample_seconds=sample_seconds)
+    if DOC_FORMATS[doc_format]:
+        documents_generator = DOC_FORMATS[doc_format](documents_generator)
+    id_func = document_id if doc_ids else None
+
+    sample = {"docs": 0, "annotations": 0, "rollups": 0, "bulk_bytes": 0, "generate_seconds": 0.0,
+              "serialize_seconds": 0.0}
+    batches = iter(documents_generator)
+    while True:
+        started = time.perf_counter()
+        batch_data = next(batches, None)
+        sample["generate_seconds"] += time.perf_counter() - started
+        if batch_data is None:
+            break
+
+        started = time.perf_counter()
+        sample["bulk_bytes"] += len(serialize_bulk_body(batch_data["data"], index_name, id_func))
+        if batch_data["annotations"]:
+            sample["bulk_bytes"] += len(serialize_bulk_body(batch_data["annotations"], annotations_index,
+                                                            annotation_id))
+        rollups_by_index = {}
+        for rollup_doc in batch_data.get("rollups", ()):
+            rollups_by_index.setdefault(rollup_index_name(index_name, rollup_doc["interval"]), []).append(rollup_doc)
+        for rollup_index, rollup_docs in rollups_by_index.items():
+            sample["bulk_bytes"] += len(serialize_bulk_body(rollup_docs, rollup_index, rollup_id))
+        sample["serialize_seconds"] += time.perf_counter() - started
+        sample["docs"] += document_count(batch_data["data"])
+        sample["annotations"] += len(batch_data["annotations"])
+        sample["rollups"] += len(batch_data.get("rollups", ()))
+    peak_rss = process_peak_rss_mb()
+    sample["peak_rss_mb"] = round(peak_rss, 1) if peak_rss is not None else None
+
+    projected_docs = sample["docs"] * days
+    projected_bytes = sample["bulk_bytes"] * days
+    # Generation spreads over the processes; serialization shares the GIL with the writer threads
+    client_seconds = days * (sample["generate_seconds"] / max(1, processes) + sample["serialize_seconds"])
+    cluster_rate = cluster_docs_per_sec or workers * ASSUMED_WORKER_DOCS_PER_SEC
+    cluster_seconds = projected_docs / cluster_rate
+    index_bytes = int(projected_bytes * INDEX_SIZE_RATIO)
+    peak_rss_mb = None
+    if resource:
+        # The simulation's working set per generating process, plus the bulk bodies queued or in flight
+        working_set = sample["peak_rss_mb"] - baseline_rss
+        peak_rss_mb = round(baseline_rss + working_set * max(1, processes)
+                            + min(max_inflight_bytes, projected_bytes) / (1024 * 1024), 1)
+
+    for key in ("generate_seconds", "serialize_seconds"):
+        sample[key] = round(sample[key], 3)
+    return {
+        "sample_day": start_date.strftime("%Y-%m-%d"),
+        "days": days,
+        "engine": engine,
+        "doc_format": doc_format,
+        "sample_seconds": sample_seconds,
+        "assets": sum(len(group["assets"]) for group in groups),
+        "sensors": len(catalog_sensors({"groups": groups})),
+        "workers": workers,
+        "processes": processes,
+        "sample": sample,
+        "projected": {
+            "docs": projected_docs,
+            "annotations": sample["annotations"] * days,
+            "rollups": sample["rollups"] * days,
+            "bulk_bytes": projected_bytes,
+            "index_bytes_primary": index_bytes,
+            "index_bytes_total": index_bytes * (1 + FINAL_REPLICAS),
+            "peak_rss_mb": peak_rss_mb,
+            "client_seconds": round(client_seconds, 1),
+            "cluster_seconds": round(cluster_seconds, 1),
+            "wall_seconds": round(max(client_seconds, cluster_seconds), 1),
+            "bottleneck": "client" if client_seconds >= cluster_seconds else "cluster"
+        },
+        "assumptions": {
+            "index_size_ratio": INDEX_SIZE_RATIO,
+            "replicas": FINAL_REPLICAS,
+            "cluster_docs_per_sec": cluster_rate,
+            "cluster_docs_per_sec_measured": cluster_docs_per_sec is not None
+        }
+    }
 
 
-def calculate_estimated_docs(start_date, end_date, num_assets=5, num_sensors=9):
-    """Calculate the estimated number of documents"""
+def calculate_estimated_docs(start_date, end_date, num_assets=len(ALL_ASSETS), num_sensors=len(ALL_SENSORS),
+                             doc_format="long", sample_seconds=DEFAULT_SAMPLE_SECONDS, sensor_sample_seconds=None):
+    """Calculate the estimated number of documents (sensor_sample_seconds lists each sensor's interval)"""
     days = (end_date - start_date).days + 1
-    readings_per_day = 24 * 60  # Minutes in a day
+    if sensor_sample_seconds is None:
+        sensor_sample_seconds = [sample_seconds] * num_sensors
+    seconds_per_day = 24 * 60 * 60
 
-    return days * num_assets * num_sensors * readings_per_day
+    if doc_format == "wide":
+        # One document per timestamp any sensor reports at
+        return days * num_assets * (seconds_per_day // min(sensor_sample_seconds))
+    if doc_format == "hourly":
+        return days * num_assets * num_sensors * 24
+    return days * num_assets * sum(seconds_per_day // seconds for seconds in sensor_sample_seconds)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate ESP pump data for OpenSearch')
@@ -794,7 +4900,137 @@ if __name__ == "__main__":
     parser.add_argument('--index', type=str, default='esp_pump_data', help='OpenSearch index name')
     parser.add_argument('--annotations_index', type=str, default='annotations', help='OpenSearch annotations index name')
     parser.add_argument('--workers', type=int, default=4, help='Number of parallel workers')
+    parser.add_argument('--hosts', type=str, nargs='+', metavar='URL',
+                        help='OpenSearch node URLs (defaults to $OPENSEARCH_HOSTS, comma separated, or '
+                             f"{OPENSEARCH_CONNECTION['hosts'][0]}); credentials come from "
+                             '$OPENSEARCH_USERNAME and $OPENSEARCH_PASSWORD')
+    parser.add_argument('--no-auth', action='store_true',
+                        help='Connect without credentials (clusters with the security plugin disabled)')
+    parser.add_argument('--sniff', action='store_true',
+                        help="Discover the cluster's nodes from --hosts and send bulk requests to its data nodes")
+    parser.add_argument('--no-node-dispatch', action='store_true',
+                        help='Send every bulk request through one client pool instead of picking the node with '
+                             'the least load, latency and rejections')
+    parser.add_argument('--engine', type=str, choices=['scalar', 'vectorized'], default='scalar',
+                        help='Simulation engine: pure-Python scalar loops or NumPy vectorized days')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Documents per bulk request (starting value when adaptive)')
+    parser.add_argument('--target-bulk-mb', type=int, default=DEFAULT_TARGET_BULK_BYTES // (1024 * 1024),
+                        help='Bulk request size the adaptive controller aims for')
+    parser.add_argument('--fixed-bulk', action='store_true',
+                        help='Keep --chunk-size and two requests per worker instead of adapting to the cluster')
+    parser.add_argument('--max-inflight-mb', type=int, default=DEFAULT_MAX_INFLIGHT_BYTES // (1024 * 1024),
+                        help='Maximum megabytes of bulk data queued or in flight')
+    parser.add_argument('--bulk-writer', type=str, choices=['ndjson', 'helpers'], default='ndjson',
+                        help='Bulk writer: pre-serialized NDJSON bodies or opensearch-py helpers.bulk')
+    parser.add_argument('--backend', type=str, choices=['threads', 'asyncio'], default='threads',
+                        help='Ingestion backend: --workers threads or asyncio coroutines (needs aiohttp)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Concurrent bulk requests for the asyncio backend')
+    parser.add_argument('--pool-size', type=int,
+                        help='Keep-alive connections for the asyncio backend (defaults to --concurrency)')
+    parser.add_argument('--doc-format', type=str, choices=list(DOC_FORMATS), default='long',
+                        help='Document format: one reading per document, one document per asset/minute (wide) '
+                             'or per asset/sensor/hour (hourly)')
+    parser.add_argument('--trim-source', action='store_true',
+                        help='Disable _source for the wide document format')
+    parser.add_argument('--shards', type=int,
+                        help='Number of primary shards (defaults to one per --docs-per-shard estimated documents)')
+    parser.add_argument('--docs-per-shard', type=int, default=DEFAULT_DOCS_PER_SHARD,
+                        help='Estimated documents per primary shard used to derive the shard count')
+    parser.add_argument('--monthly-indices', action='store_true',
+                        help='Write into monthly <index>-YYYY.MM partitions behind an <index> read alias')
+    parser.add_argument('--force-merge', action='store_true',
+                        help='Force-merge completed monthly partitions to one segment after loading')
+    parser.add_argument('--ism-policy', action='store_true',
+                        help='Install the ISM policy stub for the monthly partitions')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Number of generator processes (0 generates in the main process)')
+    parser.add_argument('--shard-days', type=int, default=1,
+                        help='Days per asset shard when generating with --processes')
+    parser.add_argument('--compare-engines', action='store_true',
+                        help='Run both engines with the same seed over the date range and compare statistics')
+    parser.add_argument('--output-dir', type=str,
+                        help='Write the data to shard files in this directory instead of OpenSearch')
+    parser.add_argument('--file-format', type=str, choices=['ndjson', 'parquet'], default='ndjson',
+                        help='Shard file format for --output-dir: gzipped _bulk bodies or Parquet (needs pyarrow)')
+    parser.add_argument('--docs-per-file', type=int, default=DEFAULT_DOCS_PER_FILE,
+                        help='Documents per shard file for --output-dir (or Parquet part for --export)')
+    parser.add_argument('--replay', type=str, metavar='DIR',
+                        help='Load shard files written with --output-dir into OpenSearch instead of generating data')
+    parser.add_argument('--metrics-file', type=str,
+                        help='Periodically export pipeline metrics (rates, latencies, queue depth) to this file')
+    parser.add_argument('--metrics-format', type=str, choices=['jsonl', 'prometheus'], default='jsonl',
+                        help='Metrics export format: appended JSON lines or a Prometheus textfile')
+    parser.add_argument('--metrics-interval', type=float, default=10, help='Seconds between metrics exports')
+    parser.add_argument('--run-report', type=str, help='Write a JSON report of the run to this file at the end')
+    parser.add_argument('--doc-ids', action='store_true',
+                        help='Index documents with deterministic IDs (asset/sensor/timestamp) so reruns overwrite')
+    parser.add_argument('--checkpoint', type=str,
+                        help='Record the last fully indexed day and the simulator state in this file '
+                             '(implies --doc-ids)')
+    parser.add_argument('--rollups', type=str, nargs='+', choices=list(ROLLUP_INTERVALS),
+                        help='Also write count/sum/min/max/avg rollups per asset and sensor to '
+                             '<index>_rollup_<interval> indices for long-range dashboard queries')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the load recorded in --checkpoint from the day after its last indexed day, '
+                             'or the --export recorded in its directory')
+    parser.add_argument('--catalog', type=str,
+                        help='YAML/JSON catalog of asset groups, sensor templates and issue models to simulate, '
+                             'or to match with --backfill-annotations (defaults to the built-in 5 pumps)')
+    parser.add_argument('--sample-seconds', type=int, default=DEFAULT_SAMPLE_SECONDS,
+                        help='Seconds between readings (must divide 60; e.g. 1 for high-frequency data)')
+    parser.add_argument('--sensor-sample-seconds', type=str, nargs='+', metavar='SENSOR=SECONDS',
+                        help='Slower sampling for individual sensors (multiples of --sample-seconds dividing 300)')
+    parser.add_argument('--backfill-annotations', action='store_true',
+                        help='Re-derive the annotations for the date range from the data already in --index '
+                             'instead of generating data')
+    parser.add_argument('--backfill-interval', type=int, choices=[1, 5], default=5,
+                        help='Minutes per time bucket read back for --backfill-annotations')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Simulate and serialize the first day only and print a JSON capacity report '
+                             '(documents, bulk bytes, index size, memory and run time projected for the range)')
+    parser.add_argument('--cluster-docs-per-sec', type=int,
+                        help='Measured indexing rate of the cluster for the --dry-run time projection '
+                             f'(defaults to {ASSUMED_WORKER_DOCS_PER_SEC:,} per worker)')
+    parser.add_argument('--yes', action='store_true', help='Skip the confirmation prompt')
+    parser.add_argument('--replace-annotations', action='store_true',
+                        help='With --backfill-annotations, first delete the generated annotations starting in '
+                             'the date range (annotations added by people are kept)')
+    parser.add_argument('--export', type=str, metavar='DIR',
+                        help='Export the data in --index and the annotations for the date range to '
+                             'month-partitioned Parquet files in DIR instead of generating data (needs pyarrow)')
+    parser.add_argument('--export-slices', type=int,
+                        help='Sliced point-in-time readers per index for --export (defaults to --workers)')
+    parser.add_argument('--export-assets', type=str, nargs='+', help='Assets to export (defaults to all)')
     args = parser.parse_args()
+    # Simulating into files or a report needs no cluster, and so no credentials
+    offline = args.dry_run or args.compare_engines or (args.output_dir and not args.replay)
+    try:
+        configure_connection(args.hosts, args.sniff, require_auth=not (args.no_auth or offline))
+    except ValueError as e:
+        parser.error(str(e))
+
+    stop_metrics = None
+    if args.metrics_file:
+        stop_metrics = start_metrics_reporter(args.metrics_file, args.metrics_format, args.metrics_interval)
+
+    if args.replay:
+        print(f"Replaying shard files from {args.replay}...")
+        started_at = datetime.now()
+        start_time = time.time()
+        total_count = replay_files(args.replay, args.workers, args.target_bulk_mb * 1024 * 1024,
+                                   force_merge=args.force_merge, install_ism=args.ism_policy,
+                                   dispatch_nodes=not args.no_node_dispatch)
+        elapsed_time = time.time() - start_time
+        if stop_metrics:
+            stop_metrics()
+        if args.run_report:
+            write_run_report(args.run_report, started_at, elapsed_time, total_count, vars(args))
+        print(f"\nTotal documents indexed: {total_count:,} in {elapsed_time:.2f}s "
+              f"({total_count / elapsed_time:.2f} docs/sec)")
+        exit()
 
     # Set start and end dates
     end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -806,30 +5042,203 @@ if __name__ == "__main__":
         days_in_period = args.months * 30  # Approximate days in months
         start_date = end_date - timedelta(days=days_in_period)
 
+    catalog = load_catalog(args.catalog) if args.catalog else None
+    if args.backfill_annotations:
+        print(f"Backfilling annotations from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
+        start_time = time.time()
+        backfill_annotations(start_date, end_date, args.index, args.annotations_index, args.workers,
+                             args.backfill_interval, args.replace_annotations, catalog=catalog)
+        if stop_metrics:
+            stop_metrics()
+        print(f"Backfill finished in {time.time() - start_time:.2f}s")
+        exit()
+    elif args.replace_annotations:
+        parser.error("--replace-annotations needs --backfill-annotations")
+
+    if args.export:
+        print(f"Exporting from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
+        start_time = time.time()
+        try:
+            total_count = export_to_parquet(args.export, start_date, end_date, args.index, args.annotations_index,
+                                            args.export_assets, args.export_slices or args.workers,
+                                            args.docs_per_file, resume=args.resume)
+        except ValueError as e:
+            parser.error(f"--resume: {e}")
+        if stop_metrics:
+            stop_metrics()
+        elapsed_time = time.time() - start_time
+        print(f"Export finished in {elapsed_time:.2f}s ({total_count / elapsed_time:.2f} docs/sec)")
+        exit()
+    elif args.export_assets:
+        parser.error("--export-assets needs --export")
+
+    if args.sensor_sample_seconds:
+        sensor_rates = {}
+        for entry in args.sensor_sample_seconds:
+            sensor_name, _, seconds = entry.partition("=")
+            if not seconds.isdigit():
+                parser.error(f"--sensor-sample-seconds: expected SENSOR=SECONDS, got '{entry}'")
+            sensor_rates[sensor_name] = int(seconds)
+        catalog = with_sensor_sample_seconds(catalog or default_catalog(), sensor_rates)
+        unknown = set(sensor_rates).difference(catalog_sensors(catalog))
+        if unknown:
+            parser.error(f"--sensor-sample-seconds: unknown sensors {', '.join(sorted(unknown))}")
+    try:
+        for group in catalog_groups(catalog):
+            sensor_sample_steps(group["sensors"], args.sample_seconds)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.compare_engines:
+        compare_engines(start_date, end_date, seed=args.seed, catalog=catalog, sample_seconds=args.sample_seconds)
+        exit()
+
+    # Checkpointed loads record what is needed to continue exactly where they stopped
+    simulator_state = {}
+    run_info = None
+    if args.checkpoint:
+        if args.processes > 0 or args.output_dir:
+            parser.error("--checkpoint needs in-process generation (no --processes) into OpenSearch (no --output-dir)")
+        run_info = {
+            "engine": args.engine,
+            "seed": args.seed,
+            "doc_format": args.doc_format,
+            "index": args.index,
+            "annotations_index": args.annotations_index,
+            "monthly_indices": args.monthly_indices,
+            "catalog": args.catalog,
+            "sample_seconds": args.sample_seconds,
+            "sensor_sample_seconds": args.sensor_sample_seconds,
+            "start_date": start_date.strftime('%Y-%m-%d'),
+            "end_date": end_date.strftime('%Y-%m-%d')
+        }
+        if args.resume:
+            saved = load_checkpoint(args.checkpoint)
+            mismatched = [key for key in ("engine", "seed", "doc_format", "index", "annotations_index",
+                                          "monthly_indices", "catalog", "sensor_sample_seconds")
+                          if saved.get(key) != run_info[key]]
+            # Checkpoints from before sub-minute sampling were written at one reading per minute
+            if saved.get("sample_seconds", DEFAULT_SAMPLE_SECONDS) != args.sample_seconds:
+                mismatched.append("sample_seconds")
+            if mismatched:
+                parser.error(f"--resume: the checkpoint was written with a different {', '.join(mismatched)}")
+            # Keep the original date range so the resumed load covers exactly the remaining days
+            run_info["start_date"] = saved["start_date"]
+            run_info["end_date"] = saved["end_date"]
+            start_date = datetime.strptime(saved["resume_from"], '%Y-%m-%d')
+            end_date = datetime.strptime(saved["end_date"], '%Y-%m-%d')
+            simulator_state = restore_simulator_state(saved["state"])
+            if start_date > end_date:
+                print(f"Checkpoint {args.checkpoint} already covers {saved['end_date']}; nothing to resume.")
+                exit()
+            print(f"Resuming from {saved['resume_from']} (checkpoint at {saved['day']})")
+    elif args.resume:
+        parser.error("--resume needs --checkpoint")
+
     # Calculate and show estimated document count
-    estimated_docs = calculate_estimated_docs(start_date, end_date)
+    groups = catalog_groups(catalog)
+    estimated_docs = sum(calculate_estimated_docs(start_date, end_date, len(group["assets"]), len(group["sensors"]),
+                                                  args.doc_format, args.sample_seconds,
+                                                  [config.get("sample_seconds", args.sample_seconds)
+                                                   for config in group["sensors"].values()])
+                         for group in groups)
+    total_days = (end_date - start_date).days + 1
+    # Monthly partitions only hold about a month of the estimated volume each
+    index_docs = estimated_docs * min(31, total_days) // total_days if args.monthly_indices else estimated_docs
+    number_of_shards = args.shards or estimate_shard_count(index_docs, args.docs_per_shard)
+
+    # Compact formats go to their own index unless one is given explicitly
+    if args.doc_format != 'long' and args.index == parser.get_default('index'):
+        args.index = f"{args.index}_{args.doc_format}"
+
+    # Monthly partitions are written to <index>-YYYY.MM behind an <index> read alias
+    index_pattern = f"{args.index}-*" if args.monthly_indices else args.index
+    read_alias = args.index if args.monthly_indices else None
+    if args.doc_format != 'long':
+        index_template = compact_index_template(args.doc_format, index_pattern,
+                                                catalog_sensors(catalog) if catalog else None,
+                                                trim_source=args.trim_source, number_of_shards=number_of_shards,
+                                                read_alias=read_alias)
+    else:
+        index_template = esp_index_template(index_pattern, number_of_shards, read_alias=read_alias)
+
+    if args.dry_run:
+        # Only the JSON report goes to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            report = plan_capacity(start_date, end_date, args.engine, catalog, args.seed, args.sample_seconds,
+                                   args.doc_format, args.rollups, args.doc_ids or bool(args.checkpoint),
+                                   args.workers, args.processes, args.max_inflight_mb * 1024 * 1024,
+                                   args.cluster_docs_per_sec, args.index, args.annotations_index)
+        report["projected"]["estimated_docs"] = estimated_docs
+        report["projected"]["number_of_shards"] = number_of_shards
+        print(json.dumps(report, indent=2))
+        exit()
+
     print(f"Generating ESP pump sensor data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
     print(f"Period: {(end_date - start_date).days + 1} days ({args.months} months)")
-    print(f"Using 5 assets and 9 sensors with readings every minute")
-    print(f"Estimated document count: {estimated_docs:,} documents")
+    sampling = "every minute" if args.sample_seconds == 60 else f"every {args.sample_seconds} seconds"
+    print(f"Using {sum(len(group['assets']) for group in groups):,} assets and "
+          f"{len(catalog_sensors({'groups': groups}))} sensors in {len(groups)} groups from "
+          f"{args.catalog or 'the built-in fleet'} with readings {sampling}")
+    print(f"Estimated document count: {estimated_docs:,} documents ({number_of_shards} primary shards)")
     print("Simulating continuously running pumps with occasional operational issues")
 
     # Ask for confirmation for large dataset
-    confirm = input(f"This will generate approximately {estimated_docs:,} documents. Continue? (y/n): ")
-    if confirm.lower() != 'y':
-        print("Operation cancelled.")
-        exit()
+    if not args.yes:
+        confirm = input(f"This will generate approximately {estimated_docs:,} documents. Continue? (y/n): ")
+        if confirm.lower() != 'y':
+            print("Operation cancelled.")
+            exit()
 
     # Generate and index data
     print("\nGenerating and indexing data...")
+    started_at = datetime.now()
     start_time = time.time()
-    documents_generator = generate_esp_pump_data(start_date, end_date)
-    total_count = write_to_opensearch(documents_generator, args.index, args.annotations_index, args.workers)
+    if args.processes > 0:
+        documents_generator = generate_esp_pump_data_parallel(start_date, end_date, seed=args.seed,
+                                                              engine=args.engine, processes=args.processes,
+                                                              shard_days=args.shard_days,
+                                                              chunk_size=args.chunk_size,
+                                                              rollup_intervals=args.rollups, catalog=catalog,
+                                                              sample_seconds=args.sample_seconds)
+    elif args.engine == 'vectorized':
+        documents_generator = generate_esp_pump_data_vectorized(start_date, end_date, seed=args.seed,
+                                                                state=simulator_state, chunk_size=args.chunk_size,
+                                                                rollup_intervals=args.rollups, catalog=catalog,
+                                                                sample_seconds=args.sample_seconds)
+    else:
+        documents_generator = generate_esp_pump_data(start_date, end_date, seed=args.seed, state=simulator_state,
+                                                     chunk_size=args.chunk_size, rollup_intervals=args.rollups,
+                                                     catalog=catalog, sample_seconds=args.sample_seconds)
+    if DOC_FORMATS[args.doc_format]:
+        documents_generator = DOC_FORMATS[args.doc_format](documents_generator)
+    if args.output_dir:
+        total_count = write_to_files(documents_generator, args.output_dir, args.index, args.annotations_index,
+                                     file_format=args.file_format, docs_per_file=args.docs_per_file,
+                                     chunk_size=args.chunk_size, monthly_indices=args.monthly_indices,
+                                     index_template=index_template, rollup_intervals=args.rollups)
+    else:
+        total_count = write_to_opensearch(documents_generator, args.index, args.annotations_index, args.workers,
+                                          chunk_size=args.chunk_size,
+                                          max_inflight_bytes=args.max_inflight_mb * 1024 * 1024,
+                                          bulk_writer=args.bulk_writer, index_template=index_template,
+                                          monthly_indices=args.monthly_indices, force_merge=args.force_merge,
+                                          install_ism=args.ism_policy, adaptive=not args.fixed_bulk,
+                                          target_bulk_bytes=args.target_bulk_mb * 1024 * 1024,
+                                          backend=args.backend, concurrency=args.concurrency,
+                                          pool_size=args.pool_size, doc_ids=args.doc_ids,
+                                          checkpoint=checkpoint_tracker(args.checkpoint, simulator_state, run_info)
+                                          if args.checkpoint else None, rollup_intervals=args.rollups,
+                                          dispatch_nodes=not args.no_node_dispatch)
     elapsed_time = time.time() - start_time
+    if stop_metrics:
+        stop_metrics()
+    if args.run_report:
+        write_run_report(args.run_report, started_at, elapsed_time, total_count, vars(args))
 
     # Print summary
     print("\n===== Operation Summary =====")
-    print(f"Total documents indexed: {total_count:,}")
+    print(f"Total documents {'written' if args.output_dir else 'indexed'}: {total_count:,}")
     hours, remainder = divmod(elapsed_time, 3600)
     minutes, seconds = divmod(remainder, 60)
     print(f"Total time: {int(hours)}h {int(minutes)}m {seconds:.2f}s")
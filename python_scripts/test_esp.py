@@ -0,0 +1,390 @@
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# The generator script and the benchmark suite (for its mock server), loaded by path because their file
+# names are not module names
+ESP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esp with issues and annotations.py")
+BENCHMARK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esp benchmark.py")
+
+# Two days across a month boundary and a few assets keep the tests fast
+START = datetime(2024, 1, 31)
+END = datetime(2024, 2, 1)
+ASSETS = ["ESP_PUMP_01", "ESP_PUMP_02"]
+
+
+@pytest.fixture(scope="module")
+def esp():
+    """Import the generator script as a module (registered so worker processes can unpickle from it)"""
+    spec = importlib.util.spec_from_file_location("esp", ESP_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["esp"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def bench():
+    """Import the benchmark suite as a module"""
+    spec = importlib.util.spec_from_file_location("esp_benchmark", BENCHMARK_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def mock_server(esp, bench):
+    """Mock OpenSearch server the script's clients are pointed at; its rejection settings can be changed per test"""
+    server = bench.start_mock_server()
+    connection = dict(esp.OPENSEARCH_CONNECTION)
+    bench.use_mock_server(esp, server)
+    yield server
+    server.shutdown()
+    esp.OPENSEARCH_CONNECTION.clear()
+    esp.OPENSEARCH_CONNECTION.update(connection)
+
+
+class ScriptedTransport:
+    """Stand-in for a client's transport answering _bulk requests with prepared responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    def perform_request(self, method, url, body=None, headers=None, params=None):
+        self.bodies.append(body)
+        return self.responses.pop(0)
+
+
+class ScriptedClient:
+    """Client whose _bulk requests get the prepared responses in order"""
+
+    def __init__(self, responses):
+        self.transport = ScriptedTransport(responses)
+
+
+def bulk_item(status, error_type=None):
+    """One item of a _bulk response"""
+    result = {"_index": "esp_pump_data", "status": status}
+    if error_type:
+        result["error"] = {"type": error_type}
+    return {"index": result}
+
+
+def documents(esp, batches):
+    """Documents of the generated batches, in order"""
+    return [doc for batch in batches for doc in esp.batch_documents(batch["data"])]
+
+
+def annotations(batches):
+    """Annotations of the generated batches, in order"""
+    return [annotation for batch in batches for annotation in batch["annotations"]]
+
+
+@pytest.mark.parametrize("engine", ["scalar", "vectorized"])
+@pytest.mark.parametrize("sample_seconds", [60, 10])
+def test_engine_is_deterministic(esp, engine, sample_seconds):
+    """The same seed produces the same documents and annotations"""
+    generate = esp.GENERATION_ENGINES[engine]
+    first = list(generate(START, END, ASSETS, seed=7, sample_seconds=sample_seconds))
+    second = list(generate(START, END, ASSETS, seed=7, sample_seconds=sample_seconds))
+
+    assert documents(esp, first) == documents(esp, second)
+    assert annotations(first) == annotations(second)
+    assert documents(esp, first) != documents(esp, list(generate(START, END, ASSETS, seed=8,
+                                                                 sample_seconds=sample_seconds)))
+
+
+@pytest.mark.parametrize("sample_seconds", [60, 10])
+def test_vectorized_matches_scalar_layout(esp, sample_seconds):
+    """Both engines produce the same readings (timestamps, assets, sensors, units, value types) for a seed"""
+    scalar = documents(esp, esp.generate_esp_pump_data(START, END, ASSETS, seed=7, sample_seconds=sample_seconds))
+    vectorized = documents(esp, esp.generate_esp_pump_data_vectorized(START, END, ASSETS, seed=7,
+                                                                       sample_seconds=sample_seconds))
+
+    def layout(doc):
+        return doc["timestamp"], doc["asset_name"], doc["sensor_name"], doc["sensor_unit"], type(doc["sensor_value"])
+
+    assert sorted(map(layout, scalar)) == sorted(map(layout, vectorized))
+    for doc in vectorized:
+        sensor_config = esp.ALL_SENSORS[doc["sensor_name"]]
+        assert sensor_config["min"] <= doc["sensor_value"] <= sensor_config["max"]
+
+
+@pytest.mark.parametrize("engine", ["scalar", "vectorized"])
+def test_parallel_matches_in_process(esp, engine):
+    """Sharding across processes does not change the generated data"""
+    in_process = list(esp.GENERATION_ENGINES[engine](START, END, ASSETS, seed=7))
+    parallel = list(esp.generate_esp_pump_data_parallel(START, END, ASSETS, seed=7, engine=engine, processes=2))
+
+    assert sorted(map(str, documents(esp, in_process))) == sorted(map(str, documents(esp, parallel)))
+    assert sorted(map(str, annotations(in_process))) == sorted(map(str, annotations(parallel)))
+
+
+@pytest.mark.parametrize("engine", ["scalar", "vectorized"])
+@pytest.mark.parametrize("sample_seconds", [60, 10])
+def test_checkpoint_round_trip_across_days(esp, engine, sample_seconds):
+    """Resuming from a saved state after each day continues the uninterrupted run exactly"""
+    generate = esp.GENERATION_ENGINES[engine]
+    uninterrupted = list(generate(START, datetime(2024, 2, 2), ASSETS, seed=7, sample_seconds=sample_seconds))
+
+    resumed = []
+    saved = None
+    for day in (START, END, datetime(2024, 2, 2)):
+        state = esp.restore_simulator_state(json.loads(json.dumps(saved))) if saved is not None else {}
+        resumed.extend(generate(day, day, ASSETS, seed=7, state=state, sample_seconds=sample_seconds))
+        saved = esp.serialize_simulator_state(state)
+
+    assert documents(esp, resumed) == documents(esp, uninterrupted)
+    assert annotations(resumed) == annotations(uninterrupted)
+
+
+def test_split_bulk_response(esp):
+    """Indexed items are counted, rejected ones returned for a retry in order, other errors counted as failed"""
+    docs = [{"n": position} for position in range(5)]
+    response = {"errors": True, "items": [
+        bulk_item(201),
+        bulk_item(429, "es_rejected_execution_exception"),
+        bulk_item(400, "mapper_parsing_exception"),
+        bulk_item(503, "remote_transport_exception.es_rejected_execution_exception"),
+        bulk_item(200)
+    ]}
+
+    assert esp.split_bulk_response(docs, response) == (2, [docs[1], docs[3]], 1)
+    assert esp.split_bulk_response(docs, {"errors": False, "items": [bulk_item(201)] * 5}) == (5, [], 0)
+
+
+def test_split_bulk_response_of_reading_block(esp):
+    """Rejected readings of a block come back as a block of just those readings"""
+    block = next(iter(esp.generate_esp_pump_data(START, START, ASSETS[:1], seed=7)))["data"]
+    items = [bulk_item(201)] * esp.document_count(block)
+    items[3] = items[7] = bulk_item(429, "es_rejected_execution_exception")
+
+    indexed, rejected, failed = esp.split_bulk_response(block, {"errors": True, "items": items})
+    assert (indexed, failed) == (esp.document_count(block) - 2, 0)
+    assert esp.batch_documents(rejected) == [esp.batch_documents(block)[3], esp.batch_documents(block)[7]]
+
+
+def test_write_retries_only_rejected_items(esp):
+    """Only the rejected documents are sent again; per-item errors are counted, not retried"""
+    docs = [{"n": position} for position in range(4)]
+    client = ScriptedClient([
+        {"errors": True, "items": [bulk_item(201), bulk_item(429, "es_rejected_execution_exception"),
+                                   bulk_item(400, "mapper_parsing_exception"),
+                                   bulk_item(429, "es_rejected_execution_exception")]},
+        {"errors": True, "items": [bulk_item(201), bulk_item(429, "es_rejected_execution_exception")]},
+        {"errors": False, "items": [bulk_item(201)]}
+    ])
+    stats = {}
+
+    assert esp.write_ndjson_batch_to_opensearch(client, docs, "esp_pump_data", 1, initial_backoff=0,
+                                                stats=stats) == (3, 1)
+    assert client.transport.bodies[1] == esp.serialize_bulk_body([docs[1], docs[3]], "esp_pump_data")
+    assert client.transport.bodies[2] == esp.serialize_bulk_body([docs[3]], "esp_pump_data")
+    assert (stats["rejected"], stats["errors"]) == (3, 1)
+
+
+def test_write_gives_up_after_max_retries(esp):
+    """Documents still rejected after the last retry are reported as failed"""
+    docs = [{"n": position} for position in range(3)]
+    client = ScriptedClient([{"errors": True, "items": [bulk_item(201)] + [bulk_item(429)] * 2}] +
+                            [{"errors": True, "items": [bulk_item(429)] * 2}] * 2)
+
+    assert esp.write_ndjson_batch_to_opensearch(client, docs, "esp_pump_data", 1, max_retries=2,
+                                                initial_backoff=0) == (1, 2)
+    assert len(client.transport.bodies) == 3
+
+
+def test_write_through_rejecting_mock_server(esp, mock_server):
+    """Against item and whole-request 429s every document is indexed exactly once"""
+    mock_server.settings.update(reject_rate=0.3, reject_request_rate=0.3)
+    block = esp.join_documents([batch["data"] for batch in esp.generate_esp_pump_data(START, START, ASSETS,
+                                                                                      seed=7)])
+    os_client = esp.OpenSearch(**esp.OPENSEARCH_CONNECTION)
+    stats = {}
+
+    success, failed = esp.write_ndjson_batch_to_opensearch(os_client, block, "esp_pump_data", 1, max_retries=30,
+                                                           initial_backoff=0, stats=stats)
+    assert (success, failed) == (esp.document_count(block), 0)
+    assert mock_server.state["docs"]["esp_pump_data"] == esp.document_count(block)
+    assert stats["rejected"] > 0
+    assert mock_server.state["rejected_requests"] + mock_server.state["bulk_requests"] > 1
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+@pytest.mark.parametrize("engine", ["scalar", "vectorized"])
+@pytest.mark.parametrize("sample_seconds", [60, 10])
+def test_serialize_reading_block_matches_documents(esp, monkeypatch, use_orjson, engine, sample_seconds):
+    """Serializing a reading block gives the bytes of encoding its documents one by one, with and without IDs"""
+    if not use_orjson:
+        monkeypatch.setattr(esp, "orjson", None)
+    elif esp.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    for batch in esp.GENERATION_ENGINES[engine](START, START, ASSETS[:1], seed=7, sample_seconds=sample_seconds,
+                                                chunk_size=5000):
+        block = batch["data"]
+        docs = esp.reading_documents(block)
+        expected = b"".join(esp.bulk_action_line("esp_pump_data") + esp.encode_json_line(doc) for doc in docs)
+        expected_with_ids = b"".join(
+            esp.encode_json_line({"index": {"_index": "esp_pump_data", "_id": esp.document_id(doc)}}) +
+            esp.encode_json_line(doc) for doc in docs)
+
+        assert esp.serialize_bulk_body(block, "esp_pump_data") == expected
+        assert esp.serialize_bulk_body(block, "esp_pump_data", esp.document_id) == expected_with_ids
+
+
+def test_checkpoint_waits_for_acknowledged_requests(esp, tmp_path):
+    """The checkpoint advances to a day only once every earlier request succeeded; a failure holds it back"""
+    path = str(tmp_path / "checkpoint.json")
+    tracker = esp.checkpoint_tracker(path, {"groups": {}}, {"seed": 7})
+    days = [datetime(2024, 1, day) for day in range(1, 5)]
+
+    # Three requests per day, each day marked once its last request is submitted
+    for position, day in enumerate(days):
+        tracker["pending"].update(range(position * 3 + 1, position * 3 + 4))
+        esp.record_day_end(tracker, day)
+        esp.mark_completed_days(tracker, position * 3 + 3)
+
+    for batch_num in (2, 3, 5, 6, 4):
+        esp.acknowledge_batch(tracker, batch_num, True)
+    assert not os.path.exists(path)
+
+    # Request 1 completes last: days 1 and 2 are now fully acknowledged
+    esp.acknowledge_batch(tracker, 1, True)
+    checkpoint = esp.load_checkpoint(path)
+    assert (checkpoint["day"], checkpoint["resume_from"], checkpoint["seed"]) == ("2024-01-02", "2024-01-03", 7)
+
+    # Request 8 fails: day 3 and everything after it stay out of the checkpoint
+    esp.acknowledge_batch(tracker, 9, True)
+    esp.acknowledge_batch(tracker, 8, False)
+    for batch_num in (7, 12, 11, 10):
+        esp.acknowledge_batch(tracker, batch_num, True)
+    assert esp.load_checkpoint(path)["day"] == "2024-01-02"
+    assert (tracker["day"], tracker["failed_from"], tracker["pending"]) == ("2024-01-02", 8, set())
+
+
+def bulk_stats(controller, latency=0.1, rejected=0, errors=0, docs=1000, doc_bytes=100, epoch=None):
+    """Stats of one bulk request as the writers report them to update_bulk_controller"""
+    return {"docs": docs, "bytes": docs * doc_bytes, "latency": latency, "rejected": rejected, "errors": errors,
+            "epoch": controller["epoch"] if epoch is None else epoch}
+
+
+def test_bulk_controller_adapts_to_feedback(esp):
+    """Rejections halve size and concurrency, slow or failing requests shed one request, clean ones grow back"""
+    controller = esp.bulk_controller(1000, 8, target_bytes=1000000)
+
+    esp.update_bulk_controller(controller, bulk_stats(controller))
+    assert (controller["chunk_size"], controller["max_in_flight"]) == (10000, 8)
+
+    esp.update_bulk_controller(controller, bulk_stats(controller, rejected=50))
+    assert (controller["chunk_size"], controller["max_in_flight"], controller["epoch"]) == (5000, 4, 1)
+
+    # A request sent before the back-off says nothing about the new settings
+    esp.update_bulk_controller(controller, bulk_stats(controller, rejected=50, epoch=0))
+    assert (controller["chunk_size"], controller["max_in_flight"], controller["epoch"]) == (5000, 4, 1)
+
+    # Latency above twice the best observed, then per-item errors: one request fewer each, same size
+    esp.update_bulk_controller(controller, bulk_stats(controller, latency=0.3))
+    esp.update_bulk_controller(controller, bulk_stats(controller, errors=3))
+    assert (controller["chunk_size"], controller["max_in_flight"], controller["epoch"]) == (5000, 2, 3)
+
+    # Clean requests grow both back up to the initial limits
+    sizes = []
+    for _ in range(10):
+        esp.update_bulk_controller(controller, bulk_stats(controller))
+        sizes.append(controller["chunk_size"])
+    assert sizes == sorted(sizes) and sizes[0] == 5500
+    assert (controller["chunk_size"], controller["max_in_flight"], controller["scale"]) == (10000, 8, 1.0)
+
+
+def test_bulk_controller_stays_within_chunk_bounds(esp):
+    """Chunk sizes stay within MIN_CHUNK_SIZE and MAX_CHUNK_SIZE and at least one request stays in flight"""
+    assert esp.bulk_controller(1, 4)["chunk_size"] == esp.MIN_CHUNK_SIZE
+    assert esp.bulk_controller(10 ** 9, 4)["chunk_size"] == esp.MAX_CHUNK_SIZE
+
+    controller = esp.bulk_controller(1000, 4, target_bytes=1000000)
+    for _ in range(20):
+        esp.update_bulk_controller(controller, bulk_stats(controller, rejected=10, doc_bytes=10000))
+    assert (controller["chunk_size"], controller["max_in_flight"]) == (esp.MIN_CHUNK_SIZE, 1)
+
+    controller = esp.bulk_controller(1000, 4, target_bytes=1000000)
+    esp.update_bulk_controller(controller, bulk_stats(controller, doc_bytes=1))
+    assert controller["chunk_size"] == esp.MAX_CHUNK_SIZE
+
+
+def test_retry_delay_jitter(esp, monkeypatch):
+    """Retry delays double per attempt, with a random half on top of a fixed half"""
+    monkeypatch.setattr(esp.random, "uniform", lambda low, high: high)
+    assert [esp.retry_delay(attempt, 2) for attempt in (1, 2, 3)] == [2, 4, 8]
+    monkeypatch.setattr(esp.random, "uniform", lambda low, high: low)
+    assert [esp.retry_delay(attempt, 2) for attempt in (1, 2, 3)] == [1, 2, 4]
+
+
+@pytest.fixture
+def dispatcher(esp, monkeypatch):
+    """Node dispatcher over three configured hosts (nothing listens on them; requests are not sent)"""
+    monkeypatch.setitem(esp.OPENSEARCH_CONNECTION, "hosts", ["http://127.0.0.1:9201", "http://127.0.0.1:9202",
+                                                             "http://127.0.0.1:9203"])
+    return esp.node_dispatcher(None, 1)
+
+
+def acquire_urls(esp, dispatcher, count):
+    """URLs of the nodes picked for count requests in a row, all left in flight"""
+    return [esp.acquire_node(dispatcher)["url"][-4:] for _ in range(count)]
+
+
+def release_all(esp, dispatcher, latencies, rejected=None):
+    """Finish one request per node (acquired in node order) with the given latency and rejected fraction"""
+    for node in dispatcher["nodes"]:
+        node_name = node["url"][-4:]
+        esp.release_node(dispatcher, node, latencies[node_name], (rejected or {}).get(node_name, 0.0))
+
+
+def test_dispatcher_prefers_short_expected_wait(esp, dispatcher):
+    """Untried nodes are tried first, then nodes are scored by (requests in flight + 1) x average latency"""
+    assert sorted(acquire_urls(esp, dispatcher, 3)) == ["9201", "9202", "9203"]
+    release_all(esp, dispatcher, {"9201": 0.1, "9202": 0.3, "9203": 0.2})
+
+    # 9201 scores 0.1, then 0.2 against 9203's 0.2 (fewer in flight wins), then 0.2 against 0.3 and 0.4
+    assert acquire_urls(esp, dispatcher, 4) == ["9201", "9203", "9201", "9202"]
+
+
+def test_dispatcher_penalizes_rejections(esp, dispatcher):
+    """A node's recent rejection rate inflates its score"""
+    acquire_urls(esp, dispatcher, 3)
+    release_all(esp, dispatcher, {"9201": 0.1, "9202": 0.15, "9203": 0.3}, rejected={"9201": 1.0})
+
+    node = dispatcher["nodes"][0]
+    assert node["rejection_rate"] == pytest.approx(esp.NODE_EWMA_ALPHA)
+    # 0.1 x (1 + NODE_REJECTION_WEIGHT x 0.2) = 0.18 is worse than 0.15
+    assert acquire_urls(esp, dispatcher, 1) == ["9202"]
+
+
+def test_dispatcher_skips_failed_node_until_cooldown(esp, dispatcher, monkeypatch):
+    """A node that did not answer is skipped for NODE_COOLDOWN_SECONDS, unless every node failed"""
+    now = [1000.0]
+    monkeypatch.setattr(esp.time, "monotonic", lambda: now[0])
+    acquire_urls(esp, dispatcher, 3)
+    release_all(esp, dispatcher, {"9201": 0.1, "9202": 0.3, "9203": 0.3})
+
+    fast = dispatcher["nodes"][0]
+    esp.release_node(dispatcher, esp.acquire_node(dispatcher), 0.1, failed=True)
+    assert fast["errors"] == 1
+    assert "9201" not in acquire_urls(esp, dispatcher, 4)
+
+    for node in dispatcher["nodes"]:
+        node["in_flight"] = 0
+    now[0] += esp.NODE_COOLDOWN_SECONDS - 1
+    assert acquire_urls(esp, dispatcher, 1) == ["9202"]
+    now[0] += 1
+    assert acquire_urls(esp, dispatcher, 1) == ["9201"]
+
+    # With every node down the dispatcher still sends somewhere
+    for node in dispatcher["nodes"]:
+        node["down_until"] = now[0] + 60
+    assert len(acquire_urls(esp, dispatcher, 1)) == 1